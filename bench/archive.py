@@ -0,0 +1,46 @@
+"""
+圧縮していないJSON形式のログとgzip、lzmaで圧縮したログのディスク使用量と読み込み時間を比較するベンチマーク
+    python -m bench.archive [日数]
+"""
+import datetime
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.columnar_log import directory_size
+from bench.synthetic import write_json_logs
+from log_archive import archive_closed_days
+from log_repository import JsonRowLogRepository
+from player import PlayerRegistry
+
+def bench(days: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as d:
+        plain_dir = Path(d) / "plain"
+        plain_dir.mkdir()
+        dates = write_json_logs(plain_dir, days)
+        now = datetime.datetime.combine(dates[-1] + datetime.timedelta(days=1), datetime.time())
+        result = {}
+        for suffix in ("", ".gz", ".xz"):
+            directory = plain_dir
+            name = suffix.removeprefix(".") or "plain"
+            if suffix != "":
+                directory = Path(d) / name
+                shutil.copytree(plain_dir, directory)
+                t = time.perf_counter()
+                archive_closed_days(JsonRowLogRepository(directory), datetime.time(23), suffix, now=now)
+                result[f"{name} archive [s]"] = time.perf_counter() - t
+            repo = JsonRowLogRepository(directory, PlayerRegistry())
+            t = time.perf_counter()
+            for date in repo.get_dates():
+                repo.get_log_by_date(date)
+            result[f"{name} load [s]"] = time.perf_counter() - t
+            result[f"{name} size [KiB]"] = directory_size(directory, "log_*") / 1024
+        return result
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    print(f"{days} days")
+    for name, value in bench(days).items():
+        print(f"{name:24}{value:>12.3f}")
@@ -0,0 +1,55 @@
+"""
+JSON形式と列形式のログの読み込み時間とディスク使用量を比較するベンチマーク
+    python -m bench.columnar_log [日数]
+"""
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+from bench.synthetic import write_json_logs
+from columnar_log_repository import ColumnarLogRepository, convert_json_logs
+from log_repository import JsonRowLogRepository
+from player import PlayerRegistry
+
+def directory_size(directory: Path, pattern: str) -> int:
+    return sum(p.stat().st_size for p in directory.glob(pattern))
+
+def bench(days: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as d:
+        json_dir = Path(d)
+        columnar_dir = json_dir / "columnar"
+        columnar_dir.mkdir()
+        dates = write_json_logs(json_dir, days)
+        json_repo = JsonRowLogRepository(json_dir, PlayerRegistry())
+        columnar_repo = ColumnarLogRepository(columnar_dir, PlayerRegistry())
+        t = time.perf_counter()
+        convert_json_logs(json_repo, columnar_repo)
+        convert = time.perf_counter() - t
+        t = time.perf_counter()
+        for date in dates:
+            json_repo.get_log_by_date(date)
+        json_load = time.perf_counter() - t
+        t = time.perf_counter()
+        for date in dates:
+            columnar_repo.get_log_by_date(date)
+        columnar_load = time.perf_counter() - t
+        t = time.perf_counter()
+        for date in dates:
+            times, offsets, codes = columnar_repo.get_arrays(date)
+            codes.sum()
+        memmap_load = time.perf_counter() - t
+        return {
+            "json load [s]": json_load,
+            "columnar load [s]": columnar_load,
+            "columnar memmap [s]": memmap_load,
+            "convert [s]": convert,
+            "json size [KiB]": directory_size(json_dir, "log_*.txt") / 1024,
+            "columnar size [KiB]": directory_size(columnar_dir, "*") / 1024,
+        }
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    print(f"{days} days")
+    for name, value in bench(days).items():
+        print(f"{name:24}{value:>12.3f}")
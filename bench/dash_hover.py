@@ -0,0 +1,68 @@
+"""
+日付のページのツールチップについて、全てのプレイヤーをdcc.Storeに入れるやり方と
+ホバーしたサンプルのプレイヤーだけをサーバーで引くやり方を、ブラウザに送る量とホバーの時間で比較するベンチマーク
+    python -m bench.dash_hover [サンプルの間にプレイする最大人数] [ホバー回数]
+"""
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.synthetic import write_json_logs
+from log_usecase import LogUsecase
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def old_store(log_usecase: LogUsecase, date: datetime.date) -> str:
+    """
+    以前のdash_main.date_headcountsがStoreに入れていたJSON
+    """
+    data = log_usecase.get_players_over_time(date)
+    return json.dumps(dict(zip(
+        map(lambda dt: dt.isoformat(sep=" ", timespec="minutes"), data.keys()),
+        map(list, data.values())
+    )))
+
+def old_hover(store: str, x: str) -> list[str]:
+    data = json.loads(store)
+    return list(map(lambda p: p[0], data[x]))
+
+def new_hover(log_usecase: LogUsecase, date: datetime.date, index: int) -> list[str]:
+    return [p.name for p in log_usecase.get_players_at(date, index)]
+
+if __name__ == "__main__":
+    max_plays = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    hovers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as d:
+        workdir = Path(d)
+        (workdir / "log").mkdir()
+        config = json.loads((ROOT / "config.json").read_text())
+        config["log_directory"] = str(workdir / "log")
+        (workdir / "config.json").write_text(json.dumps(config))
+        # 設定はカレントディレクトリのconfig.jsonから読む
+        os.chdir(workdir)
+        date, = write_json_logs(workdir / "log", 1, 3000, max_plays=max_plays)
+        log_usecase = LogUsecase(lazy=False)
+        headcounts = log_usecase.get_headcounts_of_date(date)
+        xs = [dt.isoformat(sep=" ", timespec="minutes") for dt in headcounts.keys()]
+        store = old_store(log_usecase, date)
+        graph = json.dumps({"x": xs, "y": list(headcounts.values())})
+        indices = [i % len(xs) for i in range(hovers)]
+        for i in range(len(xs)):
+            assert sorted(old_hover(store, xs[i])) == sorted(new_hover(log_usecase, date, i))
+        t = time.perf_counter()
+        for i in indices:
+            old_hover(store, xs[i])
+        old = (time.perf_counter() - t) / hovers
+        t = time.perf_counter()
+        for i in indices:
+            new_hover(log_usecase, date, i)
+        new = (time.perf_counter() - t) / hovers
+    print(f"{len(xs)} samples, max {max(headcounts.values()):.0f} players")
+    print(f"store payload    [KiB]{(len(graph) + len(store)) / 1024:>10.1f}")
+    print(f"graph payload    [KiB]{len(graph) / 1024:>10.1f}")
+    print(f"store hover      [ms] {old * 1000:>10.3f}")
+    print(f"server hover     [ms] {new * 1000:>10.3f}  {old / new:.1f}x")
@@ -0,0 +1,51 @@
+"""
+JSON形式と差分形式のログの書き込み量と読み込み時間を比較するベンチマーク
+    python -m bench.delta_log [日数] [サンプルの間にプレイする最大人数]
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench.columnar_log import directory_size
+from bench.synthetic import write_json_logs
+from delta_log_repository import DeltaLogRepository, convert_json_logs
+from log_repository import JsonRowLogRepository
+from player import PlayerRegistry
+
+def bench(days: int, max_plays: int) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as d:
+        json_dir = Path(d)
+        delta_dir = json_dir / "delta"
+        delta_dir.mkdir()
+        dates = write_json_logs(json_dir, days, max_plays=max_plays)
+        json_repo = JsonRowLogRepository(json_dir, PlayerRegistry())
+        delta_repo = DeltaLogRepository(delta_dir, PlayerRegistry())
+        t = time.perf_counter()
+        convert_json_logs(json_repo, delta_repo)
+        convert = time.perf_counter() - t
+        t = time.perf_counter()
+        for date in dates:
+            json_repo.get_log_by_date(date)
+        json_load = time.perf_counter() - t
+        t = time.perf_counter()
+        for date in dates:
+            delta_repo.get_log_by_date(date)
+        delta_load = time.perf_counter() - t
+        for date in dates[:10]:
+            expected = json_repo.get_log_by_date(date)
+            assert list(delta_repo.get_log_by_date(date).iter_logs()) == list(expected.iter_logs())
+        return {
+            "json load [s]": json_load,
+            "delta load [s]": delta_load,
+            "convert [s]": convert,
+            "json size [KiB]": directory_size(json_dir, "log_*.txt") / 1024,
+            "delta size [KiB]": directory_size(delta_dir, "log_*.delta") / 1024,
+        }
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    max_plays = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print(f"{days} days")
+    for name, value in bench(days, max_plays).items():
+        print(f"{name:24}{value:>12.3f}")
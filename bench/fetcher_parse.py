@@ -0,0 +1,27 @@
+"""
+保存したライバル検索画面のHTMLで、プレイヤー表だけを切り出す読み方とBeautifulSoupでページ全体を読む読み方を比較するベンチマーク
+    python -m bench.fetcher_parse [回数]
+"""
+import sys
+import time
+from pathlib import Path
+
+from fetcher import parse_log, parse_result_table_soup
+
+FIXTURES = Path(__file__).resolve().parent.parent / "test" / "fixtures"
+
+def per_parse(parse, html: str, n: int) -> float:
+    t = time.perf_counter()
+    for _ in range(n):
+        parse(html)
+    return (time.perf_counter() - t) / n
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for path in sorted(FIXTURES.glob("rival_search_*.html")):
+        html = path.read_text()
+        assert parse_log(html) == parse_result_table_soup(html)
+        old = per_parse(parse_result_table_soup, html, n)
+        new = per_parse(parse_log, html, n)
+        name = path.stem.removeprefix("rival_search_")
+        print(f"{name:<12}soup [us]{old * 10**6:>8.1f}  fast [us]{new * 10**6:>8.1f}  {old / new:>6.1f}x")
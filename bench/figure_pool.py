@@ -0,0 +1,62 @@
+"""
+pyplotで毎回Figureを作る描画とFigurePoolの描画を、一秒あたりのグラフ数で比較するベンチマーク
+    python -m bench.figure_pool [グラフ数] [スレッド数]
+"""
+import datetime
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+
+from figure_pool import FigurePool
+
+matplotlib.use("Agg")
+
+def make_series(n: int) -> list[tuple[list[datetime.datetime], list[float]]]:
+    t = datetime.datetime(2022,1,1)
+    xs = [t + datetime.timedelta(minutes=5*i) for i in range(288)]
+    return [(xs, [(i * k) % 13 for i in range(288)]) for k in range(n)]
+
+def render_pyplot(xs: list[datetime.datetime], ys: list[float], format: str) -> bytes:
+    """
+    以前のfastapi_main.plot_datetimeと同じ描画
+    """
+    fig, ax = plt.subplots(figsize=(8,4))
+    ax.plot(xs, ys)
+    ax.minorticks_on()
+    ax.grid(alpha=0.8)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+    with BytesIO() as buffer:
+        fig.savefig(buffer, format=format)
+        plt.close(fig)
+        return buffer.getvalue()
+
+def charts_per_second(render, inputs, format: str, threads: int) -> float:
+    t = time.perf_counter()
+    if threads <= 1:
+        for xs, ys in inputs:
+            render(xs, ys, format)
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda a: render(*a, format), inputs))
+    return len(inputs) / (time.perf_counter() - t)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    inputs = make_series(n)
+    pool = FigurePool(threads)
+    print(f"{n} charts")
+    for format in ("png", "svg"):
+        # フォントなどの初回の読み込みは除いて測る
+        render_pyplot(*inputs[0], format)
+        pool.render(*inputs[0], format)
+        old = charts_per_second(render_pyplot, inputs, format, 1)
+        new = charts_per_second(pool.render, inputs, format, 1)
+        threaded = charts_per_second(pool.render, inputs, format, threads)
+        print(f"{format} pyplot            [charts/s]{old:>8.1f}")
+        print(f"{format} pool              [charts/s]{new:>8.1f}  {new / old:.2f}x")
+        print(f"{format} pool {threads} threads    [charts/s]{threaded:>8.1f}  {threaded / old:.2f}x")
@@ -0,0 +1,108 @@
+"""
+架空のログでuvicornを起動し、同時に複数のクライアントからリクエストしたときのレイテンシを測るベンチマーク
+request_workers=0（イベントループ上で解析と描画をする）と比較する
+    python -m bench.load [日数] [クライアント数] [クライアントあたりのリクエスト数] [request_workers]
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+import numpy as np
+
+from bench.synthetic import write_json_logs
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workdir: Path, port: int, request_workers: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=str(ROOT), REQUEST_WORKERS=str(request_workers), REFRESH_INTERVAL="0")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "fastapi_main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env=env
+    )
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/player/list")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("server did not start")
+
+def get_paths(dates: list) -> list[tuple[str, str]]:
+    """
+    (種類, パス)のリスト、重い統計のグラフと軽いプレイヤー一覧を混ぜる
+    """
+    return (
+        [("median", "/headcounts/median"), ("list", "/player/list")]
+        + [("weekday", f"/headcounts/average/{w}") for w in range(7)]
+        + [("date", f"/headcounts/{d.isoformat()}") for d in dates[-3:]]
+    )
+
+async def client_loop(client: httpx.AsyncClient, paths: list, requests: int, seed: int, latencies: dict):
+    rng = np.random.default_rng(seed)
+    for i in rng.integers(0, len(paths), requests):
+        kind, path = paths[i]
+        t = time.perf_counter()
+        r = await client.get(path)
+        r.raise_for_status()
+        latencies.setdefault(kind, []).append(time.perf_counter() - t)
+
+async def run_load(port: int, dates: list, clients: int, requests: int) -> dict[str, list[float]]:
+    paths = get_paths(dates)
+    latencies: dict[str, list[float]] = {}
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+        await wait_ready(client)
+        # 日ごとの集計を作り終えた状態から測る
+        for _, path in paths:
+            await client.get(path)
+        await asyncio.gather(*(
+            client_loop(client, paths, requests, seed, latencies) for seed in range(clients)
+        ))
+    return latencies
+
+def bench(workdir: Path, dates: list, clients: int, requests: int, request_workers: int) -> dict[str, list[float]]:
+    port = free_port()
+    server = start_server(workdir, port, request_workers)
+    try:
+        return asyncio.run(run_load(port, dates, clients, requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+def report(name: str, latencies: dict[str, list[float]]):
+    print(name)
+    for kind, values in sorted(latencies.items()):
+        ms = np.array(values) * 1000
+        print(f"  {kind:<8} n={len(ms):<5} p50 [ms]{np.percentile(ms, 50):>9.1f}  p99 [ms]{np.percentile(ms, 99):>9.1f}")
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    requests = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    with tempfile.TemporaryDirectory() as d:
+        workdir = Path(d)
+        log_directory = workdir / "log"
+        log_directory.mkdir()
+        dates = write_json_logs(log_directory, days)
+        config = json.loads((ROOT / "config.json").read_text())
+        config["log_directory"] = str(log_directory)
+        (workdir / "config.json").write_text(json.dumps(config))
+        print(f"{days} days, {clients} clients x {requests} requests")
+        report("request_workers=0", bench(workdir, dates, clients, requests, 0))
+        report(f"request_workers={workers}", bench(workdir, dates, clients, requests, workers))
@@ -0,0 +1,65 @@
+"""
+日ごとの解析を直列とプロセスプールで比較するベンチマーク
+    python -m bench.parallel [日数] [プロセス数]
+"""
+import os
+import sys
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from bench.synthetic import write_json_logs
+from interpolator import OnedayAverage
+from log_analysis import DayAnalysis, LogAnalyzer
+from log_repository import JsonRowLogRepository
+from log_usecase import analyze_log_file
+from player import PlayerRegistry
+
+def serial(log_directory: Path, dates) -> dict:
+    a = LogAnalyzer()
+    repo = JsonRowLogRepository(log_directory, PlayerRegistry())
+    acc = OnedayAverage()
+    for date in dates:
+        analysis = a.analyze(repo.get_log_by_date(date))
+        acc.append(analysis.times, analysis.headcounts)
+    return acc.result()
+
+def parallel(log_directory: Path, dates, executor: ProcessPoolExecutor, workers: int) -> dict:
+    a = LogAnalyzer()
+    registry = PlayerRegistry()
+    acc = OnedayAverage()
+    analyzed = executor.map(
+        analyze_log_file,
+        repeat(JsonRowLogRepository(log_directory)),
+        dates,
+        repeat(None),
+        repeat(a.MAX_STABLE_TIME),
+        repeat(a.MAX_TIME_BETWEEN_REENTRY),
+        chunksize=max(1, len(dates) // (4 * workers))
+    )
+    for times, players, presence, played in analyzed:
+        analysis = DayAnalysis.create(times, list(map(registry.intern, players)), presence, played)
+        acc.append(analysis.times, analysis.headcounts)
+    return acc.result()
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as d:
+        dates = write_json_logs(Path(d), days)
+        t = time.perf_counter()
+        expected = serial(Path(d), dates)
+        serial_time = time.perf_counter() - t
+        with ProcessPoolExecutor(workers) as executor:
+            # プロセスの起動は除いて測る
+            list(executor.map(int, range(workers)))
+            t = time.perf_counter()
+            actual = parallel(Path(d), dates, executor, workers)
+            parallel_time = time.perf_counter() - t
+    print(f"{days} days, {workers} workers")
+    print(f"serial   [s]{serial_time:>10.3f}")
+    print(f"parallel [s]{parallel_time:>10.3f}")
+    print(f"speedup     {serial_time / parallel_time:>10.2f}x")
+    print(f"identical   {actual == expected!s:>10}")
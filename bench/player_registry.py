@@ -0,0 +1,62 @@
+"""
+プレイヤーのset/dict操作のコストを比較するベンチマーク
+    python -m bench.player_registry [プレイヤー数]
+"""
+import sys
+import timeit
+from typing import NamedTuple
+
+from player import Player, PlayerRegistry
+
+class LegacyPlayer(NamedTuple):
+    """
+    修正前のPlayer（__hash__が組み込み関数idのハッシュを返すため全員が同じハッシュになる）
+    """
+    name: str
+    id: str
+    def __hash__(self) -> int:
+        return hash(id)
+    def __eq__(self, __o: object) -> bool:
+        if isinstance(__o, LegacyPlayer):
+            return self.id == __o.id
+        return NotImplemented
+
+def make_ids(n: int) -> list[str]:
+    return [f"{i // 10000:04}-{i % 10000:04}" for i in range(n)]
+
+def bench(n: int, number: int = 3) -> dict[str, dict[str, float]]:
+    ids = make_ids(n)
+    legacy = [LegacyPlayer(f"DJ{i}", id) for i, id in enumerate(ids)]
+    players = [Player(f"DJ{i}", id) for i, id in enumerate(ids)]
+    registry = PlayerRegistry()
+    codes = list(map(registry.intern, players))
+    def cases(xs):
+        st = set(xs)
+        d = dict.fromkeys(xs, 0)
+        return {
+            "set build": lambda: set(xs),
+            "set lookup": lambda: all(x in st for x in xs),
+            "dict build": lambda: dict.fromkeys(xs, 0),
+            "dict lookup": lambda: all(d[x] == 0 for x in xs),
+        }
+    results = {}
+    for label, xs in [("legacy Player", legacy), ("Player", players), ("code", codes)]:
+        results[label] = {
+            name: min(timeit.repeat(f, number=1, repeat=number))
+            for name, f in cases(xs).items()
+        }
+    results["code"]["intern"] = min(timeit.repeat(
+        lambda: list(map(PlayerRegistry().intern, players)), number=1, repeat=number
+    ))
+    return results
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results = bench(n)
+    print(f"{n} distinct players (seconds, best of 3)")
+    ops = list(results["code"].keys())
+    print(f"{'':16}" + "".join(f"{op:>14}" for op in ops))
+    for label, r in results.items():
+        print(f"{label:16}" + "".join(
+            f"{r[op]:>14.6f}" if op in r else f"{'-':>14}" for op in ops
+        ))
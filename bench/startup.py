@@ -0,0 +1,81 @@
+"""
+エントリーポイントごとに`python -X importtime`で読み込み時間を測り、予算と比べるベンチマーク
+    python -m bench.startup
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# モジュールの読み込み時間の予算（秒）、重い依存を読み込まないことはテストでも確認する
+BUDGETS = {
+    "logger": 0.5,
+    "multi_logger": 0.5,
+    "log_usecase": 0.5,
+    "fetcher": 0.4,
+    "figure_pool": 0.1,
+    "fastapi_main": 1.5,
+    "dash_main": 3.0,
+}
+# そのエントリーポイントでは読み込まないはずの重い依存
+HEAVY = {
+    "logger": ["numpy", "matplotlib", "scipy", "dash", "fastapi", "bs4"],
+    "multi_logger": ["numpy", "matplotlib", "scipy", "dash", "fastapi", "bs4"],
+    "log_usecase": ["matplotlib", "scipy", "requests", "bs4", "schedule"],
+    "fetcher": ["numpy", "matplotlib", "scipy", "bs4"],
+    "figure_pool": ["matplotlib", "numpy"],
+    "fastapi_main": ["matplotlib", "scipy", "requests", "bs4", "dash"],
+    "dash_main": ["matplotlib", "scipy", "requests", "bs4"],
+}
+
+class Startup(NamedTuple):
+    # importtimeで測ったモジュールの読み込み時間（秒）
+    seconds: float
+    # 読み込まれたモジュール
+    modules: set[str]
+
+def measure(module: str, cwd: Path = ROOT) -> Startup:
+    """
+    新しいプロセスでmoduleを読み込み、読み込み時間と読み込まれたモジュールを返す
+    """
+    code = f"import {module}, sys, json; print(json.dumps(sorted(sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    # "import time: self [us] | cumulative | name" のうちトップレベルのmoduleの行
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[2].rstrip() == f" {module}":
+            cumulative = int(fields[1])
+    return Startup(cumulative / 10**6, set(json.loads(result.stdout.splitlines()[-1])))
+
+def get_loaded_heavy(module: str, startup: Startup) -> list[str]:
+    return [m for m in HEAVY.get(module, []) if m in startup.modules]
+
+if __name__ == "__main__":
+    # アプリのモジュールは読み込み時にログを読むので空のログディレクトリで測る
+    with tempfile.TemporaryDirectory() as d:
+        workdir = Path(d)
+        (workdir / "log").mkdir()
+        config = json.loads((ROOT / "config.json").read_text())
+        config["log_directory"] = str(workdir / "log")
+        (workdir / "config.json").write_text(json.dumps(config))
+        ok = True
+        for module, budget in BUDGETS.items():
+            startup = measure(module, workdir)
+            heavy = get_loaded_heavy(module, startup)
+            passed = startup.seconds <= budget and not heavy
+            ok &= passed
+            print(
+                f"{module:<14}[ms]{startup.seconds * 1000:>8.1f} / {budget * 1000:>6.0f}"
+                f"  {'OK' if passed else 'NG'}  {' '.join(heavy)}"
+            )
+    sys.exit(0 if ok else 1)
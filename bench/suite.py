@@ -0,0 +1,218 @@
+"""
+架空の店舗のログで主な処理の時間を測り、結果をJSONに保存して前回の結果と比較するベンチマーク
+    python -m bench.suite run [--days 90] [--repeat 5] [--only 名前の一部] [--output 結果.json]
+    python -m bench.suite compare 基準.json 結果.json [--threshold 0.2]
+比較では中央値が基準よりthresholdの割合以上遅くなったものを報告し、一つでもあれば終了コード1で終わる
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from bench.synthetic import Venue, write_venue_logs
+
+ROOT = Path(__file__).resolve().parent.parent
+
+class Benchmark(NamedTuple):
+    name: str
+    # 測る処理、setupがあれば毎回その後に測る
+    run: Callable[[], object]
+    setup: Callable[[], object] | None = None
+
+class Result(NamedTuple):
+    median: float
+    min: float
+    repeat: int
+
+class Regression(NamedTuple):
+    name: str
+    baseline: float
+    current: float
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+def measure(benchmark: Benchmark, repeat: int) -> Result:
+    # 初回の読み込みなどは除く
+    if benchmark.setup is not None:
+        benchmark.setup()
+    benchmark.run()
+    times = []
+    for _ in range(repeat):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        t = time.perf_counter()
+        benchmark.run()
+        times.append(time.perf_counter() - t)
+    return Result(statistics.median(times), min(times), repeat)
+
+def compare(
+        baseline: dict[str, Result],
+        current: dict[str, Result],
+        threshold: float
+    ) -> list[Regression]:
+    """
+    両方にあるベンチマークのうち、中央値が基準の(1 + threshold)倍より遅いもの
+    """
+    return [
+        Regression(name, baseline[name].median, result.median)
+        for name, result in current.items()
+        if name in baseline and result.median > baseline[name].median * (1 + threshold)
+    ]
+
+def save_results(path: Path, results: dict[str, Result], meta: dict):
+    data = {"meta": meta, "results": {name: result._asdict() for name, result in results.items()}}
+    path.write_text(json.dumps(data, indent=2))
+
+def load_results(path: Path) -> dict[str, Result]:
+    data = json.loads(path.read_text())
+    return {name: Result(**result) for name, result in data["results"].items()}
+
+def get_benchmarks(workdir: Path, dates: list[datetime.date]) -> list[Benchmark]:
+    """
+    workdirのconfig.jsonとログで測るベンチマーク、アプリのモジュールはカレントディレクトリをworkdirにしてから読み込む
+    """
+    import httpx
+    from interpolator import OnedayAverage, OnedayMax, OnedayMedian, OnedayStatistics, OnedaySum
+    from log_analysis import LogAnalyzer
+    from log_repository import JsonRowLogRepository
+    from log_usecase import LogUsecase, LogUsecaseSettings
+    from player import PlayerRegistry
+    log_directory = workdir / "log"
+    repository = JsonRowLogRepository(log_directory, PlayerRegistry())
+    logs = [repository.get_log_by_date(date) for date in dates]
+    analyzer = LogAnalyzer()
+    headcounts = [(log.get_times(), analyzer.get_headcounts(log)) for log in logs]
+    def load_logs():
+        for date in dates:
+            repository.get_log_by_date(date)
+    def analyze_headcounts():
+        for log in logs[:10]:
+            analyzer.get_headcounts(log)
+    def accumulate(factory: Callable[[], object]) -> Callable[[], object]:
+        def run():
+            acc = factory()
+            for xs, ys in headcounts:
+                acc.append(xs, ys)
+            return acc.result()
+        return run
+    def remove_derived():
+        # 索引と集計のない最初の起動を測る
+        (log_directory / "player_index.json").unlink(missing_ok=True)
+        for path in (log_directory / "rollup").glob("*"):
+            path.unlink()
+    settings = LogUsecaseSettings(refresh_interval=0)
+    benchmarks = [
+        Benchmark("repository.get_log_by_date", load_logs),
+        Benchmark("analyzer.get_headcounts", analyze_headcounts),
+        Benchmark("accumulator.OnedaySum", accumulate(OnedaySum)),
+        Benchmark("accumulator.OnedayAverage", accumulate(OnedayAverage)),
+        Benchmark("accumulator.OnedayMedian", accumulate(OnedayMedian)),
+        Benchmark("accumulator.OnedayMax", accumulate(OnedayMax)),
+        Benchmark("accumulator.OnedayStatistics", accumulate(lambda: OnedayStatistics(["mean", "median", "max"], [90]))),
+        Benchmark("log_usecase.construct", lambda: LogUsecase(settings=settings).close(), remove_derived),
+    ]
+    # 描画とデータのキャッシュは毎回消し、日ごとの集計と解析のキャッシュはあるものとして測る
+    import fastapi_main
+    player_id = fastapi_main.get_log_usecase().get_all_playerlist()[0].id
+    date = dates[-1].isoformat()
+    routes = [
+        "/player/list",
+        f"/player/{player_id}/date",
+        f"/player/{player_id}/time",
+        "/headcounts/average",
+        "/headcounts/average/5",
+        "/headcounts/median",
+        "/headcounts/max",
+        "/headcounts/stats?stat=mean&stat=max&percentile=90",
+        f"/headcounts/{date}",
+        "/data/headcounts/average",
+        f"/data/headcounts/{date}",
+    ]
+    def get(path: str) -> Callable[[], object]:
+        async def request():
+            transport = httpx.ASGITransport(app=fastapi_main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                r = await client.get(path)
+                r.raise_for_status()
+        return lambda: asyncio.run(request())
+    for route in routes:
+        name = "fastapi " + route.replace(player_id, "{id}").replace(date, "{date}").split("?")[0]
+        benchmarks.append(Benchmark(name, get(route), fastapi_main.render_cache.memory.clear))
+    return benchmarks
+
+def run(days: int, repeat: int, only: str | None, venue: Venue) -> tuple[dict[str, Result], dict]:
+    with tempfile.TemporaryDirectory() as d:
+        workdir = Path(d)
+        (workdir / "log").mkdir()
+        dates = write_venue_logs(workdir / "log", days, venue)
+        config = json.loads((ROOT / "config.json").read_text())
+        config["log_directory"] = str(workdir / "log")
+        config["refresh_interval"] = 0
+        (workdir / "config.json").write_text(json.dumps(config))
+        cwd = os.getcwd()
+        # 設定はカレントディレクトリのconfig.jsonから読む
+        os.chdir(workdir)
+        try:
+            results = {}
+            for benchmark in get_benchmarks(workdir, dates):
+                if only is not None and only not in benchmark.name:
+                    continue
+                results[benchmark.name] = measure(benchmark, repeat)
+                print(f"{benchmark.name:<40}[ms]{results[benchmark.name].median * 1000:>10.2f}", flush=True)
+        finally:
+            os.chdir(cwd)
+    meta = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "days": days,
+        "repeat": repeat,
+        "venue": venue._asdict() | {"open_time": str(venue.open_time), "close_time": str(venue.close_time)},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    return results, meta
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--days", type=int, default=90)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--players", type=int, default=Venue().n_players)
+    run_parser.add_argument("--arrivals", type=float, default=Venue().arrivals_per_hour)
+    run_parser.add_argument("--only")
+    run_parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline", type=Path)
+    compare_parser.add_argument("current", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        venue = Venue(n_players=args.players, arrivals_per_hour=args.arrivals)
+        results, meta = run(args.days, args.repeat, args.only, venue)
+        save_results(args.output.resolve(), results, meta)
+        print(f"saved {len(results)} results to {args.output}")
+        return 0
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    regressions = {r.name: r for r in compare(baseline, current, args.threshold)}
+    for name, result in current.items():
+        if name not in baseline:
+            print(f"{name:<40}[ms]{'':>10}{result.median * 1000:>10.2f}  new")
+            continue
+        base = baseline[name].median
+        mark = "REGRESSION" if name in regressions else ""
+        print(f"{name:<40}[ms]{base * 1000:>10.2f}{result.median * 1000:>10.2f}  {result.median / base:>5.2f}x  {mark}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
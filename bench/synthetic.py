@@ -0,0 +1,176 @@
+"""
+ベンチマーク用の架空のログを生成する
+"""
+import datetime
+import heapq
+import random
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+from log_repository import JsonRowLogRepository
+from player import Player
+
+def write_json_logs(
+        directory: Path,
+        days: int,
+        n_players: int = 300,
+        seed: int = 0,
+        start: datetime.date = datetime.date(2022,1,1),
+        max_plays: int = 2,
+    ) -> list[datetime.date]:
+    """
+    9:30から23:00まで約8分おきにサンプルしたJSON形式のログをdays日分書き込む
+    サンプルの間にプレイするのは0からmax_plays人
+    """
+    rng = random.Random(seed)
+    repo = JsonRowLogRepository(directory)
+    players = [Player(f"DJ{i}", f"{i // 10000:04}-{i % 10000:04}") for i in range(n_players)]
+    # 常連とたまに来るプレイヤー
+    regulars = players[:max(1, n_players // 5)]
+    dates = [start + datetime.timedelta(days=i) for i in range(days)]
+    for date in dates:
+        t = datetime.datetime.combine(date, datetime.time(9, 30))
+        row = rng.sample(players, min(10, n_players))
+        while t.hour < 23:
+            # プレイしたプレイヤーがライバル検索の先頭に来る
+            for _ in range(rng.randint(0, max_plays)):
+                p = rng.choice(regulars if rng.random() < 0.8 else players)
+                row = [q for q in row if q != p]
+                row.insert(0, p)
+            row = row[:10]
+            repo.save_row(t, row)
+            t += datetime.timedelta(minutes=8, seconds=rng.randint(0, 30))
+    return dates
+
+class Venue(NamedTuple):
+    """
+    架空の店舗の設定
+    """
+    # 登録しているプレイヤー数と、そのうち来店の8割を占める常連の割合
+    n_players: int = 300
+    regular_ratio: float = 0.2
+    # 平日の一時間あたりの平均来店数（時間帯で増減し、週末は1.5倍）
+    arrivals_per_hour: float = 4
+    # 筐体の数、一回のプレイの時間（分）、一回の来店でプレイする回数の平均
+    machines: int = 2
+    play_minutes: float = 9
+    plays_per_visit: float = 3
+    # 一日に名前を変えるプレイヤーの割合
+    rename_rate: float = 0.002
+    # ログを取る間隔（分）
+    sample_minutes: float = 8
+    open_time: datetime.time = datetime.time(9, 30)
+    close_time: datetime.time = datetime.time(23, 0)
+    # ライバル検索画面に表示される人数
+    list_size: int = 10
+
+# 時間帯ごとの来店の多さ（夕方から夜に多い）
+HOURLY_PROFILE = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0.4, 0.5, 0.7, 0.9, 0.9, 0.8, 0.8, 1.0, 1.3, 1.7, 1.9, 1.8, 1.4, 0.9, 0.4]
+
+class VenueState:
+    """
+    日をまたいで続くプレイヤーの名前とライバル検索画面の並び
+    """
+    def __init__(self, venue: Venue, rng: random.Random):
+        self.players = [Player(f"DJ{i}", f"{i // 10000:04}-{i % 10000:04}") for i in range(venue.n_players)]
+        self.regulars = list(range(max(1, int(venue.n_players * venue.regular_ratio))))
+        # 最近プレイした順のプレイヤーの番号
+        self.recent = rng.sample(range(venue.n_players), min(venue.list_size, venue.n_players))
+
+def simulate_venue_day(
+        venue: Venue,
+        state: VenueState,
+        date: datetime.date,
+        rng: random.Random
+    ) -> list[tuple[datetime.datetime, list[Player]]]:
+    """
+    来店、筐体の順番待ち、プレイ（終わるとライバル検索画面の先頭に来る）、退店を一日分シミュレーションして、
+    sample_minutesおきにライバル検索画面の先頭list_size人を記録した行を返す
+    """
+    for i in range(len(state.players)):
+        if rng.random() < venue.rename_rate:
+            state.players[i] = state.players[i]._replace(name=f"{state.players[i].name}'")
+    open_at = datetime.datetime.combine(date, venue.open_time)
+    close_at = datetime.datetime.combine(date, venue.close_time)
+    minutes = (close_at - open_at).total_seconds() / 60
+    scale = venue.arrivals_per_hour * (1.5 if date.weekday() >= 5 else 1)
+    # (分, 種類, 番号) のイベント、種類は0がプレイ終了、1が来店
+    events: list[tuple[float, int, int]] = []
+    t = 0.0
+    peak = max(HOURLY_PROFILE)
+    while True:
+        # 一番多い時間帯の頻度で到着を作り、時間帯の多さの割合で間引く
+        t += rng.expovariate(scale * peak / 60)
+        if t >= minutes:
+            break
+        hour = (open_at + datetime.timedelta(minutes=t)).hour
+        if rng.random() < HOURLY_PROFILE[hour] / peak:
+            pool = state.regulars if rng.random() < 0.8 else range(len(state.players))
+            heapq.heappush(events, (t, 1, rng.choice(pool)))
+    in_venue: set[int] = set()
+    remaining: dict[int, int] = {}
+    queue: deque[int] = deque()
+    free = venue.machines
+    plays: list[tuple[float, int]] = []
+    def start_plays(now: float):
+        nonlocal free
+        while free > 0 and queue:
+            p = queue.popleft()
+            free -= 1
+            heapq.heappush(events, (now + venue.play_minutes * rng.uniform(0.7, 1.3), 0, p))
+    while events:
+        now, kind, p = heapq.heappop(events)
+        if kind == 1:
+            if p in in_venue or now >= minutes:
+                continue
+            in_venue.add(p)
+            remaining[p] = 1 + int(rng.expovariate(1 / max(venue.plays_per_visit - 1, 1e-9)))
+            queue.append(p)
+        else:
+            free += 1
+            plays.append((now, p))
+            remaining[p] -= 1
+            # 閉店までは並び直し、終われば帰る
+            if remaining[p] > 0 and now < minutes:
+                queue.append(p)
+            else:
+                in_venue.discard(p)
+        start_plays(now)
+    rows = []
+    recent = state.recent
+    i = 0
+    t = rng.uniform(0, 1)
+    while t < minutes:
+        while i < len(plays) and plays[i][0] <= t:
+            p = plays[i][1]
+            recent = [p] + [q for q in recent if q != p]
+            i += 1
+        rows.append((
+            open_at + datetime.timedelta(minutes=t),
+            [state.players[q] for q in recent[:venue.list_size]]
+        ))
+        t += venue.sample_minutes + rng.uniform(0, 0.5)
+    for _, p in plays[i:]:
+        recent = [p] + [q for q in recent if q != p]
+    state.recent = recent[:venue.list_size]
+    return rows
+
+def write_venue_logs(
+        directory: Path,
+        days: int,
+        venue: Venue = Venue(),
+        seed: int = 0,
+        start: datetime.date = datetime.date(2022,1,1),
+    ) -> list[datetime.date]:
+    """
+    架空の店舗をdays日分シミュレーションしたJSON形式のログを書き込む
+    """
+    rng = random.Random(seed)
+    repo = JsonRowLogRepository(directory)
+    state = VenueState(venue, rng)
+    dates = [start + datetime.timedelta(days=i) for i in range(days)]
+    for date in dates:
+        for t, row in simulate_venue_day(venue, state, date, rng):
+            repo.save_row(t, row)
+    return dates
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class LRUCache(Generic[K, V]):
+    """
+    上限付きのキャッシュ
+    上限を超えたら最近使われていないものから捨てる
+    weigherを指定すると個数に加えて重さ（メモリ量など）の合計もmaxweightまでにする
+    """
+    def __init__(
+            self,
+            maxsize: int,
+            maxweight: int | None = None,
+            weigher: Callable[[V], int] | None = None
+        ):
+        if maxsize <= 0:
+            raise ValueError("maxsize should be positive")
+        if (maxweight is None) != (weigher is None):
+            raise ValueError("maxweight and weigher should be given together")
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._weights: dict[K, int] = {}
+        # APIのワーカースレッドなどから同時に使われることがある
+        self._lock = threading.Lock()
+    def __len__(self) -> int:
+        return len(self._data)
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+    def get(self, key: K, default: V | None = None) -> V | None:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    def put(self, key: K, value: V):
+        with self._lock:
+            self._pop(key)
+            self._data[key] = value
+            if self.weigher is not None:
+                self._weights[key] = self.weigher(value)
+                self.weight += self._weights[key]
+            while len(self._data) > self.maxsize or (
+                # 重すぎる一つだけは残す
+                self.maxweight is not None and self.weight > self.maxweight and len(self._data) > 1
+            ):
+                self._pop(next(iter(self._data)))
+    def _pop(self, key: K) -> V | None:
+        self.weight -= self._weights.pop(key, 0)
+        return self._data.pop(key, None)
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            return self._pop(key)
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """
+        キャッシュになければcomputeの結果を登録して返す
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # 計算中はロックを持たない（同じキーを同時に計算することはあり得るが結果は同じ）
+        value = compute()
+        self.put(key, value)
+        return value
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,47 @@
+import functools
+import pickle
+import time
+from typing import Any, Callable, TypeVar
+
+from render_cache import RenderCache, get_etag
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+class CallbackCache:
+    """
+    Dashのコールバックの結果を引数とデータのバージョンごとに保存する
+    保存先はRenderCacheで、directoryを指定すれば同じディレクトリを使う複数のワーカープロセスで共有できる
+    ttl秒より古い結果はバージョンが同じでも計算し直す
+    """
+    def __init__(self, cache: RenderCache, ttl: float, clock: Callable[[], float] = time.time):
+        self.cache = cache
+        self.ttl = ttl
+        # 期限はプロセスをまたいで比べるのでwall clockを使う
+        self.clock = clock
+    def get(self, key: str) -> tuple[bool, Any]:
+        data = self.cache.get(key)
+        if data is None:
+            return False, None
+        expires, value = pickle.loads(data)
+        if expires < self.clock():
+            return False, None
+        return True, value
+    def put(self, key: str, value: Any):
+        self.cache.put(key, pickle.dumps((self.clock() + self.ttl, value)))
+    def memoize(self, get_version: Callable[..., str]) -> Callable[[F], F]:
+        """
+        コールバックと同じ引数を受け取るget_versionの値が変わらない間、結果を使い回すデコレータ
+        """
+        def decorator(func: F) -> F:
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = get_etag((func.__module__, func.__qualname__, args), get_version(*args))
+                found, value = self.get(key)
+                if not found:
+                    value = func(*args)
+                    self.put(key, value)
+                return value
+            return wrapper
+        return decorator
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
@@ -0,0 +1,34 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+class CoalescingExecutor:
+    """
+    解析や描画のような同期的で重い処理をスレッドプールで実行し、イベントループを止めないようにする
+    同じキーの処理が実行中なら新しく実行せずにその結果を共有する
+    max_workersが0ならイベントループ上でそのまま実行する
+    """
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers) if max_workers > 0 else None
+        # 実行中の処理（イベントループのスレッドからだけ触る）
+        self._running: dict[Hashable, asyncio.Future] = {}
+        # 実行中の処理の結果を共有した回数
+        self.coalesced = 0
+    async def run(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        if self._executor is None:
+            return func(*args)
+        future = self._running.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            self._running[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+        else:
+            self.coalesced += 1
+        # 一つのリクエストがキャンセルされても共有している処理は止めない
+        return await asyncio.shield(future)
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._running.get(key) is future:
+            del self._running[key]
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
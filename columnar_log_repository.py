@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+import numpy as np
+
+from log import Log, ILogRepository
+from log_repository import JsonRowLogRepository
+from player import Player, PlayerRegistry
+
+# 一日のログを構成する列、timesは最後に書き込む
+COLUMNS = ("codes", "offsets", "times")
+
+class ColumnarLogRepository(ILogRepository):
+    """
+    一日のログを列ごとにnumpyの配列ファイル（.npy）で保存する
+    - times: サンプルの時刻（マイクロ秒, int64）
+    - offsets: サンプルごとのcodesの開始位置（サンプル数+1, int32）
+    - codes: プレイヤーのコード（int32）
+    コードとIDの対応は全ての日で共通の辞書players.jsonに保存する
+    """
+    def __init__(self, directory: Path, registry: PlayerRegistry | None = None):
+        self.directory = directory
+        # 読み込んだログのプレイヤーを共通のコードで扱うためのregistry
+        self.registry = registry
+        # ファイルに保存するコードの辞書
+        self.dictionary = PlayerRegistry()
+        self._dictionary_mtime: int | None = None
+        self._load_dictionary()
+    def _dictionary_path(self) -> Path:
+        return self.directory / "players.json"
+    def _load_dictionary(self):
+        """
+        他のプロセスが辞書を更新していたら読み直す
+        """
+        path = self._dictionary_path()
+        if not path.exists():
+            return
+        mtime = path.stat().st_mtime_ns
+        if mtime != self._dictionary_mtime:
+            self.dictionary = PlayerRegistry.load(json.loads(path.read_text()))
+            self._dictionary_mtime = mtime
+    def _save_dictionary(self):
+        path = self._dictionary_path()
+        _replace_file(path, json.dumps(self.dictionary.dump(), ensure_ascii=False).encode())
+        self._dictionary_mtime = path.stat().st_mtime_ns
+    def get_path(self, date: datetime.date, column: str) -> Path:
+        return self.directory / f"log_{date.isoformat()}.{column}.npy"
+    def get_dates(self) -> list[datetime.date]:
+        return sorted(
+            datetime.date.fromisoformat(path.name[4:14])
+            for path in self.directory.glob("log_????-??-??.times.npy")
+        )
+    def get_arrays(self, date: datetime.date) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        その日のtimes, offsets, codesをコピーせずにmemmapで返す
+        コードは辞書（dictionary）のもの
+        """
+        return tuple(
+            np.load(self.get_path(date, column), mmap_mode="r")
+            for column in ("times", "offsets", "codes")
+        )
+    def _write_day(self, date: datetime.date, times: np.ndarray, offsets: np.ndarray, codes: np.ndarray):
+        arrays = {"times": times, "offsets": offsets, "codes": codes}
+        for column in COLUMNS:
+            buffer = BytesIO()
+            np.save(buffer, arrays[column])
+            _replace_file(self.get_path(date, column), buffer.getvalue())
+    def save_row(self, logged_at: datetime.datetime, player_list: list[Player]):
+        # 書き込みは数分に一回なので一日分を読んで書き直す
+        self._load_dictionary()
+        revision = self.dictionary.revision
+        row = np.array(list(map(self.dictionary.intern, player_list)), dtype=np.int32)
+        if self.dictionary.revision != revision:
+            self._save_dictionary()
+        date = logged_at.date()
+        if self.get_path(date, "times").exists():
+            times, offsets, codes = (np.asarray(a) for a in self.get_arrays(date))
+        else:
+            times = np.empty(0, dtype=np.int64)
+            offsets = np.zeros(1, dtype=np.int32)
+            codes = np.empty(0, dtype=np.int32)
+        self._write_day(
+            date,
+            np.append(times, _to_microseconds([logged_at])),
+            np.append(offsets, offsets[-1] + len(row)).astype(np.int32),
+            np.append(codes, row).astype(np.int32)
+        )
+    def save_log(self, log: Log):
+        """
+        一日分のログをまとめて保存する
+        """
+        if log.size == 0:
+            return
+        self._load_dictionary()
+        revision = self.dictionary.revision
+        # ログのregistryのコードを辞書のコードに変換する
+        lookup = {}
+        for c in log.get_player_codes():
+            lookup[c] = self.dictionary.intern_history(
+                log.registry.get_id(c), log.registry.get_name_history(c)
+            )
+        if self.dictionary.revision != revision:
+            self._save_dictionary()
+        rows = list(log.iter_codes())
+        self._write_day(
+            log.get_times()[0].date(),
+            _to_microseconds(log.get_times()),
+            np.cumsum([0] + list(map(len, rows)), dtype=np.int32),
+            np.array([lookup[c] for row in rows for c in row], dtype=np.int32)
+        )
+    def get_log_by_date(self, date: datetime.date) -> Log:
+        self._load_dictionary()
+        times, offsets, codes = self.get_arrays(date)
+        registry = self.registry if self.registry is not None else PlayerRegistry()
+        # 辞書のコードを読み込み先のregistryのコードに変換する
+        lookup = np.zeros(len(self.dictionary), dtype=np.int64)
+        for c in np.unique(codes).tolist():
+            lookup[c] = registry.intern_history(
+                self.dictionary.get_id(c), self.dictionary.get_name_history(c)
+            )
+        rows = lookup[codes].tolist()
+        bounds = offsets.tolist()
+        log = Log({}, registry)
+        for i, t in enumerate(times.astype("datetime64[us]").tolist()):
+            log.append_codes(t, rows[bounds[i]:bounds[i+1]])
+        return log
+    def get_version(self, date: datetime.date) -> tuple[int, int]:
+        stat = self.get_path(date, "times").stat()
+        return stat.st_size, stat.st_mtime_ns
+
+def _to_microseconds(times: list[datetime.datetime]) -> np.ndarray:
+    return np.array(times, dtype="datetime64[us]").astype(np.int64)
+
+def _replace_file(path: Path, data: bytes):
+    """
+    読み込み中のプロセスが途中の内容を見ないように一時ファイルから置き換える
+    同時に書き込む他のプロセスと一時ファイルが重ならないようにpidを付ける
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def convert_json_logs(source: JsonRowLogRepository, target: ColumnarLogRepository):
+    """
+    JSON形式のログを全て列形式に変換する
+    """
+    for date in source.get_dates():
+        target.save_log(source.get_log_by_date(date))
+
+if __name__ == "__main__":
+    from config import ScheduleLoggerSettings
+    settings = ScheduleLoggerSettings()
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else settings.log_directory / "columnar"
+    target.mkdir(parents=True, exist_ok=True)
+    convert_json_logs(JsonRowLogRepository(settings.log_directory), ColumnarLogRepository(target))
@@ -1,13 +1,16 @@
+import datetime
 import json
-from typing import Any
+from typing import Any, Literal
 from pathlib import Path
-from pydantic import BaseSettings, FilePath, HttpUrl
+from pydantic import BaseSettings, DirectoryPath, FilePath, HttpUrl
 
 def json_source(settings: BaseSettings) -> dict[str, Any]:
     return json.loads(Path("config.json").read_text())
 
 class Settings(BaseSettings):
     rival_search_url: HttpUrl
+    # ライバル検索画面の接続と応答を待つ秒数、応答がなければ諦めて次の取得まで待つ
+    request_timeout: float = 30
     
     class Config:
         extra = "ignore"
@@ -25,3 +28,15 @@ class Settings(BaseSettings):
                 env_settings,
                 file_secret_settings,
             )
+
+class ScheduleLoggerSettings(Settings):
+    log_directory: DirectoryPath
+    start_time: datetime.time
+    end_time: datetime.time
+    # 指定するとJSONのファイルではなくSQLiteのデータベースに記録する
+    log_database: Path | None = None
+    # deltaにするとJSONのファイルの代わりに前のサンプルとの差分を記録する
+    log_format: Literal["json", "delta"] = "json"
+    # ログを取る間隔（秒）の範囲、プレイヤーの入れ替わりが多いほど短くする
+    min_log_interval: float = 60
+    max_log_interval: float = 900
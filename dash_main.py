@@ -1,10 +1,22 @@
 import datetime
-import json
+import threading
+from pathlib import Path
 import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
-from dash import Dash, dcc, html, Input, Output, no_update
+from dash import Dash, dcc, html, Input, Output, State, no_update
 
-from log_usecase import LogUsecase
+from callback_cache import CallbackCache
+from log_usecase import LogUsecase, LogUsecaseSettings
+from render_cache import RenderCache
+
+class DashSettings(LogUsecaseSettings):
+    # コールバックの結果をメモリに残す合計のバイト数と、指定するとワーカープロセスで共有するディレクトリ
+    callback_cache_bytes: int = 64 * 2**20
+    callback_cache_directory: Path | None = None
+    # データが変わっていなくてもコールバックを計算し直すまでの秒数
+    callback_cache_ttl: float = 3600
+
+settings = DashSettings()
 
 app = Dash(
     __name__,
@@ -12,7 +24,18 @@ app = Dash(
     external_stylesheets=[dbc.themes.BOOTSTRAP],
     title="IIDX Home Analyzer"
 )
-log_usecase = LogUsecase()
+log_usecase = LogUsecase(settings=settings)
+log_usecase.start_refresh()
+callback_cache = CallbackCache(
+    RenderCache(settings.callback_cache_bytes, settings.callback_cache_directory),
+    settings.callback_cache_ttl
+)
+
+def get_player_version(id: str | None) -> str:
+    return log_usecase.get_data_version(log_usecase.get_dates_of_player(id) if id else [])
+
+def get_weekday_version(weekday: int) -> str:
+    return log_usecase.get_data_version(log_usecase.get_dates(weekday))
 
 
 player_layout = html.Div([
@@ -31,6 +54,7 @@ player_layout = html.Div([
     Output("player-play-time", "children"),
     Input("player-id", "value")
 )
+@callback_cache.memoize(get_player_version)
 def play_time(value):
     if value == None:
         return
@@ -42,12 +66,13 @@ def play_time(value):
     ))
     fig.update_xaxes(tickformat="%H:%M")
     fig.update_layout(hovermode="x")
-    return dcc.Graph(figure=fig)
+    return dcc.Graph(figure=fig.to_dict())
 
 @app.callback(
     Output("player-play-date", "children"),
     Input("player-id", "value")
 )
+@callback_cache.memoize(get_player_version)
 def play_date(value):
     if value == None:
         return
@@ -72,49 +97,48 @@ date_layout = html.Div([
         style={"padding": "0.5rem 1rem"}
     ),
     html.Div(id="date-headcounts"),
-    dcc.Tooltip(id="date-headcounts-tooltip"),
-    dcc.Store(id="date-headcounts-players-store")
+    dcc.Tooltip(id="date-headcounts-tooltip")
 ])
 
 @app.callback(
     Output("date-headcounts", "children"),
-    Output("date-headcounts-players-store", "data"),
     Input("date-input", "date")
 )
 def date_headcounts(date_iso):
     if date_iso == None:
-        return None, None
+        return None
     date = datetime.date.fromisoformat(date_iso)
-    data = log_usecase.get_players_over_time(date)
+    # グラフには人数だけを渡し、プレイヤーはホバーしたサンプルの分だけサーバーで引く
+    data = log_usecase.get_headcounts_of_date(date)
     # plotlyが勝手にdatetimeのxaxisのフォーマットを変えるので合わせる必要がある
-    data = dict(zip(
-        map(lambda dt: dt.isoformat(sep=" ", timespec="minutes"), data.keys()),
-        map(list, data.values())
-    ))
-    xs = list(data.keys())
-    ys = list(map(len, data.values()))
+    xs = [dt.isoformat(sep=" ", timespec="minutes") for dt in data.keys()]
+    ys = list(data.values())
     fig = go.Figure(go.Scatter(
         x=xs,
         y=ys
     ))
     fig.update_layout(hovermode="x")
     #fig.update_xaxes(range=[xs[0], xs[-1]])
-    return dcc.Graph(figure=fig, id="date-headcounts-graph"), json.dumps(data)
+    return dcc.Graph(figure=fig, id="date-headcounts-graph")
 
 @app.callback(
     Output("date-headcounts-tooltip", "show"),
     Output("date-headcounts-tooltip", "bbox"),
     Output("date-headcounts-tooltip", "children"),
     Input("date-headcounts-graph", "hoverData"),
-    Input("date-headcounts-players-store", "data")
+    State("date-input", "date")
 )
-def date_headcounts_tooltip(hoverData, data):
-    if hoverData is None:
+def date_headcounts_tooltip(hoverData, date_iso):
+    if hoverData is None or date_iso is None:
         return False, no_update, no_update
     pt = hoverData["points"][0]
-    data = json.loads(data)
     bbox = pt["bbox"]
-    players = list(map(lambda p: p[0], data[pt["x"]]))
+    date = datetime.date.fromisoformat(date_iso)
+    try:
+        players = [p.name for p in log_usecase.get_players_at(date, pt["pointIndex"])]
+    except (KeyError, ValueError):
+        # ログのない日や範囲外のサンプルはツールチップを出さない
+        return False, no_update, no_update
     children = [
         html.Div([
             html.P(p) for p in players
@@ -155,16 +179,34 @@ stats_layout = html.Div([
     Output("stats-weekday-headcounts", "figure"),
     [Input("stats-weekday-radio", "value")]
 )
+@callback_cache.memoize(get_weekday_version)
 def stats_weekday_average(value):
-    data = log_usecase.get_headcounts_average_weekday(value)
-    fig = go.Figure(go.Scatter(
-        x=[datetime.datetime(2022,1,1) + t for t in data.keys()],
-        y=list(data.values()),
-        hovertemplate="<b>%{x|%H:%M}</b><br>%{y} times<extra></extra>"
-    ))
+    # 平均以外は凡例から表示できるようにして、一度の集計でまとめて計算する
+    result = log_usecase.get_headcounts_stats(["mean", "median", "max"], weekday=value)
+    fig = go.Figure([
+        go.Scatter(
+            x=[datetime.datetime(2022,1,1) + t for t in data.keys()],
+            y=list(data.values()),
+            name=name,
+            visible=True if name == "mean" else "legendonly",
+            hovertemplate="<b>%{x|%H:%M}</b><br>%{y} times<extra></extra>"
+        )
+        for name, data in result.stats.items()
+    ])
     fig.update_xaxes(tickformat="%H:%M")
     fig.update_layout(hovermode="x")
-    return fig
+    # go.Figureは読み込み直すときに検証し直して遅いので、キャッシュするのはdictにする
+    return fig.to_dict()
+
+def warm_weekday_average():
+    """
+    曜日のラジオボタンを切り替えたときに計算しなくてよいように、全ての曜日のグラフを作っておく
+    """
+    for weekday in range(7):
+        stats_weekday_average(weekday)
+
+# 起動を待たせないように別のスレッドで作る
+threading.Thread(target=warm_weekday_average, daemon=True).start()
 
 
 navbar = dbc.NavbarSimple(
@@ -0,0 +1,181 @@
+import datetime
+import json
+import sys
+from pathlib import Path
+from typing import IO, Iterator
+
+from log import IFollowableLogRepository, Log, ReadRows
+from log_repository import JsonRowLogRepository
+from player import Player, PlayerRegistry
+
+def apply_delta(previous: list[int], moved: list[int], size: int) -> list[int]:
+    """
+    previousの先頭にmovedを移し、size人に切り詰めたリスト
+    """
+    moved_set = set(moved)
+    rest = [c for c in previous if c not in moved_set]
+    return moved + rest[:size - len(moved)]
+
+def encode_delta(previous: list[int], current: list[int]) -> list[int]:
+    """
+    apply_deltaでpreviousからcurrentを作れる最短のmoved
+    プレイしたプレイヤーが先頭に来るので、ほとんどの場合は前回からプレイした人数だけになる
+    """
+    for k in range(len(current)):
+        if apply_delta(previous, current[:k], len(current)) == current:
+            return current[:k]
+    return current
+
+def iter_delta_rows(lines: IO[bytes]) -> Iterator[tuple[datetime.datetime, list[int], list[Player]]]:
+    """
+    差分形式のログを一行ずつ読み、時刻とその日の辞書の番号で表したプレイヤーのリストを返す
+    辞書（番号ごとのプレイヤー）は読み進めると伸びる同じリストを返す
+    """
+    players: list[Player] = []
+    row: list[int] = []
+    for line in lines:
+        fmt = json.loads(line)
+        players.extend(map(Player._make, fmt.get("p", [])))
+        if "k" in fmt:
+            row = fmt["k"]
+        else:
+            row = apply_delta(row, fmt["m"], fmt.get("n", len(row)))
+        yield datetime.datetime.fromisoformat(fmt["t"]), row, players
+
+class _DayWriterState:
+    """
+    その日のファイルに追記するための辞書と最後のサンプル
+    """
+    def __init__(self, date: datetime.date):
+        self.date = date
+        # IDごとの最後に書いた名前と辞書の番号
+        # Playerは名前を比べないので、IDだけをキーにして名前が変わったことを見分ける
+        self.codes: dict[str, tuple[str, int]] = {}
+        # 辞書に書いたプレイヤーの数（名前を変えたプレイヤーは変えるたびに数える）
+        self.size = 0
+        self.row: list[int] = []
+        self.last: datetime.datetime | None = None
+
+class DeltaLogRepository(IFollowableLogRepository):
+    """
+    一日ごとのファイルに、最初のサンプルは全員（キーフレーム）、以降は前のサンプルから先頭に移ったプレイヤーだけを書く
+    プレイヤーはその日の辞書の番号で表し、名前とIDはその日に初めて現れた行と名前が変わった行にだけ書く
+    一行は {"t": 時刻, "p": 新しいプレイヤー, "k": 全員 または "m": 先頭に移ったプレイヤー, "n": 人数（変わったときだけ）}
+    """
+    def __init__(self, log_directory: Path, registry: PlayerRegistry | None = None):
+        self.log_directory = log_directory
+        # 読み込んだログのプレイヤーを共通のコードで扱うためのregistry
+        self.registry = registry
+        self._state: _DayWriterState | None = None
+    def get_path(self, date: datetime.date) -> Path:
+        return self.log_directory / f"log_{date.isoformat()}.delta"
+    def get_dates(self) -> list[datetime.date]:
+        return sorted(
+            datetime.date.fromisoformat(path.stem[4:])
+            for path in self.log_directory.glob("log_????-??-??.delta")
+        )
+    def _get_state(self, date: datetime.date) -> _DayWriterState:
+        """
+        書き込み中の日の状態、別の日ならファイルを読んで作り直す
+        """
+        if self._state is not None and self._state.date == date:
+            return self._state
+        state = _DayWriterState(date)
+        path = self.get_path(date)
+        if path.exists():
+            players: list[Player] = []
+            with open(path, "rb") as f:
+                for logged_at, row, players in iter_delta_rows(f):
+                    state.row, state.last = row, logged_at
+            # 同じIDが何度も書かれていれば最後の名前の番号を使う
+            state.codes = {p.id: (p.name, code) for code, p in enumerate(players)}
+            state.size = len(players)
+        self._state = state
+        return state
+    def save_row(self, logged_at: datetime.datetime, player_list: list[Player]):
+        state = self._get_state(logged_at.date())
+        if state.last is not None and logged_at <= state.last:
+            raise ValueError("delta log accepts only rows after the last sample")
+        new = []
+        row = []
+        for p in player_list:
+            entry = state.codes.get(p.id)
+            if entry is None or entry[0] != p.name:
+                # 初めて現れたか名前が変わったプレイヤーは新しい番号で辞書に書き、読むときに名前の履歴に残す
+                entry = state.codes[p.id] = (p.name, state.size)
+                state.size += 1
+                new.append(p)
+            row.append(entry[1])
+        fmt: dict = {"t": logged_at.isoformat()}
+        if new:
+            fmt["p"] = new
+        moved = encode_delta(state.row, row) if state.last is not None else row
+        if len(moved) == len(row):
+            fmt["k"] = row
+        else:
+            fmt["m"] = moved
+            if len(row) != len(state.row):
+                fmt["n"] = len(row)
+        with open(self.get_path(logged_at.date()), "a") as f:
+            f.write(json.dumps(fmt, separators=(",", ":")) + "\n")
+        state.row, state.last = row, logged_at
+    def _read_lines(self, date: datetime.date, end: int | None = None) -> tuple[int, list[bytes]]:
+        """
+        書き終えた行（endを指定するとそのバイト位置まで）と、読み終えたバイト位置を返す
+        """
+        lines = []
+        position = 0
+        with open(self.get_path(date), "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n") or (end is not None and position + len(line) > end):
+                    break
+                position += len(line)
+                lines.append(line)
+        return position, lines
+    def read_rows(self, date: datetime.date, offset: int) -> ReadRows:
+        """
+        offsetはファイルのバイト位置
+        各行は前の行と辞書に依存するので、その日のファイルを先頭から読んでoffsetより後の行を返す
+        """
+        end, lines = self._read_lines(date)
+        if end < offset:
+            # ファイルが書き換えられて短くなったので先頭から読み直す
+            offset = 0
+        rows = []
+        position = 0
+        for line, (logged_at, row, players) in zip(lines, iter_delta_rows(lines)):
+            position += len(line)
+            if position > offset:
+                # 辞書の番号ごとのPlayerはその番号を書いたときの名前
+                rows.append((logged_at, [players[c] for c in row]))
+        return ReadRows(offset, end, rows)
+    def get_log_by_date(self, date: datetime.date, end: int | None = None) -> Log:
+        log = Log({}, self.registry)
+        # その日の辞書の番号からregistryのコードへの対応
+        codes: list[int] = []
+        for logged_at, row, players in iter_delta_rows(self._read_lines(date, end)[1]):
+            codes.extend(log.registry.intern(p, logged_at) for p in players[len(codes):])
+            log.append_codes(logged_at, [codes[c] for c in row])
+        return log
+    def get_version(self, date: datetime.date) -> tuple[int, int]:
+        stat = self.get_path(date).stat()
+        return stat.st_size, stat.st_mtime_ns
+
+def convert_json_logs(source: JsonRowLogRepository, target: DeltaLogRepository):
+    """
+    JSON形式のログを差分形式に変換する、変換済みの日は飛ばす
+    """
+    converted = set(target.get_dates())
+    for date in source.get_dates():
+        if date in converted:
+            continue
+        # Logにすると最新の名前になるので、一日の途中の名前の変更も残るように書かれた行のまま変換する
+        for logged_at, player_list in source.iter_rows(date):
+            target.save_row(logged_at, player_list)
+
+if __name__ == "__main__":
+    from config import ScheduleLoggerSettings
+    settings = ScheduleLoggerSettings()
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else settings.log_directory / "delta"
+    target.mkdir(parents=True, exist_ok=True)
+    convert_json_logs(JsonRowLogRepository(settings.log_directory), DeltaLogRepository(target))
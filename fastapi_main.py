@@ -1,107 +1,347 @@
+import asyncio
 import datetime
-import matplotlib
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from io import BytesIO
-from fastapi import Depends, FastAPI
-from fastapi.responses import StreamingResponse
-from typing import Callable
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+from pathlib import Path
+from typing import Any, Callable, Literal
 
-from log_usecase import LogUsecase
+from coalescing_executor import CoalescingExecutor
+from figure_pool import FORMATS, FigurePool
+from interpolator import SLOTS
+from log_usecase import LogUsecase, LogUsecaseSettings
+from render_cache import RenderCache, get_etag, match_etag
+from series import Series, choose_media_type, encode
 
-# GUIを使わない
-matplotlib.use("Agg")
+class APISettings(LogUsecaseSettings):
+    # 解析と描画を同時に実行するスレッド数、0ならイベントループ上で実行する
+    request_workers: int = 4
+    # 描画したグラフをメモリに残す合計のバイト数と、指定するとディスクにも残すディレクトリ
+    render_cache_bytes: int = 64 * 2**20
+    render_cache_directory: Path | None = None
+    # ブラウザがグラフを再検証せずに使う秒数
+    render_max_age: int = 60
+
+settings = APISettings()
 
 app = FastAPI()
+executor = CoalescingExecutor(settings.request_workers)
+render_cache = RenderCache(settings.render_cache_bytes, settings.render_cache_directory)
+# 描画はexecutorのスレッドで行うので同じ数のFigureを用意しておく
+figure_pool = FigurePool(max(1, settings.request_workers))
+
+# グラフの形式
+ChartFormat = Literal["png", "svg"]
 
-def get_buffer() -> BytesIO:
-    with BytesIO() as buf:
-        yield buf
-
-def plot_datetime(xs: list[datetime.datetime], ys: list[float], buffer: BytesIO):
-    # open
-    fig, ax = plt.subplots(figsize=(8,4))
-    ax.plot(xs, ys)
-    ax.minorticks_on()
-    ax.grid(alpha=0.8)
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-    fig.savefig(buffer, format="png")
-    buffer.seek(0)
-    # free
-    plt.close(fig)
-def plot_oneday(xs: list[datetime.timedelta], ys: list[float], buffer: BytesIO):
+def plot_datetime(xs: list[datetime.datetime], ys: list[float], format: str = "png") -> bytes:
+    return figure_pool.render(xs, ys, format)
+def plot_oneday(xs: list[datetime.timedelta], ys: list[float], format: str = "png") -> bytes:
     fake = datetime.datetime(2022,1,1)
     xs = [fake + t for t in xs]
-    plot_datetime(xs, ys, buffer)
+    return plot_datetime(xs, ys, format)
+
+def render_datetime(format: str, get_data: Callable[..., dict[datetime.datetime, float]], *args) -> bytes:
+    data = get_data(*args)
+    return plot_datetime(list(data.keys()), list(data.values()), format)
+def render_oneday(format: str, get_data: Callable[..., dict[datetime.timedelta, float]], *args) -> bytes:
+    data = get_data(*args)
+    return plot_oneday(list(data.keys()), list(data.values()), format)
+
+def render_and_store(etag: str, render: Callable[..., bytes], *args) -> bytes:
+    image = render(*args)
+    render_cache.put(etag, image)
+    return image
+
+async def run_chart(
+        request: Request,
+        key: tuple,
+        version: str,
+        format: str,
+        render: Callable[..., bytes],
+        *args: Any
+    ) -> Response:
+    """
+    グラフをkeyとデータのバージョンから作るETagでキャッシュして返す
+    ブラウザが同じETagを持っていれば304を返し、描画はexecutorで実行して同じグラフの描画とは結果を共有する
+    """
+    etag = get_etag((*key, format), version)
+    headers = get_cache_headers(etag)
+    if match_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    image = render_cache.get(etag)
+    if image is None:
+        image = await executor.run(etag, render_and_store, etag, render, format, *args)
+    return Response(image, media_type=FORMATS[format], headers=headers)
+
+async def get_data_version(
+        log_usecase: LogUsecase,
+        get_dates: Callable[..., list[datetime.date]],
+        *args: Any
+    ) -> str:
+    """
+    get_datesの日付のデータのバージョン、LogUsecaseのロックを待つことがあるのでイベントループの外で取る
+    """
+    def get() -> str:
+        return log_usecase.get_data_version(get_dates(*args))
+    return await asyncio.to_thread(get)
+
+def get_cache_headers(etag: str) -> dict[str, str]:
+    return {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={settings.render_max_age}"}
+
+def encode_series(get_series: Callable[..., Series], media_type: str, *args) -> tuple[bytes, dict[str, str]]:
+    return encode(get_series(*args), media_type)
+
+async def run_series(
+        request: Request,
+        key: tuple,
+        version: str,
+        get_series: Callable[..., Series],
+        *args: Any
+    ) -> Response:
+    """
+    グラフの元のデータをAcceptで選んだ形式（列形式のJSONか.npy）で返す
+    """
+    media_type = choose_media_type(request.headers.get("accept"))
+    etag = get_etag((*key, media_type), version)
+    headers = {**get_cache_headers(etag), "Vary": "Accept"}
+    if match_etag(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    content, series_headers = await executor.run(etag, encode_series, get_series, media_type, *args)
+    return Response(content, media_type=media_type, headers={**headers, **series_headers})
 
 class SingletonLogUsecase(LogUsecase):
     def __call__(self):
         return self
 
-get_log_usecase: Callable[[], LogUsecase] = SingletonLogUsecase()
+# config.jsonは一度だけ読み込んでLogUsecaseに渡す
+get_log_usecase: Callable[[], LogUsecase] = SingletonLogUsecase(settings=settings)
+
+@app.on_event("startup")
+async def start_refresh():
+    get_log_usecase().start_refresh()
 
+@app.on_event("shutdown")
+async def shutdown_executor():
+    executor.shutdown()
+
+@app.post("/refresh")
+async def refresh(log_usecase: LogUsecase = Depends(get_log_usecase)):
+    return await executor.run(("refresh",), log_usecase.refresh)
 
 @app.get("/player/list")
 async def player_list(log_usecase: LogUsecase = Depends(get_log_usecase)):
     return log_usecase.get_all_playerlist()
 
+@app.get("/player/{id}/names")
+async def player_names(id: str, log_usecase: LogUsecase = Depends(get_log_usecase)):
+    return log_usecase.get_player_names(id)
+
 @app.get("/player/{id}/date")
 async def player_date(id: str, log_usecase: LogUsecase = Depends(get_log_usecase)):
-    return log_usecase.get_all_playdate(id)
+    return await executor.run(("player_date", id), log_usecase.get_all_playdate, id)
 
 @app.get("/player/{id}/time")
 async def player_time(
         id: str,
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    playtime = log_usecase.get_playtime(id)
-    plot_oneday(playtime.keys(), playtime.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    return await run_chart(
+        request,
+        ("player_time", id),
+        await get_data_version(log_usecase, log_usecase.get_dates_of_player, id),
+        format,
+        render_oneday,
+        log_usecase.get_playtime,
+        id
+    )
 
 @app.get("/headcounts/average")
 async def headcounts_average(
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    data = log_usecase.get_headcounts_average()
-    plot_oneday(data.keys(), data.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    return await run_chart(
+        request,
+        ("headcounts_average",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        format,
+        render_oneday,
+        log_usecase.get_headcounts_average
+    )
 
 @app.get("/headcounts/average/{weekday}")
 async def headcounts_average_of_weekday(
         weekday: int,
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    data = log_usecase.get_headcounts_average_weekday(weekday)
-    plot_oneday(data.keys(), data.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    return await run_chart(
+        request,
+        ("headcounts_average", weekday),
+        await get_data_version(log_usecase, log_usecase.get_dates, weekday),
+        format,
+        render_oneday,
+        log_usecase.get_headcounts_average_weekday,
+        weekday
+    )
 
 @app.get("/headcounts/median")
 async def headcounts_median(
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    data = log_usecase.get_headcounts_median()
-    plot_oneday(data.keys(), data.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    return await run_chart(
+        request,
+        ("headcounts_median",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        format,
+        render_oneday,
+        log_usecase.get_headcounts_median
+    )
 
 @app.get("/headcounts/max")
 async def headcounts_max(
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
+    ):
+    return await run_chart(
+        request,
+        ("headcounts_max",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        format,
+        render_oneday,
+        log_usecase.get_headcounts_max
+    )
+
+@app.get("/headcounts/stats")
+async def headcounts_stats(
+        stat: list[str] = Query(["mean"]),
+        percentile: list[float] = Query([]),
+        weekday: int | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    data = log_usecase.get_headcounts_max()
-    plot_oneday(data.keys(), data.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    """
+    複数の統計をまとめて計算して、時刻と統計ごとの値の列をJSONで返す
+    """
+    dates = None
+    if start is not None or end is not None:
+        dates = [
+            d for d in log_usecase.dates
+            if (start is None or start <= d) and (end is None or d <= end)
+        ]
+    key = ("headcounts_stats", tuple(stat), tuple(percentile), weekday, start, end)
+    try:
+        result = await executor.run(
+            key, log_usecase.get_headcounts_stats, stat, percentile, weekday, dates
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    times = [f"{s // 3600:02}:{s // 60 % 60:02}" for s in SLOTS.tolist()]
+    return {
+        "count": result.count,
+        "times": times,
+        "stats": {name: list(data.values()) for name, data in result.stats.items()},
+    }
 
 @app.get("/headcounts/{date}")
 async def headcounts_of_date(
         date: datetime.date,
-        log_usecase: LogUsecase = Depends(get_log_usecase),
-        buffer = Depends(get_buffer)
+        request: Request,
+        format: ChartFormat = "png",
+        log_usecase: LogUsecase = Depends(get_log_usecase)
+    ):
+    try:
+        return await run_chart(
+            request,
+            ("headcounts_of_date", date),
+            await get_data_version(log_usecase, lambda: [date]),
+            format,
+            render_datetime,
+            log_usecase.get_headcounts_of_date,
+            date
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"log of {date} not found")
+
+@app.get("/data/player/{id}/time")
+async def player_time_data(
+        id: str,
+        request: Request,
+        log_usecase: LogUsecase = Depends(get_log_usecase)
+    ):
+    return await run_series(
+        request,
+        ("player_time", id),
+        await get_data_version(log_usecase, log_usecase.get_dates_of_player, id),
+        log_usecase.get_playtime_series,
+        id
+    )
+
+@app.get("/data/headcounts/average")
+async def headcounts_average_data(request: Request, log_usecase: LogUsecase = Depends(get_log_usecase)):
+    return await run_series(
+        request,
+        ("headcounts_average",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        log_usecase.get_headcounts_series,
+        "mean"
+    )
+
+@app.get("/data/headcounts/average/{weekday}")
+async def headcounts_average_of_weekday_data(
+        weekday: int,
+        request: Request,
+        log_usecase: LogUsecase = Depends(get_log_usecase)
+    ):
+    return await run_series(
+        request,
+        ("headcounts_average", weekday),
+        await get_data_version(log_usecase, log_usecase.get_dates, weekday),
+        log_usecase.get_headcounts_series,
+        "mean",
+        weekday
+    )
+
+@app.get("/data/headcounts/median")
+async def headcounts_median_data(request: Request, log_usecase: LogUsecase = Depends(get_log_usecase)):
+    return await run_series(
+        request,
+        ("headcounts_median",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        log_usecase.get_headcounts_series,
+        "median"
+    )
+
+@app.get("/data/headcounts/max")
+async def headcounts_max_data(request: Request, log_usecase: LogUsecase = Depends(get_log_usecase)):
+    return await run_series(
+        request,
+        ("headcounts_max",),
+        await get_data_version(log_usecase, log_usecase.get_dates),
+        log_usecase.get_headcounts_series,
+        "max"
+    )
+
+@app.get("/data/headcounts/{date}")
+async def headcounts_of_date_data(
+        date: datetime.date,
+        request: Request,
+        log_usecase: LogUsecase = Depends(get_log_usecase)
     ):
-    data = log_usecase.get_headcounts_of_date(date)
-    plot_datetime(data.keys(), data.values(), buffer)
-    return StreamingResponse(buffer, media_type="image/png")
+    try:
+        return await run_series(
+            request,
+            ("headcounts_of_date", date),
+            await get_data_version(log_usecase, lambda: [date]),
+            log_usecase.get_headcounts_of_date_series,
+            date
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"log of {date} not found")
@@ -1,12 +1,11 @@
 import http.cookies
+import re
+from html.parser import HTMLParser
 import requests
-from bs4 import BeautifulSoup
 
 from config import Settings
 from player import Player
 
-settings = Settings()
-
 class ResultTableNotFoundError(Exception):
     """
     ネットワーク以外の原因でプレイヤー表が見つからない際の例外
@@ -15,8 +14,93 @@ class ResultTableNotFoundError(Exception):
         self.status_code = status_code
         self.html = html
 
-class Fetcher:
+# id="result"の属性と、プレイヤー表の開始タグと、入れ子の表がないか確かめるための表のタグ
+RESULT_ID = re.compile(r"""\sid\s*=\s*["']?result["'\s/>]""", re.IGNORECASE)
+RESULT_TABLE = re.compile(r"""<table\b[^>]*?\sid\s*=\s*["']?result["'\s/>]""", re.IGNORECASE)
+TABLE_TAG = re.compile(r"<(/?)table\b[^>]*>", re.IGNORECASE)
+
+class ResultRowsParser(HTMLParser):
+    """
+    表の中の行ごとにtdのテキストを集める
+    """
     def __init__(self):
+        super().__init__()
+        self.rows: list[list[str]] = []
+        self._cell: list[str] | None = None
+    def _close_cell(self):
+        if self._cell is not None:
+            self.rows[-1].append("".join(self._cell))
+            self._cell = None
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._close_cell()
+            self.rows.append([])
+        elif tag == "td" and self.rows:
+            self._close_cell()
+            self._cell = []
+    def handle_endtag(self, tag):
+        if tag in ("td", "tr"):
+            self._close_cell()
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+    def close(self):
+        super().close()
+        self._close_cell()
+
+def parse_result_table(html: str) -> list[Player] | None:
+    """
+    プレイヤー表の部分だけを切り出して読む
+    表が見つからない、入れ子の表があるなど想定と違う形ならNone
+    """
+    start = RESULT_TABLE.search(html)
+    if start is None:
+        return None
+    # 表の終わりまでだけを読む
+    end = TABLE_TAG.search(html, start.end())
+    if end is None or end.group(1) != "/":
+        return None
+    parser = ResultRowsParser()
+    parser.feed(html[start.start():end.end()])
+    parser.close()
+    rows = parser.rows[1:] # ヘッダーをスキップ
+    if any(len(tds) < 2 for tds in rows):
+        return None
+    return [Player(tds[0], tds[1]) for tds in rows]
+
+def parse_result_table_soup(html: str) -> list[Player] | None:
+    """
+    ページ全体をBeautifulSoupで読んでid="result"の要素からプレイヤーを取り出す
+    """
+    # 表の形が想定と違うときだけ使うので必要になってから読み込む
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find(id="result")
+    if table == None:
+        return None
+    trs = table.find_all("tr")[1:] # ヘッダーをスキップ
+    ret = []
+    for tr in trs:
+        tds = tr.find_all("td")
+        name, id = tds[0].text, tds[1].text
+        ret.append(Player(name, id))
+    return ret
+
+def parse_log(html: str) -> list[Player] | None:
+    """
+    ライバル検索画面のHTMLからプレイヤーのリストを取り出す、表がなければNone
+    """
+    players = parse_result_table(html)
+    if players is not None:
+        return players
+    if RESULT_ID.search(html) is None:
+        # メンテナンス中やログインしていないページはページ全体を読むまでもない
+        return None
+    return parse_result_table_soup(html)
+
+class Fetcher:
+    def __init__(self, settings: Settings | None = None):
+        self.settings = settings if settings is not None else Settings()
         self.session = requests.session()
     def load_cookies_string(self, cookies: str):
         """
@@ -30,17 +114,10 @@ class Fetcher:
         """
         ライバル検索画面からプレイヤーのリストを取得する
         """
-        res = self.session.get(settings.rival_search_url)
-        soup = BeautifulSoup(res.text, "html.parser")
-        table = soup.find(id="result")
-        if table == None:
+        res = self.session.get(self.settings.rival_search_url, timeout=self.settings.request_timeout)
+        players = parse_log(res.text)
+        if players == None:
             # 何らかの原因で表が見つからない
             # メンテナンス中、cookieが未設定、cookieが無効になった
             raise ResultTableNotFoundError(res.status_code, res.text)
-        trs = table.find_all("tr")[1:] # ヘッダーをスキップ
-        ret = []
-        for tr in trs:
-            tds = tr.find_all("td")
-            name, id = tds[0].text, tds[1].text
-            ret.append(Player(name, id))
-        return ret
+        return players
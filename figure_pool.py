@@ -0,0 +1,59 @@
+import datetime
+import queue
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+# 描画できる形式とそのMIMEタイプ
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+class FigurePool:
+    """
+    時刻を横軸にした折れ線グラフを描画するFigureのプール
+    pyplotを使わずにFigureを作り、軸や目盛りの設定を済ませておいて、描画ごとに線のデータだけを差し替える
+    一つのFigureは同時に一つのスレッドだけが使うので、複数のスレッドから描画できる
+    """
+    def __init__(self, size: int = 4, figsize: tuple[float, float] = (8, 4)):
+        self.figsize = figsize
+        self._pool: queue.LifoQueue["Figure"] = queue.LifoQueue()
+        # 使われていないFigureはsize個まで残す
+        self._size = size
+    def _create(self) -> "Figure":
+        # matplotlibは読み込みが重いので最初に描画するときに読み込む
+        import matplotlib.dates as mdates
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=self.figsize)
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        ax.xaxis_date()
+        ax.plot([], [])
+        ax.minorticks_on()
+        ax.grid(alpha=0.8)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+        return fig
+    def _acquire(self) -> "Figure":
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._create()
+    def _release(self, fig: "Figure"):
+        if self._pool.qsize() < self._size:
+            self._pool.put(fig)
+    def render(self, xs: list[datetime.datetime], ys: list[float], format: str = "png") -> bytes:
+        if format not in FORMATS:
+            raise ValueError(f"unsupported format: {format}")
+        fig = self._acquire()
+        import matplotlib.dates as mdates
+        try:
+            ax = fig.axes[0]
+            ax.lines[0].set_data(mdates.date2num(xs), ys)
+            ax.relim()
+            ax.autoscale_view()
+            with BytesIO() as buffer:
+                fig.savefig(buffer, format=format)
+                return buffer.getvalue()
+        finally:
+            self._release(fig)
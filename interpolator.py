@@ -1,109 +1,168 @@
 import datetime
-import matplotlib.dates as mdates
-from collections import defaultdict
 from abc import ABC, abstractmethod
-from statistics import median_high
-from scipy import interpolate
+from typing import Sequence
+import numpy as np
 
-def _interpolate_datetimex(
-        xs: list[datetime.datetime],
-        ys: list[float],
-        new_xs: list[datetime.datetime],
-    ) -> list[float]:
-    _xs = mdates.date2num(xs)
-    f = interpolate.interp1d(_xs, ys, kind="nearest", bounds_error=False, fill_value=0)
-    _new_xs = mdates.date2num(new_xs)
-    ys_new = f(_new_xs)
-    return ys_new
+# 補間する時刻の間隔（分）
+TICK = 5
+# 一日を補間する時刻（0時からの秒）、24:00からTICK分前までを扱う
+SLOTS = np.arange(0, 24*60*60, TICK*60)
+
+def _seconds_of_day(xs: list[datetime.datetime]) -> np.ndarray:
+    return np.array([
+        (t - datetime.datetime.combine(t.date(), datetime.time.min)).total_seconds()
+        for t in xs
+    ])
+
+def resample_oneday(xs: list[datetime.datetime], ys: list[float]) -> np.ndarray:
+    """
+    時系列のデータを一日の`SLOTS`の時刻に最近傍補間する、範囲外は0にする
+    `xs`は時系列順で1日以内な必要がある
+    """
+    if xs[-1] - xs[0] > datetime.timedelta(days=1):
+        raise ValueError("`xs` should be in 24 hours")
+    _xs = _seconds_of_day(xs)
+    _ys = np.asarray(ys, dtype=float)
+    # 日付をまたぐと時刻の順番が変わるのでinterp1dと同じく安定ソートする
+    order = np.argsort(_xs, kind="mergesort")
+    _xs, _ys = _xs[order], _ys[order]
+    # scipy.interpolate.interp1d(kind="nearest")と同じく、ちょうど中間の時刻は前のデータを使う
+    bounds = (_xs[1:] + _xs[:-1]) / 2
+    new_ys = _ys[np.searchsorted(bounds, SLOTS, side="left")]
+    new_ys[(SLOTS < _xs[0]) | (SLOTS > _xs[-1])] = 0
+    return new_ys
 
 class OnedayAccumulator(ABC):
+    """
+    一日に補間したデータを日数×`SLOTS`の行列に集めて集計する
+    """
     def __init__(self):
-        tick = 5
-        # 24:00からtick分前までを扱う
         self._xs: list[datetime.timedelta] = [
-            i*datetime.timedelta(minutes=tick)
-            for i in range(24*60//tick)
-        ]
-        self._fake_date = datetime.datetime(2022,1,1,0,0,0)
-        self._fake_oneday = [self._fake_date + t for t in self._xs]
-    def _to_fake_oneday(self, xs: list[datetime.datetime]):
-        return [
-            self._fake_date
-            + (t-datetime.datetime.combine(t.date(), datetime.time.min)) for t in xs
+            datetime.timedelta(seconds=int(s)) for s in SLOTS
         ]
+        # 補間済みのデータ、appendごとに行列を作り直さないようにまとめて結合する
+        self._blocks: list[np.ndarray] = []
+        self._count = 0
     def append(self, xs: list[datetime.datetime], ys: list[float]):
         """
         時系列のfloatデータに対して補間と集積を行う
         `xs`は時系列順で1日以内な必要がある
         """
-        if xs[-1] - xs[0] > datetime.timedelta(days=1):
-            raise ValueError("`xs` should be in 24 hours")
-        new_ys = _interpolate_datetimex(self._to_fake_oneday(xs), ys, self._fake_oneday)
-        self._process_interpolated_data(new_ys)
+        self._blocks.append(resample_oneday(xs, ys)[np.newaxis])
+        self._count += 1
+    def extend(self, new_ys: np.ndarray):
+        """
+        補間済みの日数×`SLOTS`の行列をまとめて集積する
+        """
+        new_ys = np.asarray(new_ys, dtype=float)
+        if new_ys.ndim != 2 or new_ys.shape[1] != len(SLOTS):
+            raise ValueError(f"data should be in shape (days, {len(SLOTS)})")
+        self._blocks.append(new_ys)
+        self._count += len(new_ys)
+    def get_count(self) -> int:
+        """
+        集積した日数
+        """
+        return self._count
+    def get_matrix(self) -> np.ndarray:
+        """
+        集積したデータの日数×`SLOTS`の行列
+        """
+        if len(self._blocks) != 1:
+            self._blocks = [np.concatenate(self._blocks or [np.empty((0, len(SLOTS)))])]
+        return self._blocks[0]
     @abstractmethod
-    def _process_interpolated_data(self, new_ys):
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
         """
-        一日に補間されたデータを集積する
-        データの長さは`_xs`に揃える
+        日数×`SLOTS`の行列を時刻ごとに集計する
         """
         raise NotImplementedError
-    @abstractmethod
+    def result_array(self) -> np.ndarray:
+        """
+        集計結果を`SLOTS`の順に並べた配列
+        """
+        return self._reduce(self.get_matrix())
     def result(self) -> dict[datetime.timedelta, float]:
         """
         appendされたデータから一日に補間と集積を行った結果を返す
         """
-        raise NotImplementedError
+        if self._count == 0:
+            return {}
+        return dict(zip(self._xs, self.result_array().tolist()))
 
 class OnedaySum(OnedayAccumulator):
-    def __init__(self):
-        super().__init__()
-        self._result: defaultdict[datetime.timedelta, float] = defaultdict(float)
-    def _process_interpolated_data(self, new_ys):
-        for x, y in zip(self._xs, new_ys):
-            # ignore overflow
-            self._result[x] += y
-    def result(self) -> dict[datetime.timedelta, float]:
-        return dict(self._result)
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        return matrix.sum(axis=0)
 
 class OnedayAverage(OnedayAccumulator):
-    def __init__(self):
-        super().__init__()
-        self._count = 0
-        self._result: defaultdict[datetime.timedelta, float] = defaultdict(float)
-    def _process_interpolated_data(self, new_ys):
-        self._count += 1
-        for x, y in zip(self._xs, new_ys):
-            # ignore overflow
-            self._result[x] += y
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        assert self._count > 0
+        return matrix.mean(axis=0)
     def result(self) -> dict[datetime.timedelta, float]:
         assert self._count > 0
-        for k in self._result:
-            self._result[k] /= self._count
-        return dict(self._result)
+        return super().result()
 
 class OnedayMedian(OnedayAccumulator):
-    def __init__(self):
-        super().__init__()
-        self._count = 0
-        self._result: defaultdict[datetime.timedelta, list[float]] = defaultdict(list)
-    def _process_interpolated_data(self, new_ys):
-        self._count += 1
-        for x, y in zip(self._xs, new_ys):
-            self._result[x].append(y)
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        assert self._count > 0
+        # statistics.median_highと同じく偶数個のときは大きい方を取る
+        return np.sort(matrix, axis=0)[self._count // 2]
     def result(self) -> dict[datetime.timedelta, float]:
         assert self._count > 0
-        d = {}
-        for k in self._result:
-            d[k] = median_high(self._result[k])
-        return d
+        return super().result()
 
 class OnedayMax(OnedayAccumulator):
-    def __init__(self):
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        return matrix.max(axis=0, initial=-np.inf)
+
+class OnedayStatistics(OnedayAccumulator):
+    """
+    複数の統計を一度のソートでまとめて計算する
+    statsは`STATISTICS`から選び、percentilesの統計は"p90"のような名前になる
+    """
+    STATISTICS = ("mean", "median", "max", "min")
+    def __init__(self, stats: Sequence[str], percentiles: Sequence[float] = ()):
         super().__init__()
-        self._result: defaultdict[datetime.timedelta, float] = defaultdict(lambda:-float("inf"))
-    def _process_interpolated_data(self, new_ys):
-        for x, y in zip(self._xs, new_ys):
-            if self._result[x] < y:
-                self._result[x] = y
-    def result(self) -> dict[datetime.timedelta, float]:
-        return dict(self._result)
+        for stat in stats:
+            if stat not in self.STATISTICS:
+                raise ValueError(f"unknown statistic: {stat}")
+        for q in percentiles:
+            if not 0 <= q <= 100:
+                raise ValueError(f"percentile should be in [0, 100]: {q}")
+        self.stats = list(stats)
+        self.percentiles = list(percentiles)
+    def get_names(self) -> list[str]:
+        return self.stats + [f"p{q:g}" for q in self.percentiles]
+    def _reduce(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        統計の数×`SLOTS`の行列を返す
+        """
+        n = len(matrix)
+        if n == 0:
+            return np.empty((len(self.get_names()), len(SLOTS)))
+        matrix = np.sort(matrix, axis=0)
+        rows = []
+        for stat in self.stats:
+            match stat:
+                case "mean": rows.append(matrix.mean(axis=0))
+                # OnedayMedianと同じく偶数個のときは大きい方
+                case "median": rows.append(matrix[n // 2])
+                case "max": rows.append(matrix[-1])
+                case "min": rows.append(matrix[0])
+        for q in self.percentiles:
+            # numpy.percentileの線形補間と同じ
+            pos = q / 100 * (n - 1)
+            lo = int(np.floor(pos))
+            hi = min(lo + 1, n - 1)
+            rows.append(matrix[lo] + (matrix[hi] - matrix[lo]) * (pos - lo))
+        return np.array(rows).reshape(len(rows), len(SLOTS))
+    def result(self) -> dict[str, dict[datetime.timedelta, float]]:
+        """
+        統計の名前ごとに一日の集計結果を返す、データがなければ空のdictを並べる
+        """
+        if self._count == 0:
+            return {name: {} for name in self.get_names()}
+        return {
+            name: dict(zip(self._xs, row))
+            for name, row in zip(self.get_names(), self.result_array().tolist())
+        }
@@ -1,48 +1,104 @@
 import datetime
 from abc import ABC, abstractmethod
-from typing import Iterator
-from player import Player
+from typing import Hashable, Iterator, NamedTuple
+from player import Player, PlayerRegistry
 
 class Log:
     """
     ログファイルの情報を管理
     特定の一日のデータのみを扱う
+    プレイヤーはregistryのコードで保持し、Playerへの変換は取り出すときに行う
     """
-    def __init__(self, data: dict[datetime.datetime, list[Player]]):
+    def __init__(
+            self,
+            data: dict[datetime.datetime, list[Player]],
+            registry: PlayerRegistry | None = None
+        ):
+        self.registry = registry if registry is not None else PlayerRegistry()
         # 時刻のリスト
-        self._times: list[datetime.datetime] = sorted(data.keys())
-        if len(self._times) > 0 and self._times[-1].date() != self._times[0].date():
-            raise ValueError("log accepts only data in one day")
-        # 時刻ごとのプレイヤーリスト
-        self._logs: list[list[Player]] = [data[t] for t in self._times]
-        # ログに存在する全プレイヤ―の集合
-        _st = set()
-        for v in data.values():
-            _st.update(v)
-        self._player_set: frozenset[Player] = frozenset(_st)
+        self._times: list[datetime.datetime] = []
+        # 時刻ごとのプレイヤーコードのリスト
+        self._rows: list[list[int]] = []
+        # ログに存在する全プレイヤ―のコードの集合
+        self._code_set: set[int] = set()
         # サンプルしたログの数（行数）
-        self.size = len(self._times)
+        self.size = 0
         # 時刻ごとにログの何番目にいるか
-        self._player_positions: dict[Player, list[int | None]] = dict()
-        for p in self._player_set:
-            self._player_positions[p] = [None]*self.size
-        for idx, t in enumerate(self._times):
-            for position, p in enumerate(data[t]):
-                self._player_positions[p][idx] = position
+        self._player_positions: dict[int, list[int | None]] = dict()
+        times = sorted(data.keys())
+        if len(times) > 0 and times[-1].date() != times[0].date():
+            raise ValueError("log accepts only data in one day")
+        for t in times:
+            self.append(t, data[t])
+    def append(self, logged_at: datetime.datetime, player_list: list[Player]):
+        """
+        最後のサンプルより後の時刻のサンプルを追加する
+        """
+        self.append_codes(logged_at, [self.registry.intern(p, logged_at) for p in player_list])
+    def append_codes(self, logged_at: datetime.datetime, row: list[int]):
+        """
+        registryのコードで表したサンプルを追加する
+        """
+        if self.size > 0:
+            if logged_at.date() != self._times[0].date():
+                raise ValueError("log accepts only data in one day")
+            if logged_at <= self._times[-1]:
+                raise ValueError("log accepts only data after the last sample")
+        for c in row:
+            if c not in self._code_set:
+                self._code_set.add(c)
+                self._player_positions[c] = [None]*self.size
+        for positions in self._player_positions.values():
+            positions.append(None)
+        for position, c in enumerate(row):
+            self._player_positions[c][self.size] = position
+        self._times.append(logged_at)
+        self._rows.append(row)
+        self.size += 1
+    def copy(self) -> "Log":
+        """
+        同じregistryを使う複製、複製に追加しても元のログは変わらない
+        """
+        log = Log({}, self.registry)
+        log._times = self._times[:]
+        # 行は追加した後に書き換えないので共有する
+        log._rows = self._rows[:]
+        log._code_set = set(self._code_set)
+        log.size = self.size
+        log._player_positions = {c: positions[:] for c, positions in self._player_positions.items()}
+        return log
+    def get_nbytes(self) -> int:
+        """
+        ログが使っているメモリ量の概算（バイト）
+        """
+        # リスト1つ56バイト、要素1つ8バイト、datetime1つ48バイトとして数える
+        rows = sum(56 + 8*len(row) for row in self._rows)
+        positions = len(self._player_positions) * (56 + 8*self.size + 100)
+        return rows + positions + 56*self.size
     def get_times(self) -> list[datetime.datetime]:
         #return self._times[:]
         return self._times
     def iter_logs(self) -> Iterator[list[Player]]:
-        for log in self._logs:
-            #yield log[:]
-            yield log
+        for row in self._rows:
+            yield list(map(self.registry.get_player, row))
+    def iter_codes(self) -> Iterator[list[int]]:
+        for row in self._rows:
+            #yield row[:]
+            yield row
     def get_players(self) -> frozenset[Player]:
-        return self._player_set
+        return frozenset(map(self.registry.get_player, self._code_set))
+    def get_player_codes(self) -> frozenset[int]:
+        return frozenset(self._code_set)
     def get_player_positions(self, p: Player) -> list[int | None]:
         try:
-            return self._player_positions[p][:]
+            return self.get_code_positions(self.registry.get_code(p.id))
         except KeyError as e:
             raise KeyError(f"player: {p} not found") from e
+    def get_code_positions(self, code: int) -> list[int | None]:
+        try:
+            return self._player_positions[code][:]
+        except KeyError as e:
+            raise KeyError(f"player code: {code} not found") from e
 
 class ILogRepository(ABC):
     @abstractmethod
@@ -51,3 +107,41 @@ class ILogRepository(ABC):
     @abstractmethod
     def get_log_by_date(self, date: datetime.date) -> Log:
         raise NotImplementedError
+    @abstractmethod
+    def get_version(self, date: datetime.date) -> Hashable:
+        """
+        その日のログが変更されると変わる値を返す
+        """
+        raise NotImplementedError
+
+class ReadRows(NamedTuple):
+    """
+    IFollowableLogRepository.read_rowsで読み込んだ行
+    """
+    # 読み始めた位置（ログが短くなって先頭から読み直した場合は0）
+    offset: int
+    # 読み終えた位置、次はここから読む
+    end: int
+    rows: list[tuple[datetime.datetime, list[Player]]]
+
+class IFollowableLogRepository(ILogRepository):
+    """
+    追記された行だけを読み込めるリポジトリ、LogIngesterとLogUsecaseが読む
+    位置はリポジトリごとに決まる増えていく整数（ファイルならバイト位置）
+    """
+    @abstractmethod
+    def get_dates(self) -> list[datetime.date]:
+        raise NotImplementedError
+    @abstractmethod
+    def read_rows(self, date: datetime.date, offset: int) -> ReadRows:
+        """
+        offsetより後に書き終えた行を返す、ログがoffsetより短くなっていれば先頭から読み直す
+        プレイヤーの名前はその行を書いたときのもの
+        """
+        raise NotImplementedError
+    @abstractmethod
+    def get_log_by_date(self, date: datetime.date, end: int | None = None) -> Log:
+        """
+        endを指定するとread_rowsが返したその位置までの行だけを読む
+        """
+        raise NotImplementedError
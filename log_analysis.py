@@ -1,9 +1,62 @@
 # DomainS
 import datetime
 from itertools import pairwise
+from typing import NamedTuple
+import numpy as np
 
 from log import Log
-from player import Player
+
+class DayAnalysis(NamedTuple):
+    """
+    一日のログの解析結果
+    プレイヤーはregistryのコードで保持する
+    """
+    times: list[datetime.datetime]
+    # 時刻ごとの推定プレイ人数
+    headcounts: list[int]
+    # ログに現れたプレイヤーのコード（昇順）
+    codes: np.ndarray
+    # presence[i, t]: codes[i]のプレイヤーが時刻tにいた可能性があるか
+    presence: np.ndarray
+    # played[i]: codes[i]のプレイヤーのプレイが確定したか
+    played: np.ndarray
+    @classmethod
+    def create(
+            cls,
+            times: list[datetime.datetime],
+            codes: list[int],
+            presence: np.ndarray,
+            played: np.ndarray
+        ) -> "DayAnalysis":
+        """
+        コードの昇順に並べ替えて作る
+        """
+        order = np.argsort(codes, kind="stable")
+        presence = presence[order]
+        return cls(
+            times,
+            presence.sum(axis=0).tolist(),
+            np.asarray(codes, dtype=np.int64)[order],
+            presence,
+            np.asarray(played, dtype=bool)[order]
+        )
+    def _index(self, code: int) -> int:
+        i = int(np.searchsorted(self.codes, code))
+        if i == len(self.codes) or self.codes[i] != code:
+            raise KeyError(f"player code: {code} not found")
+        return i
+    def get_presence(self, code: int) -> list[bool]:
+        return self.presence[self._index(code)].tolist()
+    def has_played(self, code: int) -> bool:
+        try:
+            return bool(self.played[self._index(code)])
+        except KeyError:
+            return False
+    def get_players_over_time(self) -> list[set[int]]:
+        return [
+            set(self.codes[self.presence[:, i]].tolist())
+            for i in range(len(self.times))
+        ]
 
 class LogAnalyzer:
     """
@@ -18,13 +71,14 @@ class LogAnalyzer:
         self.MAX_STABLE_TIME = max_stable_time
         # 再入店までに最低でもかかる時間（再入店と誤認しないための精度上げに使う）
         self.MAX_TIME_BETWEEN_REENTRY = max_time_between_reentry
-    def get_status_changed(self, log: Log, p: Player) -> list[bool]:
+    def get_status_changed(self, log: Log, code: int) -> list[bool]:
         """
         プレイした事が確定したタイミングを記録したリストを返す
+        プレイヤーはregistryのコードで指定する
         """
-        positions = log.get_player_positions(p)
+        positions = log.get_code_positions(code)
         ret = [False]*len(positions)
-        for i, (log1, log2) in enumerate(pairwise(log.iter_logs())):
+        for i, (log1, log2) in enumerate(pairwise(log.iter_codes())):
             p1 = positions[i]
             p2 = positions[i+1]
             # 前のログでpよりも左にいたプレイヤー
@@ -53,12 +107,58 @@ class LogAnalyzer:
             #        ret[i] = True
             #        break
         return ret
-    def get_player_in_venue(self, log: Log, p: Player) -> list[bool]:
+    def get_status_changed_all(self, log: Log) -> dict[int, list[bool]]:
+        """
+        全プレイヤーについてget_status_changedをまとめて計算する
+        """
+        codes = list(log.get_player_codes())
+        S = log.size
+        if len(codes) == 0 or S < 2:
+            return {c: [False]*S for c in codes}
+        index = {c: i for i, c in enumerate(codes)}
+        rows = list(log.iter_codes())
+        lengths = np.array([len(row) for row in rows])
+        # positions[i, t]: 時刻tのログでi番目のプレイヤーがいた位置（いなければ-1）
+        positions = np.full((len(codes), S), -1)
+        # members[t, k]: 時刻tのログでk番目にいたプレイヤーの番号（空きは-1）
+        members = np.full((S, lengths.max()), -1)
+        for t, row in enumerate(rows):
+            for k, c in enumerate(row):
+                positions[index[c], t] = k
+                members[t, k] = index[c]
+        # 前のログでk番目にいたプレイヤーの後のログでの位置
+        following = np.where(
+            members[:-1] >= 0,
+            positions[members[:-1], np.arange(1, S)[:, None]],
+            -1
+        )
+        # prefix_max[t, k]: 前のログでk番目より左にいたプレイヤーの後のログでの最も右の位置
+        prefix_max = np.full((S-1, following.shape[1]+1), -1)
+        np.maximum.accumulate(following, axis=1, out=prefix_max[:, 1:])
+        # ログにいない場合はlog1[:p1]が全員、log2[p2+1:]が空になるように長さで埋める
+        left = np.where(positions[:, :-1] >= 0, positions[:, :-1], lengths[:-1])
+        right = np.where(positions[:, 1:] >= 0, positions[:, 1:], lengths[1:])
+        # 左にいたプレイヤーのうち誰かが右に移っていればプレイ判定
+        changed = np.zeros((len(codes), S), dtype=bool)
+        changed[:, :-1] = prefix_max[np.arange(S-1), left] > right
+        return {c: changed[i].tolist() for i, c in enumerate(codes)}
+    def get_player_in_venue(self, log: Log, code: int) -> list[bool]:
         """
         プレイヤーがその時間にいた可能性をboolで表現したリスト
         """
+        status_changed = self.get_status_changed(log, code)
+        return self._get_in_venue(log.get_times(), status_changed)
+    def get_players_in_venue(self, log: Log) -> dict[int, list[bool]]:
+        """
+        全プレイヤーについてget_player_in_venueをまとめて計算する
+        """
+        times = log.get_times()
+        return {
+            c: self._get_in_venue(times, status_changed)
+            for c, status_changed in self.get_status_changed_all(log).items()
+        }
+    def _get_in_venue(self, times: list[datetime.datetime], status_changed: list[bool]) -> list[bool]:
         # 入店の確定位置を探す、最後の確定位置以降は退店しているとみなせる
-        status_changed = self.get_status_changed(log, p)
         N = len(status_changed)
         ret = [False]*N
         # 推定退店時間のindex
@@ -72,7 +172,6 @@ class LogAnalyzer:
             return ret
         # 尺取り法で入店確定位置から閾値時間だけ入店していると判定する
         l, r = 0, 1
-        times = log.get_times()
         while r <= N:
             if status_changed[l]:
                 while r < N and times[r-1] - times[l] <= self.MAX_STABLE_TIME:
@@ -102,18 +201,28 @@ class LogAnalyzer:
         for i in range(last + 1, N):
             ret[i] = False
         return ret
-    def get_players_over_time(self, log: Log) -> list[set[Player]]:
+    def get_players_over_time(self, log: Log) -> list[set[int]]:
         """
-        各時間にいた可能性のあるプレイヤーの集合のリスト
+        各時間にいた可能性のあるプレイヤーのコードの集合のリスト
         """
-        ps = log.get_players()
-        player_in_venue = {}
-        for p in ps:
-            player_in_venue[p] = self.get_player_in_venue(log, p)
+        ps = log.get_player_codes()
+        player_in_venue = self.get_players_in_venue(log)
         return [
-            set(p for p in ps if player_in_venue[p][i])
+            set(c for c in ps if player_in_venue[c][i])
             for i in range(log.size)
         ]
+    def analyze(self, log: Log) -> DayAnalysis:
+        """
+        一日分の解析結果をまとめて計算する
+        """
+        status_changed = self.get_status_changed_all(log)
+        times = log.get_times()
+        codes = list(status_changed)
+        presence = np.zeros((len(codes), log.size), dtype=bool)
+        for i, c in enumerate(codes):
+            presence[i] = self._get_in_venue(times, status_changed[c])
+        played = np.array([any(status_changed[c]) for c in codes], dtype=bool)
+        return DayAnalysis.create(times, codes, presence, played)
     def get_headcounts(self, log: Log) -> list[int]:
         playersets = self.get_players_over_time(log)
         headcounts = [len(ps) for ps in playersets]
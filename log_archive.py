@@ -0,0 +1,43 @@
+import datetime
+import sys
+
+from log_repository import ARCHIVE_FORMATS, JsonRowLogRepository
+from rollup import RollupRepository, is_closed
+
+def archive_closed_days(
+        repository: JsonRowLogRepository,
+        end_time: datetime.time,
+        suffix: str = ".gz",
+        rollups: RollupRepository | None = None,
+        now: datetime.datetime | None = None
+    ) -> list[datetime.date]:
+    """
+    記録を終えた日で圧縮していないログを圧縮し、圧縮した日付を返す
+    rollupsを渡すと圧縮前のログから作った集計のバージョンを圧縮後のファイルに合わせ、集計を作り直さなくて済むようにする
+    """
+    if suffix not in ARCHIVE_FORMATS:
+        raise ValueError(f"unsupported archive format: {suffix}")
+    archived = []
+    for date in repository.get_dates():
+        if not is_closed(date, end_time, now) or not repository.get_path(date).exists():
+            continue
+        version = tuple(repository.get_version(date))
+        repository.archive(date, suffix)
+        archived.append(date)
+        if rollups is not None:
+            rollup = rollups.load(date)
+            if rollup is not None and rollup.version == version:
+                rollups.save(rollup._replace(version=tuple(repository.get_version(date))))
+    return archived
+
+if __name__ == "__main__":
+    from config import ScheduleLoggerSettings
+    settings = ScheduleLoggerSettings()
+    suffix = sys.argv[1] if len(sys.argv) > 1 else ".gz"
+    archived = archive_closed_days(
+        JsonRowLogRepository(settings.log_directory),
+        settings.end_time,
+        suffix,
+        RollupRepository(settings.log_directory / "rollup")
+    )
+    print(f"archived {len(archived)} days")
@@ -0,0 +1,69 @@
+import datetime
+from typing import Hashable, Iterator, NamedTuple
+
+from log import IFollowableLogRepository
+from player import Player
+
+class IngestedRows(NamedTuple):
+    """
+    ログファイルから新しく読み込んだ行
+    """
+    # 最初の行がファイルの何行目か（0ならファイルを先頭から読み直した）
+    start: int
+    rows: list[tuple[datetime.datetime, list[Player]]]
+
+class LogIngester:
+    """
+    リポジトリを追跡して前回から追記された行だけを読み込む
+    """
+    def __init__(self, repository: IFollowableLogRepository):
+        self.repository = repository
+        # 日付ごとの読み込み済みの位置（リポジトリのread_rowsの位置）と行数
+        self.offsets: dict[datetime.date, int] = {}
+        self.counts: dict[datetime.date, int] = {}
+        # 読み込み済みの内容に対応するログのバージョン
+        self.versions: dict[datetime.date, Hashable] = {}
+    def seek(self, date: datetime.date, offset: int, count: int, version: Hashable | None = None):
+        """
+        既に読み込み済みの位置を指定して、それより後の行だけを読むようにする
+        その位置まで読んだときのバージョンも指定すると、バージョンが変わるまでその日は読まない
+        """
+        self.offsets[date] = offset
+        self.counts[date] = count
+        if version is not None:
+            self.versions[date] = version
+    def poll(self) -> dict[datetime.date, IngestedRows]:
+        """
+        新しく追記された行を日付ごとに返す、新しい日のファイルも読み込む
+        """
+        return dict(self.iter_poll())
+    def iter_poll(self) -> Iterator[tuple[datetime.date, IngestedRows]]:
+        """
+        pollと同じ行を日付順に一日ずつ返す
+        全ての日を読み込む最初のpollでも、使い終わった日の行をメモリに残さずに済む
+        """
+        dates = self.repository.get_dates()
+        # seekで指定したがログがなくなった日は忘れる
+        for date in set(self.versions).difference(dates):
+            self.offsets.pop(date, None)
+            self.counts.pop(date, None)
+            self.versions.pop(date)
+        for date in dates:
+            ingested = self.poll_date(date)
+            if ingested is not None:
+                yield date, ingested
+    def poll_date(self, date: datetime.date) -> IngestedRows | None:
+        # 読み込む前にバージョンを取って、読んだ内容より新しいバージョンにならないようにする
+        version = self.repository.get_version(date)
+        if self.versions.get(date) == version:
+            return None
+        offset = self.offsets.get(date, 0)
+        read = self.repository.read_rows(date, offset)
+        # 先頭から読み直した場合は行数も数え直す
+        count = self.counts.get(date, 0) if read.offset == offset else 0
+        self.offsets[date] = read.end
+        self.counts[date] = count + len(read.rows)
+        self.versions[date] = version
+        if not read.rows and read.offset > 0:
+            return None
+        return IngestedRows(count, read.rows)
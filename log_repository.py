@@ -0,0 +1,156 @@
+import datetime
+import gzip
+import json
+import lzma
+import os
+from pathlib import Path
+from typing import IO, Iterator
+
+from log import IFollowableLogRepository, Log, ReadRows
+from player import Player, PlayerRegistry
+
+def parse_row(line: str) -> tuple[datetime.datetime, list[Player]]:
+    """
+    JSON形式のログの一行を時刻とプレイヤーのリストにする
+    """
+    fmt = json.loads(line)
+    logged_time = datetime.datetime.fromisoformat(fmt["logged_time"])
+    return logged_time, list(map(Player._make, fmt["log"]))
+
+# 記録を終えた日を圧縮したファイルの拡張子と、それを読み書きするopen
+ARCHIVE_FORMATS = {".gz": gzip.open, ".xz": lzma.open}
+
+def skip(f: IO[bytes], size: int) -> int:
+    """
+    fをsizeバイト読み飛ばして、読み飛ばせたバイト数を返す（ファイルが短ければsizeより小さい）
+    """
+    skipped = 0
+    while skipped < size and (chunk := f.read(min(2**20, size - skipped))):
+        skipped += len(chunk)
+    return skipped
+
+class JsonRowLogRepository(IFollowableLogRepository):
+    """
+    一日ごとのファイルに一行一サンプルのJSONでログを保存する
+    記録を終えた日は圧縮したファイル（log_YYYY-MM-DD.txt.gzなど）にしてもよい
+    """
+    def __init__(self, log_directory: Path, registry: PlayerRegistry | None = None):
+        self.log_directory = log_directory
+        # 読み込んだログのプレイヤーを共通のコードで扱うためのregistry
+        self.registry = registry
+    def get_path(self, date: datetime.date) -> Path:
+        return self.log_directory / f"log_{date.isoformat()}.txt"
+    def find_path(self, date: datetime.date) -> Path:
+        """
+        その日のログのファイル、圧縮していなければget_pathと同じ
+        """
+        path = self.get_path(date)
+        if path.exists():
+            return path
+        for suffix in ARCHIVE_FORMATS:
+            archive = path.with_name(path.name + suffix)
+            if archive.exists():
+                return archive
+        raise FileNotFoundError(path)
+    def get_dates(self) -> list[datetime.date]:
+        """
+        ログファイルがある日付を昇順で返す、圧縮した日も含む
+        """
+        return sorted({
+            datetime.date.fromisoformat(path.name[4:14])
+            for path in self.log_directory.glob("log_????-??-??.txt*")
+            if path.name[18:] in ("", *ARCHIVE_FORMATS)
+        })
+    def open_binary(self, date: datetime.date) -> IO[bytes]:
+        """
+        その日のログを読むファイル、圧縮した日は少しずつ展開しながら読む
+        """
+        return self._open(self.find_path(date))
+    def _open(self, path: Path) -> IO[bytes]:
+        return ARCHIVE_FORMATS.get(path.suffix, open)(path, "rb")
+    def archive(self, date: datetime.date, suffix: str = ".gz"):
+        """
+        その日のログを圧縮したファイルに置き換える、記録を終えた日にだけ使う
+        """
+        path = self.get_path(date)
+        archive = path.with_name(path.name + suffix)
+        tmp = archive.with_name(f"{archive.name}.{os.getpid()}.tmp")
+        with open(path, "rb") as src, ARCHIVE_FORMATS[suffix](tmp, "wb") as dst:
+            while chunk := src.read(2**20):
+                dst.write(chunk)
+        os.replace(tmp, archive)
+        path.unlink()
+    def save_row(self, logged_at: datetime.datetime, player_list: list[Player]):
+        # 本来は最新のタイムスタンプより前の入力が来たらエラーにしたい
+        # uowを気にしないようにするため都度openしているが書き込みは数分に一回なので問題ないはず
+        path = self.get_path(logged_at.date())
+        with open(path, "a") as f:
+            f.write(
+                json.dumps({"logged_time": logged_at.isoformat(), "log": player_list})
+                + "\n"
+            )
+    def read_rows(self, date: datetime.date, offset: int) -> ReadRows:
+        """
+        offsetはファイルのバイト位置（圧縮した日は展開後の位置）、書き込み途中の最後の行は読まない
+        """
+        path = self.find_path(date)
+        rows = []
+        with self._open(path) as f:
+            if path == self.get_path(date):
+                size = path.stat().st_size
+                f.seek(min(offset, size))
+            else:
+                # 圧縮したファイルのオフセットは展開後の位置なので、展開しながら読み飛ばす
+                # 前回から圧縮までの間に追記された行があれば続きから読む
+                size = skip(f, offset)
+            if size < offset:
+                # ファイルが書き換えられて短くなったので先頭から読み直す
+                offset = 0
+                f.seek(0)
+            end = offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 書き込み途中の行は次回に回す
+                    break
+                end += len(line)
+                if line.strip():
+                    rows.append(parse_row(line.decode()))
+        return ReadRows(offset, end, rows)
+    def iter_rows(self, date: datetime.date, end: int | None = None) -> Iterator[tuple[datetime.datetime, list[Player]]]:
+        """
+        その日のログをファイルの順に一行ずつ返す、プレイヤーの名前はその行に書かれたもの
+        endを指定するとそのバイト位置（圧縮した日は展開後の位置）までの行だけを読む
+        """
+        position = 0
+        with self.open_binary(date) as logfile:
+            for format_string in logfile:
+                position += len(format_string)
+                if end is not None and position > end:
+                    break
+                yield parse_row(format_string)
+    def get_log_by_date(self, date: datetime.date, end: int | None = None) -> Log:
+        """
+        LogIngesterが読み込んだ位置をendに渡すと、そのときのバージョンと同じ内容になる
+        """
+        return Log(dict(self.iter_rows(date, end)), self.registry)
+    def get_version(self, date: datetime.date) -> tuple[int, int]:
+        stat = self.find_path(date).stat()
+        return stat.st_size, stat.st_mtime_ns
+
+def create_repository(
+        log_directory: Path,
+        log_database: Path | None = None,
+        log_format: str = "json",
+        registry: PlayerRegistry | None = None
+    ) -> IFollowableLogRepository:
+    """
+    設定（log_databaseとlog_format）に合わせたリポジトリを作る、ロガーとサーバーで同じものを使う
+    """
+    # 差分形式とSQLiteのモジュールはこのモジュールを読み込むのでここで読み込む
+    if log_database is not None:
+        from sqlite_log_repository import SqliteLogRepository
+        return SqliteLogRepository(log_database, registry)
+    if log_format == "delta":
+        from delta_log_repository import DeltaLogRepository
+        return DeltaLogRepository(log_directory, registry)
+    return JsonRowLogRepository(log_directory, registry)
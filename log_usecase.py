@@ -1,93 +1,484 @@
 import datetime
+import hashlib
+import threading
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Hashable, NamedTuple, Sequence
+import numpy as np
 
-from interpolator import OnedayAverage, OnedayMax, OnedayMedian, OnedaySum
-from log import Log
-from logger import JsonRowLogRepository, ScheduleLoggerSettings
-from log_analysis import LogAnalyzer
-from player import Player
+from cache import LRUCache
+from config import ScheduleLoggerSettings
+from interpolator import OnedayAccumulator, OnedayAverage, OnedayMax, OnedayMedian, OnedayStatistics, OnedaySum
+from log import IFollowableLogRepository, Log
+from log_analysis import DayAnalysis, LogAnalyzer
+from log_ingester import IngestedRows, LogIngester
+from log_repository import create_repository
+from player import Player, PlayerRegistry
+from player_index import PlayerDateIndex
+from rollup import DayRollup, RollupRepository, get_analyzer_params, is_closed
+from series import Series
 
-settings = ScheduleLoggerSettings()
+class LogUsecaseSettings(ScheduleLoggerSettings):
+    # ログの追記を読み込む間隔（秒）、0以下なら自動では読み込まない
+    refresh_interval: float = 60
+    # 起動時に全ての日のログを読み込まず、必要になった日だけを読み込む
+    lazy_load: bool = False
+    # lazy_loadのときにメモリに残しておくログの日数と合計のメモリ量（バイト）の上限
+    max_loaded_logs: int = 64
+    max_loaded_bytes: int | None = None
+    # 複数の日の解析を並列に行うプロセス数、0なら並列にしない
+    analysis_workers: int = 0
+
+class HeadcountStats(NamedTuple):
+    """
+    get_headcounts_statsの結果
+    """
+    # 集計した日数
+    count: int
+    # 統計の名前 -> 一日の時刻ごとの値
+    stats: dict[str, dict[datetime.timedelta, float]]
+
+def get_index_path(settings: LogUsecaseSettings) -> Path:
+    """
+    PlayerDateIndexのファイル、反映済みの位置の意味がログの形式ごとに違うので形式ごとに分ける
+    """
+    if settings.log_database is not None:
+        return settings.log_database.with_name(f"{settings.log_database.stem}_player_index.json")
+    if settings.log_format == "delta":
+        return settings.log_directory / "player_index_delta.json"
+    return settings.log_directory / "player_index.json"
+
+def analyze_log_file(
+        repository: IFollowableLogRepository,
+        date: datetime.date,
+        end: int | None,
+        max_stable_time: datetime.timedelta,
+        max_time_between_reentry: datetime.timedelta
+    ) -> tuple[list[datetime.datetime], list[Player], np.ndarray, np.ndarray]:
+    """
+    ログのendまでを読んで一日分を解析する、プロセスプールで実行するための関数
+    repositoryはregistryを持たないものを渡す
+    プレイヤーのコードはプロセスごとに違うので、DayAnalysisのcodesの代わりにPlayerを返す
+    """
+    log = repository.get_log_by_date(date, end)
+    analysis = LogAnalyzer(max_stable_time, max_time_between_reentry).analyze(log)
+    players = list(map(log.registry.get_player, analysis.codes.tolist()))
+    return analysis.times, players, analysis.presence, analysis.played
 
 class LogUsecase:
-    def __init__(self):
+    def __init__(
+            self,
+            analyzer: LogAnalyzer | None = None,
+            cache_size: int = 512,
+            lazy: bool | None = None,
+            max_loaded_logs: int | None = None,
+            max_loaded_bytes: int | None = None,
+            executor: Executor | None = None,
+            settings: LogUsecaseSettings | None = None
+        ):
+        """
+        settingsを省略するとconfig.jsonから読み込む、lazyなどの省略した引数はsettingsの値を使う
+        """
+        settings = settings if settings is not None else LogUsecaseSettings()
+        self.settings = settings
+        lazy = lazy if lazy is not None else settings.lazy_load
+        max_loaded_logs = max_loaded_logs if max_loaded_logs is not None else settings.max_loaded_logs
+        if max_loaded_bytes is None:
+            max_loaded_bytes = settings.max_loaded_bytes
+        # ログがある日付（昇順）と曜日ごとの日付
+        self.dates: list[datetime.date] = []
+        self._weekday_dates: dict[int, list[datetime.date]] = {}
+        # 読み込んだ時点のログのバージョン（解析結果のキャッシュのキーに使う）
+        self.versions: dict[datetime.date, Hashable] = {}
+        # versionsの時点で読み込んだ位置、リポジトリから読み直すときはここまでを読む
+        self.offsets: dict[datetime.date, int] = {}
+        # 全ての日のログで共通のプレイヤーコードを使う
+        self.registry = PlayerRegistry()
+        self.analyzer = analyzer if analyzer is not None else LogAnalyzer()
+        # 日ごとの解析結果のキャッシュ
+        self.analysis_cache: LRUCache[tuple, DayAnalysis] = LRUCache(cache_size)
+        # 設定の形式（JSON、差分形式、SQLite）でロガーが書いたログを読む
+        self.repository = create_repository(
+            settings.log_directory, settings.log_database, settings.log_format, self.registry
+        )
+        # プロセスプールに渡すリポジトリ、registryはプロセスごとに作る
+        self._pool_repository = create_repository(
+            settings.log_directory, settings.log_database, settings.log_format
+        )
+        self.ingester = LogIngester(self.repository)
+        # プレイヤーが現れた日付と名前の履歴の索引
+        self.index = PlayerDateIndex(get_index_path(settings))
+        # 締めた日の補間済みの解析結果、統計はこれを積み重ねた行列から計算する
+        self.rollup_repository = RollupRepository(settings.log_directory / "rollup")
+        self.rollups: dict[datetime.date, DayRollup] = {}
+        self.lazy = lazy
+        # lazyでなければ全ての日のログ、lazyなら最近使った日のログだけを(日付, 読み込んだ位置)ごとに持つ
+        # どちらも追記するときは複製してから差し替え、解析中のLogは変わらないようにする
         self.logs: dict[datetime.date, Log] = {}
-        jsonrows = JsonRowLogRepository()
-        for logfile in settings.log_directory.iterdir():
-            date = datetime.date.fromisoformat(logfile.stem[4:])
-            self.logs[date] = jsonrows.get_log_by_date(date)
+        self._loaded_logs: LRUCache[tuple[datetime.date, int | None], Log] = LRUCache(
+            max_loaded_logs,
+            max_loaded_bytes,
+            Log.get_nbytes if max_loaded_bytes is not None else None
+        )
+        if lazy:
+            # 索引に反映済みの行は読まずに、ファイルの一覧と追記された行だけを読む
+            # 反映したときとバージョンが同じ日（圧縮した日など）はファイルを開かない
+            for date, offset in self.index.offsets.items():
+                self.ingester.seek(date, offset, self.index.sizes[date], self.index.versions.get(date))
+        # 複数の日を並列に解析するためのexecutor、指定がなければ設定に従ってプロセスプールを作る
+        self._executor = executor
+        if executor is None and settings.analysis_workers > 0:
+            self._executor = ProcessPoolExecutor(settings.analysis_workers)
+        self._workers = settings.analysis_workers
+        # logs, versions, offsets, 索引を読み書きする間だけ持つ、解析やファイルの読み書きの間は持たない
+        self._lock = threading.Lock()
+        # refreshを同時に一つだけ実行する
+        self._refresh_lock = threading.Lock()
+        # 同じ日の集計を同じ一時ファイルに同時に書かないようにする
+        self._rollup_lock = threading.Lock()
+        self._refresh_stop: threading.Event | None = None
+        self.refresh()
+    def refresh(self) -> list[datetime.date]:
+        """
+        ログに追記された行と新しい日を読み込み、更新された日付を返す
+        ファイルの読み込みはロックの外で行い、一日読み込むごとにログとバージョンを差し替える
+        """
+        with self._refresh_lock:
+            updated = []
+            # 名前の履歴が時系列順になるように日付順に、一日ずつ読み込んで索引に反映する
+            # lazyなら反映した日の行は捨てるので、最初の起動でも全ての日の行を同時に持たない
+            for date, ingested in self.ingester.iter_poll():
+                updated.append(date)
+                log = None
+                if self.lazy:
+                    self._update_loaded_log(date, ingested)
+                else:
+                    log = self._update_log(self.logs.get(date), ingested)
+                with self._lock:
+                    if log is not None:
+                        # 他のスレッドが日付を走査していても壊れないように新しいdictに差し替える
+                        logs = {**self.logs, date: log}
+                        self.logs = logs if date in self.logs else dict(sorted(logs.items()))
+                    self._update_index(date, ingested)
+                    self.versions[date] = self.ingester.versions[date]
+                    self.offsets[date] = self.ingester.offsets[date]
+            with self._lock:
+                # 追記がなくても索引に反映済みの日があるのでファイルの一覧から日付を作る
+                self.versions.update(self.ingester.versions)
+                self.offsets.update(self.ingester.offsets)
+                # 追記がなく圧縮などでバージョンだけが変わった日も、索引が同じ位置まで反映済みなら記録する
+                for date, version in self.ingester.versions.items():
+                    if self.index.offsets.get(date) == self.ingester.offsets[date]:
+                        self.index.set_version(date, version)
+                if len(self.dates) != len(self.versions):
+                    self.dates = sorted(self.versions)
+                    self._weekday_dates = {
+                        weekday: [d for d in self.dates if d.weekday() == weekday]
+                        for weekday in range(7)
+                    }
+            # 索引を書き換えるのはrefreshだけなので、保存はロックの外で行える
+            self.index.save()
+        return updated
+    def _update_log(self, log: Log | None, ingested: IngestedRows) -> Log:
+        """
+        読み込んだ行を追加したログを返す、ファイルを先頭から読み直した場合は作り直す
+        他のスレッドが解析しているかもしれないので元のログは変えずに複製に追加する
+        """
+        if log is None or ingested.start == 0:
+            return Log(dict(ingested.rows), self.registry)
+        log = log.copy()
+        for logged_at, player_list in ingested.rows:
+            # 最後のサンプル以前の行は本来来ないので無視する
+            if log.size == 0 or log.get_times()[-1] < logged_at:
+                log.append(logged_at, player_list)
+        return log
+    def _update_loaded_log(self, date: datetime.date, ingested: IngestedRows):
+        """
+        メモリにある日のログだけを新しい位置のログに置き換える、それ以外の日は必要になったときに読み込む
+        """
+        log = self._loaded_logs.pop((date, self.offsets.get(date)))
+        if log is not None and ingested.start != 0:
+            self._loaded_logs.put((date, self.ingester.offsets[date]), self._update_log(log, ingested))
+    def _update_index(self, date: datetime.date, ingested: IngestedRows):
+        """
+        索引に反映していない行を索引に追加する
+        """
+        offset = self.ingester.offsets[date]
+        if self.index.offsets.get(date, 0) > offset or (
+            ingested.start == 0 and self.index.sizes.get(date, 0) > len(ingested.rows)
+        ):
+            # ログファイルが書き換えられて短くなったので作り直す
+            self.index.remove_date(date)
+        indexed = self.index.sizes.get(date, 0)
+        skip = max(0, indexed - ingested.start)
+        rows = [player_list for _, player_list in ingested.rows[skip:]]
+        self.index.add_rows(date, ingested.start + skip, rows)
+        self.index.set_offset(date, offset)
+    def start_refresh(self, interval: float | None = None):
+        """
+        一定間隔でrefreshするスレッドを起動する、intervalを省略するとsettingsの値を使う
+        """
+        interval = interval if interval is not None else self.settings.refresh_interval
+        if interval <= 0 or self._refresh_stop is not None:
+            return
+        stop = threading.Event()
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    # 書き込み途中のファイルなどで失敗しても次の周期で読み直す
+                    traceback.print_exc()
+        self._refresh_stop = stop
+        threading.Thread(target=loop, daemon=True).start()
+    def stop_refresh(self):
+        if self._refresh_stop is not None:
+            self._refresh_stop.set()
+            self._refresh_stop = None
+    def close(self):
+        self.stop_refresh()
+        if self._executor is not None:
+            self._executor.shutdown()
+    def _load_log(self, date: datetime.date, end: int | None) -> Log:
+        """
+        lazyのときにその日のendまでのログを読み込む、最近使った日はメモリに残す
+        """
+        return self._loaded_logs.get_or_compute(
+            (date, end), lambda: self.repository.get_log_by_date(date, end)
+        )
+    def _get_cache_key(self, date: datetime.date) -> tuple:
+        a = self.analyzer
+        return (date, a.MAX_STABLE_TIME, a.MAX_TIME_BETWEEN_REENTRY, self.versions[date])
+    def _analyze(self, date: datetime.date) -> DayAnalysis:
+        """
+        日付の解析結果を返す、ログが変わっていなければキャッシュを使う
+        ロックはキャッシュのキーと対応するログを取り出す間だけ持つ
+        """
+        with self._lock:
+            key = self._get_cache_key(date)
+            log = self.logs.get(date)
+            # 読み込み後に追記された行を含めないように、versionsの時点の位置までを読む
+            end = self.offsets.get(date)
+        return self.analysis_cache.get_or_compute(
+            key, lambda: self.analyzer.analyze(log if log is not None else self._load_log(date, end))
+        )
+    def _analyze_all(self, dates: list[datetime.date]) -> list[DayAnalysis]:
+        """
+        複数の日の解析結果を日付順に返す
+        executorがあればキャッシュにない日をまとめて並列に解析する
+        """
+        if self._executor is None:
+            return [self._analyze(date) for date in dates]
+        with self._lock:
+            keys = {date: self._get_cache_key(date) for date in dates}
+            # キャッシュのキーのバージョンと同じ内容を解析するように、読み込んだ位置までを渡す
+            ends = {date: self.offsets.get(date) for date in dates}
+        results = {date: self.analysis_cache.get(keys[date]) for date in dates}
+        misses = [date for date in dates if results[date] is None]
+        if len(misses) > 1:
+            a = self.analyzer
+            # 1プロセスあたり数回に分けて渡す
+            chunksize = max(1, len(misses) // (4 * max(1, self._workers)))
+            analyzed = self._executor.map(
+                analyze_log_file,
+                repeat(self._pool_repository),
+                misses,
+                [ends[date] for date in misses],
+                repeat(a.MAX_STABLE_TIME),
+                repeat(a.MAX_TIME_BETWEEN_REENTRY),
+                chunksize=chunksize
+            )
+            for date, (times, players, presence, played) in zip(misses, analyzed):
+                # 日付順に解析するとは限らないので、名前の履歴が前後しないようにその日の時刻を渡す
+                codes = [self.registry.intern(p, times[0]) for p in players]
+                analysis = DayAnalysis.create(times, codes, presence, played)
+                self.analysis_cache.put(keys[date], analysis)
+                results[date] = analysis
+        return [
+            analysis if analysis is not None else self._analyze(date)
+            for date, analysis in results.items()
+        ]
+    def _get_rollups(self, dates: list[datetime.date]) -> dict[datetime.date, DayRollup]:
+        """
+        締めた日のDayRollupを返す、記録中の日は含まない
+        ファイルにないか古くなっている日は解析して保存する
+        """
+        with self._lock:
+            versions = {date: self.versions[date] for date in dates}
+        ret: dict[datetime.date, DayRollup] = {}
+        misses = []
+        for date in dates:
+            rollup = self.rollups.get(date)
+            if rollup is None or not rollup.is_valid(versions[date], self.analyzer):
+                if not is_closed(date, self.settings.end_time):
+                    continue
+                rollup = self.rollup_repository.load(date)
+                if rollup is None or not rollup.is_valid(versions[date], self.analyzer):
+                    misses.append(date)
+                    continue
+                self.rollups[date] = rollup
+            ret[date] = rollup
+        for date, analysis in zip(misses, self._analyze_all(misses)):
+            ids = [self.registry.get_id(code) for code in analysis.codes.tolist()]
+            rollup = DayRollup.create(date, analysis, ids, versions[date], self.analyzer)
+            with self._rollup_lock:
+                # 別のスレッドが同じ集計を保存済みなら書かない
+                saved = self.rollups.get(date)
+                if saved is None or not saved.is_valid(versions[date], self.analyzer):
+                    self.rollup_repository.save(rollup)
+                    self.rollups[date] = rollup
+            ret[date] = rollup
+        return ret
+    def _collect_headcounts(self, acc: OnedayAccumulator, dates: list[datetime.date]):
+        rollups = self._get_rollups(dates)
+        if len(rollups) > 0:
+            acc.extend(np.stack([rollup.headcounts for rollup in rollups.values()]))
+        # 記録中の日だけはログから解析する
+        for analysis in self._analyze_all([date for date in dates if date not in rollups]):
+            acc.append(analysis.times, analysis.headcounts)
+    def _accumulate_headcounts(
+            self,
+            acc: OnedayAccumulator,
+            dates: list[datetime.date]
+        ) -> dict[datetime.timedelta, float]:
+        self._collect_headcounts(acc, dates)
+        return acc.result()
+    def get_dates(self, weekday: int | None = None) -> list[datetime.date]:
+        """
+        ログがある日付、weekdayを指定するとその曜日の日付だけを返す
+        """
+        if weekday is None:
+            return self.dates
+        return self._weekday_dates.get(weekday, [])
+    def get_data_version(self, dates: list[datetime.date]) -> str:
+        """
+        日付のログのバージョンと解析の閾値から、それらの日の解析結果が変わると変わる文字列を作る
+        """
+        with self._lock:
+            key = (get_analyzer_params(self.analyzer), [(d, self.versions.get(d)) for d in dates])
+        return hashlib.sha1(repr(key).encode()).hexdigest()
     def get_headcounts_of_date(self, date: datetime.date) -> dict[datetime.datetime, float]:
-        a = LogAnalyzer()
-        log = self.logs[date]
-        times = log.get_times()
-        headcounts = a.get_headcounts(log)
-        return dict(zip(times, headcounts))
+        analysis = self._analyze(date)
+        return dict(zip(analysis.times, analysis.headcounts))
     def get_headcounts_average(self) -> dict[datetime.timedelta, float]:
-        a = LogAnalyzer()
-        acc = OnedayAverage()
-        for log in self.logs.values():
-            times = log.get_times()
-            headcounts = a.get_headcounts(log)
-            acc.append(times, headcounts)
-        return acc.result()
+        return self._accumulate_headcounts(OnedayAverage(), self.dates)
     def get_headcounts_median(self) -> dict[datetime.timedelta, float]:
-        a = LogAnalyzer()
-        acc = OnedayMedian()
-        for log in self.logs.values():
-            times = log.get_times()
-            headcounts = a.get_headcounts(log)
-            acc.append(times, headcounts)
-        return acc.result()
+        return self._accumulate_headcounts(OnedayMedian(), self.dates)
     def get_headcounts_max(self) -> dict[datetime.timedelta, float]:
-        a = LogAnalyzer()
-        acc = OnedayMax()
-        for log in self.logs.values():
-            times = log.get_times()
-            headcounts = a.get_headcounts(log)
-            acc.append(times, headcounts)
-        return acc.result()
+        return self._accumulate_headcounts(OnedayMax(), self.dates)
     def get_headcounts_average_weekday(self, weekday: int) -> dict[datetime.timedelta, float]:
-        a = LogAnalyzer()
-        acc = OnedayAverage()
-        for _date, log in self.logs.items():
-            if _date.weekday() != weekday:
-                continue
-            times = log.get_times()
-            headcounts = a.get_headcounts(log)
-            acc.append(times, headcounts)
-        return acc.result()
+        return self._accumulate_headcounts(OnedayAverage(), self._weekday_dates.get(weekday, []))
+    def get_headcounts_stats(
+            self,
+            stats: list[str],
+            percentiles: Sequence[float] = (),
+            weekday: int | None = None,
+            dates: list[datetime.date] | None = None
+        ) -> HeadcountStats:
+        """
+        複数の統計（OnedayStatistics.STATISTICSとパーセンタイル）をまとめて計算する
+        weekdayやdatesを指定するとその日だけを集計する
+        """
+        acc = self._collect_stats(stats, percentiles, weekday, dates)
+        return HeadcountStats(acc.get_count(), acc.result())
+    def _collect_stats(
+            self,
+            stats: list[str],
+            percentiles: Sequence[float],
+            weekday: int | None,
+            dates: list[datetime.date] | None
+        ) -> OnedayStatistics:
+        acc = OnedayStatistics(stats, percentiles)
+        targets = self.get_dates(weekday)
+        if dates is not None:
+            # ログがない日は無視する
+            selected = set(dates)
+            targets = [date for date in targets if date in selected]
+        self._collect_headcounts(acc, targets)
+        return acc
+    def get_headcounts_series(self, stat: str, weekday: int | None = None) -> Series:
+        """
+        統計（OnedayStatistics.STATISTICS）を一日の`SLOTS`の配列のまま返す、日がなければ空
+        """
+        acc = self._collect_stats([stat], (), weekday, None)
+        values = acc.result_array()[0] if acc.get_count() > 0 else np.empty(0)
+        return Series.oneday(values)
+    def get_headcounts_of_date_series(self, date: datetime.date) -> Series:
+        analysis = self._analyze(date)
+        return Series.sampled(analysis.times, analysis.headcounts)
     def get_playtime(self, id: str) -> dict[datetime.timedelta, float]:
-        p = Player("fake", id)
-        a = LogAnalyzer()
+        return self._accumulate_playtime(id).result()
+    def get_playtime_series(self, id: str) -> Series:
+        acc = self._accumulate_playtime(id)
+        return Series.oneday(acc.result_array() if acc.get_count() > 0 else np.empty(0))
+    def _accumulate_playtime(self, id: str) -> OnedaySum:
         acc = OnedaySum()
-        for log in self.logs.values():
-            times = log.get_times()
+        # プレイヤーが現れた日だけを見る
+        dates = self.get_dates_of_player(id)
+        rollups = self._get_rollups(dates)
+        presence = [rollup.get_presence(id) for rollup in rollups.values() if id in rollup.ids]
+        if len(presence) > 0:
+            acc.extend(np.stack(presence))
+        for analysis in self._analyze_all([date for date in dates if date not in rollups]):
             try:
-                piv = a.get_player_in_venue(log, p)
-                acc.append(times, list(map(float, piv)))
+                code = self.registry.get_code(id)
+                piv = analysis.get_presence(code)
+                acc.append(analysis.times, list(map(float, piv)))
             except KeyError:
                 pass
-        return acc.result()
+        return acc
     def get_all_playdate(self, id: str) -> list[datetime.date]:
-        p = Player("fake", id)
         ret = []
-        a = LogAnalyzer()
-        for _date, log in self.logs.items():
+        dates = self.get_dates_of_player(id)
+        rollups = self._get_rollups(dates)
+        opened = [date for date in dates if date not in rollups]
+        analyses = dict(zip(opened, self._analyze_all(opened)))
+        for date in dates:
+            if date in rollups:
+                if rollups[date].has_played(id):
+                    ret.append(date)
+                continue
             try:
-                if any(a.get_status_changed(log, p)):
-                    ret.append(_date)
+                if analyses[date].has_played(self.registry.get_code(id)):
+                    ret.append(date)
             except KeyError:
                 pass
         return ret
+    def get_dates_of_player(self, id: str) -> list[datetime.date]:
+        with self._lock:
+            return [date for date in self.index.get_dates(id) if date in self.versions]
     def get_all_playerlist(self) -> list[Player]:
-        ret = set()
-        for log in self.logs.values():
-            # 名前変更は関知しない
-            ps = log.get_players()
-            ret.update(ps)
-        return list(ret)
+        # 名前は最新のものを返す
+        with self._lock:
+            return self.index.get_players()
+    def get_player_names(self, id: str) -> list[str]:
+        """
+        プレイヤーの名前の変更履歴を古い順に返す
+        """
+        with self._lock:
+            return self.index.get_name_history(id)
+    def _get_player(self, code: int) -> Player:
+        id = self.registry.get_id(code)
+        with self._lock:
+            return Player(self.index.get_name_history(id)[-1], id)
     def get_players_over_time(self, date: datetime.date) -> dict[datetime.datetime, set[Player]]:
-        a = LogAnalyzer()
-        log = self.logs[date]
-        times = log.get_times()
-        players = a.get_players_over_time(log)
-        return dict(zip(times, players))
+        analysis = self._analyze(date)
+        players = [
+            set(map(self._get_player, codes))
+            for codes in analysis.get_players_over_time()
+        ]
+        return dict(zip(analysis.times, players))
+    def get_players_at(self, date: datetime.date, index: int) -> list[Player]:
+        """
+        その日のindex番目のサンプルの時刻にいた可能性のあるプレイヤー
+        ログがない日はKeyError、indexがサンプルの範囲外ならValueError
+        """
+        analysis = self._analyze(date)
+        if not 0 <= index < len(analysis.times):
+            raise ValueError(f"sample index out of range: {index} (0 <= index < {len(analysis.times)})")
+        codes = analysis.codes[analysis.presence[:, index]]
+        return [self._get_player(code) for code in codes.tolist()]
+    def get_cache_stats(self) -> dict[str, int]:
+        return self.analysis_cache.stats()
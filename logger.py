@@ -1,77 +1,89 @@
 import traceback
-import time
-import json
 import datetime
-import schedule
-from requests import ConnectionError as RequestsConnectionError
-from pydantic import DirectoryPath
+from pathlib import Path
+from requests import RequestException
 
-from config import Settings
-from log import Log, ILogRepository
+from config import ScheduleLoggerSettings
+from log import ILogRepository
+from log_repository import create_repository
 from fetcher import Fetcher, ResultTableNotFoundError
 from player import Player
-
-class ScheduleLoggerSettings(Settings):
-    log_directory: DirectoryPath
-    start_time: datetime.time
-    end_time: datetime.time
-
-settings = ScheduleLoggerSettings()
-
-class JsonRowLogRepository(ILogRepository):
-    def __init__(self):
-        self.log_directory: DirectoryPath = settings.log_directory
-    def save_row(self, logged_at: datetime.datetime, player_list: list[Player]):
-        # 本来は最新のタイムスタンプより前の入力が来たらエラーにしたい
-        # uowを気にしないようにするため都度openしているが書き込みは数分に一回なので問題ないはず
-        path = self.log_directory / f"log_{logged_at.date().isoformat()}.txt"
-        with open(path, "a") as f:
-            f.write(
-                json.dumps({"logged_time": logged_at.isoformat(), "log": player_list})
-                + "\n"
-            )
-    def get_log_by_date(self, date: datetime.date) -> Log:
-        path = self.log_directory / f"log_{date.isoformat()}.txt"
-        data = {}
-        with open(path, "r") as logfile:
-            for format_string in logfile:
-                fmt = json.loads(format_string)
-                logged_time = datetime.datetime.fromisoformat(fmt["logged_time"])
-                log = list(map(Player._make, fmt["log"]))
-                data[logged_time] = log
-        return Log(data)
+from polling import AdaptiveScheduler, Clock
 
 class ScheduleLogger:
-    def __init__(self, fetcher: Fetcher, repository: ILogRepository):
+    def __init__(
+            self,
+            fetcher: Fetcher,
+            repository: ILogRepository,
+            scheduler: AdaptiveScheduler | None = None,
+            clock: Clock | None = None
+        ):
         self.fetcher = fetcher
         self.repository = repository
-    def log_once(self, take=10):
+        self.scheduler = scheduler if scheduler is not None else AdaptiveScheduler()
+        self.clock = clock if clock is not None else Clock()
+        # 終了時刻まで待つ間隔を返したときのその終了時刻
+        self._waiting_for_end: datetime.datetime | None = None
+    def log_once(self, take=10) -> list[Player]:
         log = self.fetcher.get_log()
-        now = datetime.datetime.now()
+        now = self.clock.now()
         self.repository.save_row(now, log[:take])
+        return log[:take]
     def main_loop(self, start_time: datetime.datetime, end_time: datetime.datetime):
+        """
+        start_timeからend_timeまで、schedulerが決める間隔でログを取る
+        """
         assert start_time <= end_time
+        if (now := self.clock.now()) < start_time:
+            self.clock.sleep((start_time - now).total_seconds())
+        while (delay := self.step(end_time)) is not None:
+            self.clock.sleep(delay)
+    def step(self, end_time: datetime.datetime) -> float | None:
+        """
+        一度ログを取り、次に取るまでの秒数を返す、end_timeを過ぎていたら取らずにNone
+        終了時刻を過ぎて待たないようにして、終了時刻にも一度取る
+        """
+        now = self.clock.now()
+        # 終了時刻まで待った次の回は、sleepが遅れて終了時刻を少し過ぎていても最後の一回を取る
+        if end_time < now and self._waiting_for_end != end_time:
+            return None
+        self._waiting_for_end = None
         try:
-            schedule.every(8).minutes.until(end_time).do(self.log_once)
-            if start_time <= datetime.datetime.now():
-                self.log_once()
-            while (now := datetime.datetime.now()) <= end_time:
-                try:
-                    if start_time <= now:
-                        schedule.run_pending()
-                    time.sleep(30)
-                except (ResultTableNotFoundError, RequestsConnectionError):
-                    traceback.print_exc()
-                    time.sleep(30)
-        finally:
-            schedule.clear()
+            delay = self.scheduler.on_sample(self.log_once())
+        except (ResultTableNotFoundError, RequestException):
+            # 接続できない、タイムアウト、応答が途中で切れたなどはバックオフして取り直す
+            traceback.print_exc()
+            delay = self.scheduler.on_error()
+        remaining = (end_time - now).total_seconds()
+        if remaining <= 0:
+            return None
+        if remaining <= delay:
+            self._waiting_for_end = end_time
+            return remaining
+        return delay
+
+def save_rollup(repository: ILogRepository, date: datetime.date, log_directory: Path):
+    """
+    記録を終えた日の集計を保存しておき、統計のときにログを解析しなくて済むようにする
+    """
+    # numpyなどの解析の依存は記録中には使わないのでここで読み込む
+    from log_analysis import LogAnalyzer
+    from rollup import RollupRepository, build_rollup
+    if date in repository.get_dates():
+        rollup = build_rollup(repository, date, LogAnalyzer())
+        if rollup is not None:
+            RollupRepository(log_directory / "rollup").save(rollup)
 
 if __name__ == "__main__":
-    fetcher = Fetcher()
+    settings = ScheduleLoggerSettings()
+    fetcher = Fetcher(settings)
     cookies = input("Set-Cookie: ")
     fetcher.load_cookies_string(cookies)
-    logger = ScheduleLogger(fetcher, JsonRowLogRepository())
+    repository = create_repository(settings.log_directory, settings.log_database, settings.log_format)
+    scheduler = AdaptiveScheduler(settings.min_log_interval, settings.max_log_interval)
+    logger = ScheduleLogger(fetcher, repository, scheduler)
     today = datetime.datetime.today().date()
     start_time = datetime.datetime.combine(today, settings.start_time)
     end_time = datetime.datetime.combine(today, settings.end_time)
-    logger.main_loop(start_time, end_time)
\ No newline at end of file
+    logger.main_loop(start_time, end_time)
+    save_rollup(repository, today, settings.log_directory)
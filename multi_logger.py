@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import sys
+import traceback
+from typing import Awaitable, Callable
+from pydantic import BaseModel, HttpUrl
+from requests.adapters import HTTPAdapter
+
+from config import ScheduleLoggerSettings, Settings
+from fetcher import Fetcher
+from log_repository import create_repository
+from logger import ScheduleLogger, save_rollup
+from polling import AdaptiveScheduler
+
+class SessionSettings(BaseModel):
+    # ログを保存するディレクトリ（log_directoryの下）やデータベースの名前に使う
+    name: str
+    # 省略すると起動時に入力する
+    cookies: str | None = None
+    # 省略するとrival_search_urlを使う
+    rival_search_url: HttpUrl | None = None
+
+class MultiLoggerSettings(ScheduleLoggerSettings):
+    sessions: list[SessionSettings]
+    # 同時にライバル検索画面を取得するセッション数
+    max_concurrent_fetches: int = 4
+
+def create_adapter(max_concurrency: int) -> HTTPAdapter:
+    """
+    全てのセッションで共有するコネクションプール
+    """
+    return HTTPAdapter(pool_maxsize=max_concurrency)
+
+def create_fetcher(settings: Settings, session: SessionSettings, adapter: HTTPAdapter) -> Fetcher:
+    if session.rival_search_url is not None:
+        settings = settings.copy(update={"rival_search_url": session.rival_search_url})
+    fetcher = Fetcher(settings)
+    # cookieはセッションごとに持ち、接続はadapterのプールから使い回す
+    fetcher.session.mount("http://", adapter)
+    fetcher.session.mount("https://", adapter)
+    if session.cookies is not None:
+        fetcher.load_cookies_string(session.cookies)
+    return fetcher
+
+class MultiSessionLogger:
+    """
+    複数のアカウントのScheduleLoggerを一つのプロセスで並行に動かす
+    セッションごとに別のスケジュールで取得し、取得はスレッドで同時にmax_concurrency個まで行う
+    一つのセッションで想定していない例外が起きても、そのセッションはバックオフして続け、他のセッションには影響しない
+    """
+    def __init__(
+            self,
+            loggers: dict[str, ScheduleLogger],
+            max_concurrency: int,
+            sleep: Callable[[float], Awaitable] = asyncio.sleep
+        ):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency should be positive")
+        self.loggers = loggers
+        self.max_concurrency = max_concurrency
+        self.sleep = sleep
+    async def run(self, start_time: datetime.datetime, end_time: datetime.datetime):
+        assert start_time <= end_time
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        await asyncio.gather(*(
+            self._run_session(name, logger, start_time, end_time, semaphore)
+            for name, logger in self.loggers.items()
+        ))
+    async def _run_session(
+            self,
+            name: str,
+            logger: ScheduleLogger,
+            start_time: datetime.datetime,
+            end_time: datetime.datetime,
+            semaphore: asyncio.Semaphore
+        ):
+        if (now := logger.clock.now()) < start_time:
+            await self.sleep((start_time - now).total_seconds())
+        while True:
+            try:
+                async with semaphore:
+                    delay = await asyncio.to_thread(logger.step, end_time)
+            except Exception:
+                print(f"session {name}:", file=sys.stderr)
+                traceback.print_exc()
+                delay = logger.scheduler.on_error()
+            if delay is None:
+                break
+            await self.sleep(delay)
+
+if __name__ == "__main__":
+    settings = MultiLoggerSettings()
+    adapter = create_adapter(settings.max_concurrent_fetches)
+    repositories = {}
+    loggers = {}
+    for session in settings.sessions:
+        fetcher = create_fetcher(settings, session, adapter)
+        if session.cookies is None:
+            fetcher.load_cookies_string(input(f"Set-Cookie ({session.name}): "))
+        log_directory = settings.log_directory / session.name
+        log_directory.mkdir(exist_ok=True)
+        log_database = None
+        if settings.log_database is not None:
+            log_database = settings.log_database.with_stem(f"{settings.log_database.stem}_{session.name}")
+        repositories[session.name] = create_repository(log_directory, log_database, settings.log_format)
+        scheduler = AdaptiveScheduler(settings.min_log_interval, settings.max_log_interval)
+        loggers[session.name] = ScheduleLogger(fetcher, repositories[session.name], scheduler)
+    today = datetime.datetime.today().date()
+    start_time = datetime.datetime.combine(today, settings.start_time)
+    end_time = datetime.datetime.combine(today, settings.end_time)
+    asyncio.run(MultiSessionLogger(loggers, settings.max_concurrent_fetches).run(start_time, end_time))
+    for session in settings.sessions:
+        save_rollup(repositories[session.name], today, settings.log_directory / session.name)
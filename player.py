@@ -1,11 +1,101 @@
+import datetime
+import threading
 from typing import NamedTuple
 
 class Player(NamedTuple):
     name: str
     id: str
     def __hash__(self) -> int:
-        return hash(id)
+        return hash(self.id)
     def __eq__(self, __o: object) -> bool:
         if isinstance(__o, Player):
             return self.id == __o.id
-        return NotImplemented
\ No newline at end of file
+        return NotImplemented
+
+class PlayerRegistry:
+    """
+    プレイヤーIDを0からの連番の整数コードに変換して管理する
+    IDごとに名前の変更履歴も記録する
+    """
+    def __init__(self):
+        self._codes: dict[str, int] = {}
+        self._ids: list[str] = []
+        # コードごとの名前の履歴（最後が最新）
+        self._names: list[list[str]] = []
+        # コードごとの最新の名前を登録したときのサンプルの時刻（時刻なしで登録したらNone）
+        self._seen: list[datetime.datetime | None] = []
+        # 新しいIDや名前が登録されるたびに増える
+        self.revision = 0
+        # 複数のスレッドが同時に新しいIDを登録しても同じコードを割り当てないようにする
+        self._lock = threading.Lock()
+    def __len__(self) -> int:
+        return len(self._ids)
+    def intern(self, p: Player, seen_at: datetime.datetime | None = None) -> int:
+        """
+        プレイヤーのコードを返す、初めて見るIDなら新しいコードを割り当てる
+        seen_atはプレイヤーが現れたサンプルの時刻
+        新しい日を先に読み込んだ後で古い日を読み込んでも、最新の名前より前の時刻の名前は履歴に足さない
+        """
+        code = self._codes.get(p.id)
+        # 登録済みで名前も変わっていなければロックを取らない
+        if code is not None and self._names[code][-1] == p.name:
+            return code
+        with self._lock:
+            code = self._codes.get(p.id)
+            if code is None:
+                code = len(self._ids)
+                # 別スレッドから参照されてもコードだけが先に見えないように最後に登録する
+                self._ids.append(p.id)
+                self._names.append([p.name])
+                self._seen.append(seen_at)
+                self._codes[p.id] = code
+                self.revision += 1
+            elif self._names[code][-1] != p.name:
+                seen = self._seen[code]
+                if seen_at is not None and seen is not None and seen_at < seen:
+                    return code
+                self._names[code].append(p.name)
+                self._seen[code] = seen_at
+                self.revision += 1
+            return code
+    def intern_history(self, id: str, names: list[str]) -> int:
+        """
+        名前の履歴ごとプレイヤーを登録してコードを返す
+        既に登録済みの最新の名前より後の履歴だけを追加する
+        """
+        code = self._codes.get(id)
+        if code is not None and self._names[code][-1] in names:
+            latest = self._names[code][-1]
+            names = names[len(names) - names[::-1].index(latest):]
+        for name in names:
+            code = self.intern(Player(name, id))
+        return code
+    def get_code(self, id: str) -> int:
+        try:
+            return self._codes[id]
+        except KeyError as e:
+            raise KeyError(f"player id: {id} not found") from e
+    def get_id(self, code: int) -> str:
+        return self._ids[code]
+    def get_player(self, code: int) -> Player:
+        """
+        最新の名前でプレイヤーを返す
+        """
+        return Player(self._names[code][-1], self._ids[code])
+    def get_name_history(self, code: int) -> list[str]:
+        return self._names[code][:]
+    def dump(self) -> list[tuple[str, list[str]]]:
+        """
+        コード順にIDと名前の履歴を並べたリスト
+        """
+        return [(id, names[:]) for id, names in zip(self._ids, self._names)]
+    @classmethod
+    def load(cls, items: list[tuple[str, list[str]]]) -> "PlayerRegistry":
+        """
+        dumpしたリストから同じコードのregistryを作る
+        """
+        registry = cls()
+        for id, names in items:
+            for name in names:
+                registry.intern(Player(name, id))
+        return registry
@@ -0,0 +1,111 @@
+import datetime
+import json
+import os
+from pathlib import Path
+
+from player import Player
+
+class PlayerDateIndex:
+    """
+    プレイヤーIDから、ライバル検索に現れた日付とその日のサンプルの範囲を引く索引
+    ログの追記に合わせて更新し、ファイルに保存しておく
+    ログを時系列順に読むので名前の履歴もここで記録する
+    """
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        # id -> 日付 -> 現れた最初と最後のサンプルのindex
+        self._ranges: dict[str, dict[datetime.date, tuple[int, int]]] = {}
+        # id -> 名前の履歴（最後が最新）
+        self._names: dict[str, list[str]] = {}
+        # 日付ごとの索引に反映済みのサンプル数とログファイルのバイト位置
+        self.sizes: dict[datetime.date, int] = {}
+        self.offsets: dict[datetime.date, int] = {}
+        # offsetsまで読んだときのログのバージョン、変わっていなければその日は読まなくてよい
+        self.versions: dict[datetime.date, tuple] = {}
+        # 保存していない変更があるか
+        self._dirty = False
+        if path is not None and path.exists():
+            self._load(path)
+    def _load(self, path: Path):
+        data = json.loads(path.read_text())
+        for date, (size, offset, *version) in data["dates"].items():
+            _date = datetime.date.fromisoformat(date)
+            self.sizes[_date] = size
+            self.offsets[_date] = offset
+            # バージョンを保存していなかった索引ではその日を一度読み直す
+            if version and version[0] is not None:
+                self.versions[_date] = tuple(version[0])
+        for id, (names, ranges) in data["players"].items():
+            self._names[id] = names
+            self._ranges[id] = {
+                datetime.date.fromisoformat(date): (first, last)
+                for date, (first, last) in ranges.items()
+            }
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        data = {
+            "dates": {
+                date.isoformat(): [size, self.offsets.get(date, 0), self.versions.get(date)]
+                for date, size in self.sizes.items()
+            },
+            "players": {
+                id: [
+                    self._names[id],
+                    {date.isoformat(): list(r) for date, r in ranges.items()}
+                ]
+                for id, ranges in self._ranges.items()
+            },
+        }
+        # 読み込み中のプロセスが途中の内容を見ないように一時ファイルから置き換える
+        # 同じディレクトリに書く他のプロセス（dashとfastapi）と一時ファイルが重ならないようにpidを付ける
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False))
+        os.replace(tmp, self.path)
+        self._dirty = False
+    def add_rows(self, date: datetime.date, start: int, rows: list[list[Player]]):
+        """
+        その日のstart番目のサンプルから続くプレイヤーのリストを索引に追加する
+        """
+        for i, row in enumerate(rows, start):
+            for p in row:
+                ranges = self._ranges.setdefault(p.id, {})
+                first, _ = ranges.get(date, (i, i))
+                ranges[date] = (first, i)
+                names = self._names.setdefault(p.id, [p.name])
+                if names[-1] != p.name:
+                    names.append(p.name)
+        self.sizes[date] = max(self.sizes.get(date, 0), start + len(rows))
+        self._dirty = True
+    def set_offset(self, date: datetime.date, offset: int):
+        if self.offsets.get(date) != offset:
+            self.offsets[date] = offset
+            self._dirty = True
+    def set_version(self, date: datetime.date, version: tuple):
+        if self.versions.get(date) != version:
+            self.versions[date] = version
+            self._dirty = True
+    def remove_date(self, date: datetime.date):
+        """
+        ログファイルが書き換えられたときなどに、その日の索引を作り直すために消す
+        """
+        for ranges in self._ranges.values():
+            ranges.pop(date, None)
+        self.sizes.pop(date, None)
+        self.offsets.pop(date, None)
+        self.versions.pop(date, None)
+        self._dirty = True
+    def get_dates(self, id: str) -> list[datetime.date]:
+        """
+        プレイヤーが現れた日付を昇順で返す
+        """
+        return sorted(self._ranges.get(id, {}))
+    def get_ranges(self, id: str) -> dict[datetime.date, tuple[int, int]]:
+        return dict(sorted(self._ranges.get(id, {}).items()))
+    def get_name_history(self, id: str) -> list[str]:
+        return self._names.get(id, [])[:]
+    def get_players(self) -> list[Player]:
+        """
+        索引にある全プレイヤーを最新の名前で返す
+        """
+        return [Player(names[-1], id) for id, names in self._names.items()]
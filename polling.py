@@ -0,0 +1,82 @@
+import datetime
+import random
+import time
+
+from player import Player
+
+class Clock:
+    """
+    ロガーが使う現在時刻と待ち時間
+    テストでは実際に待たずに時刻を進めるものに差し替える
+    """
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now()
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+def count_new_at_top(previous: list[Player], current: list[Player]) -> int:
+    """
+    前回の先頭のプレイヤーより前に来たプレイヤーの数（前回から新しくプレイした人数の目安）
+    前回の先頭がいなくなっていれば全員入れ替わったとみなす
+    """
+    if len(previous) == 0:
+        return 0
+    try:
+        return current.index(previous[0])
+    except ValueError:
+        return len(current)
+
+class AdaptiveScheduler:
+    """
+    ライバル検索画面の先頭の入れ替わりに合わせてログを取る間隔を決める
+    前回から二人以上がプレイしていれば追い越しを見逃さないように間隔を縮め、誰もプレイしていなければ延ばす
+    取得に失敗したらジッター付きの指数バックオフで待つ
+    """
+    def __init__(
+            self,
+            min_interval: float = 60,
+            max_interval: float = 900,
+            initial_interval: float = 480,
+            growth: float = 1.5,
+            backoff_base: float = 30,
+            max_backoff: float = 900,
+            rng: random.Random | None = None
+        ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals should satisfy 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = self._clamp(initial_interval)
+        self.growth = growth
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.rng = rng if rng is not None else random.Random()
+        # 連続して失敗した回数
+        self.errors = 0
+        self._previous: list[Player] = []
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+    def on_sample(self, row: list[Player]) -> float:
+        """
+        取得したプレイヤーのリストから次に取得するまでの秒数を返す
+        """
+        self.errors = 0
+        previous, self._previous = self._previous, row
+        if len(previous) == 0:
+            # 最初のサンプルでは比べるものがない
+            return self.interval
+        churn = count_new_at_top(previous, row)
+        if churn >= 2:
+            # 一回のサンプルの間にプレイするのが一人くらいになるようにする
+            self.interval = self._clamp(self.interval / churn)
+        elif churn == 0:
+            self.interval = self._clamp(self.interval * self.growth)
+        return self.interval
+    def on_error(self) -> float:
+        """
+        取得に失敗したときに次に試すまでの秒数を返す
+        """
+        self.errors += 1
+        delay = min(self.max_backoff, self.backoff_base * 2 ** (self.errors - 1))
+        # 複数のロガーが同時に再試行しないように半分から全体までの間でばらつかせる
+        return self.rng.uniform(delay / 2, delay)
@@ -0,0 +1,81 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Hashable
+
+from cache import LRUCache
+
+def get_etag(key: Hashable, version: str) -> str:
+    """
+    エンドポイントとパラメータのkeyとデータのバージョンから強いETagの値を作る
+    """
+    return hashlib.sha1(repr((key, version)).encode()).hexdigest()
+
+def match_etag(if_none_match: str | None, etag: str) -> bool:
+    """
+    If-None-Matchヘッダのいずれかのタグがetagと一致するか
+    """
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Matchは弱い比較で判定するのでW/は外す
+    return "*" in tags or any(tag.removeprefix("W/").strip('"') == etag for tag in tags)
+
+class RenderCache:
+    """
+    描画した画像をETagごとに保存する
+    メモリには合計max_bytesまで残し、directoryを指定するとディスクにもmax_disk_bytesまで残す
+    """
+    def __init__(
+            self,
+            max_bytes: int,
+            directory: Path | None = None,
+            max_disk_bytes: int = 256 * 2**20,
+            maxsize: int = 4096
+        ):
+        self.memory: LRUCache[str, bytes] = LRUCache(maxsize, max_bytes, len)
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+    def _get_path(self, etag: str) -> Path:
+        return self.directory / f"{etag}.bin"
+    def get(self, etag: str) -> bytes | None:
+        data = self.memory.get(etag)
+        if data is not None or self.directory is None:
+            return data
+        try:
+            data = self._get_path(etag).read_bytes()
+        except FileNotFoundError:
+            return None
+        self.memory.put(etag, data)
+        return data
+    def put(self, etag: str, data: bytes):
+        self.memory.put(etag, data)
+        if self.directory is None:
+            return
+        # 読み込み中のプロセスが途中の内容を見ないように一時ファイルから置き換える
+        path = self._get_path(etag)
+        tmp = path.with_name(f"{etag}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._prune()
+    def _prune(self):
+        """
+        ディスクの合計がmax_disk_bytesを超えたら古いものから消す
+        """
+        files = []
+        for path in self.directory.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    def stats(self) -> dict[str, int]:
+        return {**self.memory.stats(), "bytes": self.memory.weight}
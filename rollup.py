@@ -0,0 +1,202 @@
+import datetime
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Hashable, NamedTuple
+import numpy as np
+
+from interpolator import SLOTS, resample_oneday
+from log import IFollowableLogRepository, ILogRepository
+from log_analysis import DayAnalysis, LogAnalyzer
+from log_repository import create_repository
+
+# packbitsしたSLOTSのバイト数
+PACKED_SLOTS = (len(SLOTS) + 7) // 8
+
+class DayRollup(NamedTuple):
+    """
+    締めた日の解析結果を一日の`SLOTS`に補間したもの
+    プレイヤーはIDで保持する
+    """
+    date: datetime.date
+    # SLOTSごとの推定プレイ人数
+    headcounts: np.ndarray
+    # 解析結果に現れたプレイヤーのID（昇順）
+    ids: np.ndarray
+    # packed_presence[i]: ids[i]のプレイヤーがSLOTSごとにいた可能性があるかをnp.packbitsしたもの
+    packed_presence: np.ndarray
+    # played[i]: ids[i]のプレイヤーのプレイが確定したか
+    played: np.ndarray
+    # 集計元のログのバージョン
+    version: tuple
+    # 解析に使ったLogAnalyzerの閾値（マイクロ秒）
+    params: tuple[int, int]
+    @classmethod
+    def create(
+            cls,
+            date: datetime.date,
+            analysis: DayAnalysis,
+            ids: list[str],
+            version: Hashable,
+            analyzer: LogAnalyzer
+        ) -> "DayRollup":
+        """
+        解析結果を補間して作る、idsはanalysis.codesに対応するID
+        """
+        order = np.argsort(np.asarray(ids, dtype=str), kind="stable")
+        presence = np.array([
+            resample_oneday(analysis.times, row) > 0
+            for row in analysis.presence[order].astype(float)
+        ], dtype=bool).reshape(len(order), len(SLOTS))
+        return cls(
+            date,
+            resample_oneday(analysis.times, analysis.headcounts),
+            np.asarray(ids, dtype=str)[order],
+            np.packbits(presence, axis=1),
+            analysis.played[order],
+            tuple(version),
+            get_analyzer_params(analyzer)
+        )
+    def _index(self, id: str) -> int:
+        i = int(np.searchsorted(self.ids, id))
+        if i == len(self.ids) or self.ids[i] != id:
+            raise KeyError(f"player id: {id} not found")
+        return i
+    def get_presence(self, id: str) -> np.ndarray:
+        """
+        プレイヤーがSLOTSごとにいた可能性があるか
+        """
+        return np.unpackbits(self.packed_presence[self._index(id)], count=len(SLOTS)).astype(bool)
+    def has_played(self, id: str) -> bool:
+        try:
+            return bool(self.played[self._index(id)])
+        except KeyError:
+            return False
+    def is_valid(self, version: Hashable, analyzer: LogAnalyzer) -> bool:
+        """
+        ログと解析の閾値が集計したときから変わっていないか
+        """
+        return self.version == tuple(version) and self.params == get_analyzer_params(analyzer)
+
+def get_analyzer_params(analyzer: LogAnalyzer) -> tuple[int, int]:
+    return (
+        analyzer.MAX_STABLE_TIME // datetime.timedelta(microseconds=1),
+        analyzer.MAX_TIME_BETWEEN_REENTRY // datetime.timedelta(microseconds=1)
+    )
+
+def is_closed(date: datetime.date, end_time: datetime.time, now: datetime.datetime | None = None) -> bool:
+    """
+    その日の記録が終わっているか
+    """
+    now = now if now is not None else datetime.datetime.now()
+    return date < now.date() or (date == now.date() and end_time <= now.time())
+
+class RollupRepository:
+    """
+    日ごとのDayRollupを一つのファイルに保存する
+    一行目にJSONのヘッダ（ids, version, params）、続けて配列のバイト列を並べる
+    - headcounts: float64 * len(SLOTS)
+    - packed_presence: uint8 * len(ids) * PACKED_SLOTS
+    - played: bool * len(ids)
+    起動直後の統計で全ての日を読むので、npzより軽い形式にしている
+    """
+    def __init__(self, directory: Path):
+        self.directory = directory
+    def get_path(self, date: datetime.date) -> Path:
+        return self.directory / f"rollup_{date.isoformat()}.bin"
+    def get_dates(self) -> list[datetime.date]:
+        if not self.directory.exists():
+            return []
+        return sorted(
+            datetime.date.fromisoformat(path.stem.removeprefix("rollup_"))
+            for path in self.directory.glob("rollup_????-??-??.bin")
+        )
+    def save(self, rollup: DayRollup):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        header = {
+            "ids": rollup.ids.tolist(),
+            "version": list(rollup.version),
+            "params": list(rollup.params),
+        }
+        data = b"".join([
+            json.dumps(header).encode() + b"\n",
+            rollup.headcounts.astype(np.float64).tobytes(),
+            rollup.packed_presence.astype(np.uint8).tobytes(),
+            rollup.played.astype(bool).tobytes(),
+        ])
+        # 読み込み中のプロセスが途中の内容を見ないように一時ファイルから置き換える
+        # 同じディレクトリに書く他のプロセス（dashとfastapi）と一時ファイルが重ならないようにpidを付ける
+        path = self.get_path(rollup.date)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    def load(self, date: datetime.date) -> DayRollup | None:
+        """
+        保存されていなければNoneを返す
+        """
+        try:
+            with open(self.get_path(date), "rb") as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        n = len(header["ids"])
+        offset = len(SLOTS) * 8
+        headcounts = np.frombuffer(body, np.float64, len(SLOTS))
+        packed_presence = np.frombuffer(body, np.uint8, n * PACKED_SLOTS, offset).reshape(n, PACKED_SLOTS)
+        played = np.frombuffer(body, bool, n, offset + n * PACKED_SLOTS)
+        return DayRollup(
+            date,
+            headcounts,
+            np.array(header["ids"], dtype=str),
+            packed_presence,
+            played,
+            tuple(header["version"]),
+            tuple(header["params"])
+        )
+
+def build_rollup(repository: ILogRepository, date: datetime.date, analyzer: LogAnalyzer) -> DayRollup | None:
+    """
+    ログを読んで一日分を解析し、DayRollupを作る、サンプルがなければNoneを返す
+    """
+    # 読み込み中に追記された場合に古いバージョンとして扱われるように先に取る
+    version = repository.get_version(date)
+    log = repository.get_log_by_date(date)
+    if log.size == 0:
+        return None
+    analysis = analyzer.analyze(log)
+    ids = [log.registry.get_id(code) for code in analysis.codes.tolist()]
+    return DayRollup.create(date, analysis, ids, version, analyzer)
+
+def rebuild_rollups(
+        repository: IFollowableLogRepository,
+        rollups: RollupRepository,
+        analyzer: LogAnalyzer,
+        end_time: datetime.time
+    ) -> list[datetime.date]:
+    """
+    締めた日のDayRollupを全て作り直し、作り直した日付を返す
+    LogAnalyzerの閾値を変えたときに使う
+    """
+    ret = []
+    for date in repository.get_dates():
+        if not is_closed(date, end_time):
+            continue
+        rollup = build_rollup(repository, date, analyzer)
+        if rollup is not None:
+            rollups.save(rollup)
+            ret.append(date)
+    return ret
+
+if __name__ == "__main__":
+    from config import ScheduleLoggerSettings
+    settings = ScheduleLoggerSettings()
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else settings.log_directory / "rollup"
+    rebuilt = rebuild_rollups(
+        create_repository(settings.log_directory, settings.log_database, settings.log_format),
+        RollupRepository(target),
+        LogAnalyzer(),
+        settings.end_time
+    )
+    print(f"rebuilt {len(rebuilt)} rollups in {target}")
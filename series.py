@@ -0,0 +1,89 @@
+import datetime
+import json
+from io import BytesIO
+from typing import NamedTuple
+import numpy as np
+
+from interpolator import SLOTS, TICK
+
+# Acceptで選べる形式
+JSON_MEDIA_TYPE = "application/json"
+NPY_MEDIA_TYPE = "application/x-npy"
+
+class Series(NamedTuple):
+    """
+    グラフにする数値の列
+    stepがあればstartから等間隔、なければstartからのoffsets（秒）の時刻の値
+    """
+    # 一日の統計なら0時からの時間、ある日のログなら最初のサンプルの時刻
+    start: datetime.datetime | datetime.timedelta
+    step: int | None
+    offsets: np.ndarray | None
+    values: np.ndarray
+    @classmethod
+    def oneday(cls, values: np.ndarray) -> "Series":
+        """
+        一日の`SLOTS`に補間した値の列
+        """
+        return cls(datetime.timedelta(seconds=int(SLOTS[0])), TICK*60, None, np.asarray(values, dtype=float))
+    @classmethod
+    def sampled(cls, times: list[datetime.datetime], values: list[float]) -> "Series":
+        """
+        サンプルした時刻ごとの値の列
+        """
+        if len(times) == 0:
+            return cls(datetime.datetime.min, None, np.empty(0, dtype=np.int64), np.empty(0))
+        us = np.array(times, dtype="datetime64[us]").astype(np.int64)
+        return cls(times[0], None, (us - us[0]) // 10**6, np.asarray(values, dtype=float))
+    def get_start_string(self) -> str:
+        if isinstance(self.start, datetime.timedelta):
+            s = int(self.start.total_seconds())
+            return f"{s // 3600:02}:{s // 60 % 60:02}:{s % 60:02}"
+        return self.start.isoformat()
+
+def choose_media_type(accept: str | None) -> str:
+    """
+    Acceptヘッダから返す形式を選ぶ、指定がなければJSON
+    """
+    if accept is not None:
+        for media_range in accept.split(","):
+            media_type = media_range.split(";")[0].strip()
+            if media_type in (NPY_MEDIA_TYPE, "application/octet-stream"):
+                return NPY_MEDIA_TYPE
+            if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+                return JSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+def encode_json(series: Series) -> bytes:
+    """
+    {"start", "step" または "offsets", "values"} の列形式のJSON
+    """
+    data = {"start": series.get_start_string()}
+    if series.step is not None:
+        data["step"] = series.step
+    else:
+        data["offsets"] = series.offsets.tolist()
+    data["values"] = series.values.tolist()
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def encode_npy(series: Series) -> tuple[bytes, dict[str, str]]:
+    """
+    numpyで読める.npyの配列と、startとstepを入れるヘッダ
+    stepがなければoffset（int64）とvalue（float64）の構造化配列にする
+    """
+    headers = {"X-Series-Start": series.get_start_string()}
+    if series.step is not None:
+        headers["X-Series-Step"] = str(series.step)
+        array = series.values
+    else:
+        array = np.empty(len(series.values), dtype=[("offset", "<i8"), ("value", "<f8")])
+        array["offset"] = series.offsets
+        array["value"] = series.values
+    with BytesIO() as buf:
+        np.save(buf, array, allow_pickle=False)
+        return buf.getvalue(), headers
+
+def encode(series: Series, media_type: str) -> tuple[bytes, dict[str, str]]:
+    if media_type == NPY_MEDIA_TYPE:
+        return encode_npy(series)
+    return encode_json(series), {}
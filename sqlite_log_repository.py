@@ -0,0 +1,228 @@
+import datetime
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from log import IFollowableLogRepository, Log, ReadRows
+from log_repository import JsonRowLogRepository
+from player import Player, PlayerRegistry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    code INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS player_names (
+    code INTEGER NOT NULL REFERENCES players(code),
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (code, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    logged_at TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_date ON snapshots(date);
+CREATE TABLE IF NOT EXISTS entries (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    position INTEGER NOT NULL,
+    player_code INTEGER NOT NULL REFERENCES players(code),
+    PRIMARY KEY (snapshot_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_player ON entries(player_code, snapshot_id);
+"""
+
+class SqliteLogRepository(IFollowableLogRepository):
+    """
+    SQLiteにサンプルとプレイヤーの位置を保存する
+    WALモードなので書き込み中もWebのプロセスから読み込める
+    read_rowsなどの位置はサンプルのid、名前の履歴には時刻がないので読み込む名前は最新のもの
+    """
+    def __init__(self, path: Path, registry: PlayerRegistry | None = None):
+        self.path = path
+        # 読み込んだログのプレイヤーを共通のコードで扱うためのregistry
+        self.registry = registry
+        # sqlite3の接続はスレッドをまたいで使えないのでスレッドごとに持つ
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+    def __reduce__(self):
+        # 接続はプロセスをまたいで渡せないので、プロセスプールにはパスだけを渡して接続し直す
+        return SqliteLogRepository, (self.path, self.registry)
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    def _get_players(self, conn: sqlite3.Connection) -> dict[str, tuple[int, int, str]]:
+        """
+        接続ごとのID -> (コード, 最新の名前の番号, 最新の名前)、初めて使うときにまとめて読み込む
+        別の接続が書き込んだ後は_writeで捨てて読み込み直す
+        """
+        players = getattr(self._local, "players", None)
+        if players is None:
+            rows = conn.execute("""
+                SELECT p.id, p.code, n.seq, n.name
+                FROM players p JOIN player_names n ON n.code = p.code
+                ORDER BY n.seq
+            """)
+            players = self._local.players = {id: (code, seq, name) for id, code, seq, name in rows}
+        return players
+    def _intern(self, conn: sqlite3.Connection, p: Player) -> int:
+        """
+        プレイヤーのコードを返す、名前が変わっていれば履歴に追加する
+        """
+        players = self._get_players(conn)
+        cached = players.get(p.id)
+        if cached is None:
+            code = conn.execute("INSERT INTO players (id) VALUES (?)", (p.id,)).lastrowid
+            conn.execute("INSERT INTO player_names VALUES (?, 0, ?)", (code, p.name))
+            players[p.id] = (code, 0, p.name)
+            return code
+        code, seq, name = cached
+        if name != p.name:
+            conn.execute("INSERT INTO player_names VALUES (?, ?, ?)", (code, seq + 1, p.name))
+            players[p.id] = (code, seq + 1, p.name)
+        return code
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """
+        書き込みのトランザクション、失敗したら取り消した行を覚えていないようにキャッシュを捨てる
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                # 書き込みのロックを取ってから確かめるので、確かめた後に別の接続が書き込むことはない
+                conn.execute("BEGIN IMMEDIATE")
+                # data_versionは別の接続がコミットしたときだけ変わる
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != getattr(self._local, "data_version", None):
+                    self._local.players = None
+                    self._local.data_version = version
+                yield conn
+        except BaseException:
+            self._local.players = None
+            raise
+    def _insert_row(self, conn: sqlite3.Connection, logged_at: datetime.datetime, player_list: list[Player]):
+        snapshot_id = conn.execute(
+            "INSERT INTO snapshots (logged_at, date) VALUES (?, ?)",
+            (logged_at.isoformat(), logged_at.date().isoformat())
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?)",
+            [(snapshot_id, i, self._intern(conn, p)) for i, p in enumerate(player_list)]
+        )
+    def save_row(self, logged_at: datetime.datetime, player_list: list[Player]):
+        with self._write() as conn:
+            self._insert_row(conn, logged_at, player_list)
+    def import_json(self, source: JsonRowLogRepository):
+        """
+        JSON形式のログを一日ごとにまとめて取り込む、取り込み済みの日は飛ばす
+        """
+        imported = set(self.get_dates())
+        for date in source.get_dates():
+            if date in imported:
+                continue
+            with self._write() as conn:
+                # 一日の途中の名前の変更も履歴に残るように書かれた行のまま取り込む
+                for logged_at, player_list in source.iter_rows(date):
+                    self._insert_row(conn, logged_at, player_list)
+    def get_dates(self) -> list[datetime.date]:
+        rows = self._connect().execute("SELECT DISTINCT date FROM snapshots ORDER BY date")
+        return [datetime.date.fromisoformat(d) for d, in rows]
+    def _get_snapshots(self, where: str, params: tuple) -> list[tuple[datetime.datetime, list[Player]]]:
+        """
+        条件に合うサンプルを時刻順にプレイヤーのリストにして返す（名前は最新のもの）
+        """
+        return [(logged_at, player_list) for _, logged_at, player_list in self._get_snapshots_with_id(where, params)]
+    def _get_snapshots_with_id(self, where: str, params: tuple) -> list[tuple[int, datetime.datetime, list[Player]]]:
+        rows = self._connect().execute(f"""
+            SELECT s.id, s.logged_at, p.id, n.name
+            FROM snapshots s
+            LEFT JOIN entries e ON e.snapshot_id = s.id
+            LEFT JOIN players p ON p.code = e.player_code
+            LEFT JOIN player_names n ON n.code = p.code AND n.seq = (
+                SELECT MAX(seq) FROM player_names WHERE code = p.code
+            )
+            WHERE {where}
+            ORDER BY s.logged_at, e.position
+        """, params)
+        ret: list[tuple[int, datetime.datetime, list[Player]]] = []
+        last = None
+        for snapshot_id, logged_at, id, name in rows:
+            if snapshot_id != last:
+                ret.append((snapshot_id, datetime.datetime.fromisoformat(logged_at), []))
+                last = snapshot_id
+            if id is not None:
+                ret[-1][2].append(Player(name, id))
+        return ret
+    def read_rows(self, date: datetime.date, offset: int) -> ReadRows:
+        """
+        offsetは読み込み済みのサンプルの最大のid
+        """
+        end, = self._connect().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM snapshots WHERE date = ?", (date.isoformat(),)
+        ).fetchone()
+        if end < offset:
+            # サンプルが消されたので先頭から読み直す
+            offset = 0
+        # 最大のidを取った後にコミットされたサンプルは次回に読む
+        snapshots = self._get_snapshots(
+            "s.date = ? AND s.id > ? AND s.id <= ?", (date.isoformat(), offset, end)
+        )
+        return ReadRows(offset, end, snapshots)
+    def get_log_by_date(self, date: datetime.date, end: int | None = None) -> Log:
+        if end is None:
+            snapshots = self._get_snapshots("s.date = ?", (date.isoformat(),))
+        else:
+            snapshots = self._get_snapshots("s.date = ? AND s.id <= ?", (date.isoformat(), end))
+        return Log(dict(snapshots), self.registry)
+    def get_snapshots_between(
+            self,
+            start: datetime.datetime,
+            end: datetime.datetime
+        ) -> list[tuple[datetime.datetime, list[Player]]]:
+        """
+        start以上end未満の時刻のサンプルを返す
+        """
+        return self._get_snapshots(
+            "s.logged_at >= ? AND s.logged_at < ?", (start.isoformat(), end.isoformat())
+        )
+    def get_dates_of_player(self, id: str) -> list[datetime.date]:
+        """
+        プレイヤーがライバル検索に現れた日付を返す
+        """
+        rows = self._connect().execute("""
+            SELECT DISTINCT s.date
+            FROM players p
+            JOIN entries e ON e.player_code = p.code
+            JOIN snapshots s ON s.id = e.snapshot_id
+            WHERE p.id = ?
+            ORDER BY s.date
+        """, (id,))
+        return [datetime.date.fromisoformat(d) for d, in rows]
+    def get_name_history(self, id: str) -> list[str]:
+        rows = self._connect().execute("""
+            SELECT n.name FROM players p JOIN player_names n ON n.code = p.code
+            WHERE p.id = ? ORDER BY n.seq
+        """, (id,))
+        return [name for name, in rows]
+    def get_version(self, date: datetime.date) -> tuple[int, int]:
+        count, last = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM snapshots WHERE date = ?", (date.isoformat(),)
+        ).fetchone()
+        return count, last
+
+if __name__ == "__main__":
+    from config import ScheduleLoggerSettings
+    settings = ScheduleLoggerSettings()
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else settings.log_directory / "log.sqlite3"
+    SqliteLogRepository(path).import_json(JsonRowLogRepository(settings.log_directory))
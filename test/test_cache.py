@@ -0,0 +1,44 @@
+import pytest
+
+from cache import LRUCache
+
+def test_lru_cache_evicts_least_recently_used():
+    c = LRUCache(2)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1
+    c.put("c", 3)
+    assert "b" not in c
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert len(c) == 2
+
+def test_lru_cache_counts_hits_and_misses():
+    c = LRUCache(2)
+    calls = []
+    def compute():
+        calls.append(1)
+        return 42
+    assert c.get_or_compute("k", compute) == 42
+    assert c.get_or_compute("k", compute) == 42
+    assert c.get("missing") is None
+    assert len(calls) == 1
+    assert c.stats() == {"hits": 1, "misses": 2, "size": 1, "maxsize": 2}
+
+def test_lru_cache_rejects_non_positive_size():
+    with pytest.raises(ValueError):
+        LRUCache(0)
+
+def test_lru_cache_bounds_total_weight():
+    c = LRUCache(10, maxweight=5, weigher=len)
+    c.put("a", "xx")
+    c.put("b", "xx")
+    c.put("c", "xx")
+    assert "a" not in c
+    assert c.weight == 4
+    c.pop("b")
+    assert c.weight == 2
+    # 上限より重いものも一つだけなら残す
+    c.put("d", "xxxxxxxx")
+    assert list(c._data) == ["d"]
+    assert c.weight == 8
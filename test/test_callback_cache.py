@@ -0,0 +1,48 @@
+from callback_cache import CallbackCache
+from render_cache import RenderCache
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self) -> float:
+        return self.now
+
+def make_counted(cache: CallbackCache, versions: dict):
+    calls = []
+    @cache.memoize(lambda weekday: versions[weekday])
+    def callback(weekday):
+        calls.append(weekday)
+        return {"weekday": weekday, "version": versions[weekday]}
+    return callback, calls
+
+def test_memoize_by_args_and_version():
+    versions = {0: "v1", 1: "v1"}
+    callback, calls = make_counted(CallbackCache(RenderCache(2**20), 60), versions)
+    assert callback(0) == {"weekday": 0, "version": "v1"}
+    assert callback(0) == {"weekday": 0, "version": "v1"}
+    callback(1)
+    assert calls == [0, 1]
+    versions[0] = "v2"
+    assert callback(0) == {"weekday": 0, "version": "v2"}
+    assert calls == [0, 1, 0]
+
+def test_ttl():
+    clock = Clock()
+    callback, calls = make_counted(CallbackCache(RenderCache(2**20), 60, clock), {0: "v1"})
+    callback(0)
+    clock.now = 59
+    callback(0)
+    assert calls == [0]
+    clock.now = 61
+    callback(0)
+    callback(0)
+    assert calls == [0, 0]
+
+def test_shared_directory(tmp_path):
+    versions = {0: "v1"}
+    a, a_calls = make_counted(CallbackCache(RenderCache(2**20, tmp_path), 60), versions)
+    b, b_calls = make_counted(CallbackCache(RenderCache(2**20, tmp_path), 60), versions)
+    a(0)
+    # 別のプロセスが計算した結果を使う
+    assert b(0) == {"weekday": 0, "version": "v1"}
+    assert a_calls == [0] and b_calls == []
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+
+from coalescing_executor import CoalescingExecutor
+
+def test_identical_requests_share_one_call():
+    executor = CoalescingExecutor(2)
+    calls = []
+    def work(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x * 2
+    async def main():
+        return await asyncio.gather(
+            executor.run(("a",), work, 1),
+            executor.run(("a",), work, 1),
+            executor.run(("b",), work, 2),
+        )
+    assert asyncio.run(main()) == [2, 2, 4]
+    assert sorted(calls) == [1, 2]
+    assert executor.coalesced == 1
+    # 終わった処理は共有しない
+    assert asyncio.run(executor.run(("a",), work, 1)) == 2
+    assert len(calls) == 3
+    executor.shutdown()
+
+def test_runs_off_the_event_loop():
+    executor = CoalescingExecutor(1)
+    async def main():
+        loop_thread = threading.get_ident()
+        return loop_thread, await executor.run("k", threading.get_ident)
+    loop_thread, worker_thread = asyncio.run(main())
+    assert loop_thread != worker_thread
+    executor.shutdown()
+
+def test_exceptions_reach_every_waiter():
+    executor = CoalescingExecutor(1)
+    def fail():
+        time.sleep(0.02)
+        raise ValueError("failed")
+    async def main():
+        return await asyncio.gather(
+            executor.run("k", fail), executor.run("k", fail), return_exceptions=True
+        )
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    executor.shutdown()
+
+def test_without_workers_runs_inline():
+    executor = CoalescingExecutor(0)
+    async def main():
+        return threading.get_ident(), await executor.run("k", threading.get_ident)
+    loop_thread, worker_thread = asyncio.run(main())
+    assert loop_thread == worker_thread
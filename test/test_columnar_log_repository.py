@@ -0,0 +1,65 @@
+import datetime
+import numpy as np
+
+from player import Player, PlayerRegistry
+from log_repository import JsonRowLogRepository
+from columnar_log_repository import ColumnarLogRepository, convert_json_logs
+
+T = datetime.datetime(2022,1,1,10,0)
+P1, P2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+
+def test_columnar_round_trip(tmp_path):
+    repo = ColumnarLogRepository(tmp_path)
+    repo.save_row(T, [P1, P2])
+    repo.save_row(T + datetime.timedelta(minutes=8), [])
+    repo.save_row(T + datetime.timedelta(minutes=16), [P2])
+    log = repo.get_log_by_date(T.date())
+    assert log.get_times() == [T + i*datetime.timedelta(minutes=8) for i in range(3)]
+    assert list(log.iter_logs()) == [[P1, P2], [], [P2]]
+    assert repo.get_dates() == [T.date()]
+
+def test_columnar_arrays_are_memory_mapped(tmp_path):
+    repo = ColumnarLogRepository(tmp_path)
+    repo.save_row(T, [P1, P2])
+    times, offsets, codes = repo.get_arrays(T.date())
+    assert all(isinstance(a, np.memmap) for a in (times, offsets, codes))
+    assert times.dtype == np.int64 and codes.dtype == np.int32 and offsets.dtype == np.int32
+    assert offsets.tolist() == [0, 2]
+
+def test_columnar_dictionary_is_shared_between_instances(tmp_path):
+    writer = ColumnarLogRepository(tmp_path)
+    writer.save_row(T, [P1])
+    registry = PlayerRegistry()
+    reader = ColumnarLogRepository(tmp_path, registry)
+    writer.save_row(T + datetime.timedelta(days=1), [Player("DJ1-NEW", "1111-1111"), P2])
+    reader.get_log_by_date(T.date())
+    log = reader.get_log_by_date(T.date() + datetime.timedelta(days=1))
+    assert log.registry is registry
+    assert registry.get_name_history(registry.get_code("1111-1111")) == ["DJ1", "DJ1-NEW"]
+    assert [p.id for p in next(log.iter_logs())] == ["1111-1111", "2222-2222"]
+
+def test_convert_json_logs(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path)
+    for i in range(3):
+        json_repo.save_row(T + i*datetime.timedelta(hours=7), [P1, P2][i % 2:])
+    target = tmp_path / "columnar"
+    target.mkdir()
+    columnar_repo = ColumnarLogRepository(target)
+    convert_json_logs(json_repo, columnar_repo)
+    for date in json_repo.get_dates():
+        expected = json_repo.get_log_by_date(date)
+        actual = columnar_repo.get_log_by_date(date)
+        assert actual.get_times() == expected.get_times()
+        assert list(actual.iter_logs()) == list(expected.iter_logs())
+
+def test_columnar_save_does_not_touch_other_process_tmp(tmp_path):
+    repo = ColumnarLogRepository(tmp_path)
+    repo.save_row(T, [P1])
+    # 別のプロセスが書き込み中の一時ファイル
+    path = repo.get_path(T.date(), "times")
+    other = path.with_name(f"{path.name}.1.tmp")
+    other.write_bytes(b"partial")
+    repo.save_row(T + datetime.timedelta(minutes=8), [P2])
+    assert other.read_bytes() == b"partial"
+    assert list(tmp_path.glob("*.tmp")) == [other]
+    assert list(repo.get_log_by_date(T.date()).iter_logs()) == [[P1], [P2]]
@@ -0,0 +1,132 @@
+import datetime
+import pytest
+
+from delta_log_repository import DeltaLogRepository, apply_delta, convert_json_logs, encode_delta
+from log_repository import JsonRowLogRepository
+from player import Player, PlayerRegistry
+
+T = datetime.datetime(2022,1,1,10,0)
+PS = [Player(f"DJ{i}", f"{i:04}-0000") for i in range(12)]
+
+@pytest.mark.parametrize("previous, current, moved", [
+    ([0, 1, 2], [0, 1, 2], []),
+    ([0, 1, 2], [2, 0, 1], [2]),
+    ([0, 1, 2], [3, 1, 0], [3, 1]),
+    ([0, 1, 2], [3, 0], [3]),
+    ([0, 1, 2], [0, 2], [0, 2]),
+    ([], [4, 5], [4, 5]),
+])
+def test_delta_round_trip(previous, current, moved):
+    assert encode_delta(previous, current) == moved
+    assert apply_delta(previous, moved, len(current)) == current
+
+def rows() -> list[tuple[datetime.datetime, list[Player]]]:
+    row = PS[:10]
+    ret = [(T, row)]
+    for i, changes in enumerate([[3], [], [10, 4], [11], [0, 1, 2, 5, 6, 7, 8, 9, 10, 11]]):
+        moved = [PS[c] for c in changes]
+        row = (moved + [p for p in row if p not in moved])[:10]
+        ret.append((T + datetime.timedelta(minutes=8*(i+1)), row))
+    # 人数が減ることもある
+    ret.append((T + datetime.timedelta(hours=1), row[:7]))
+    ret.append((T + datetime.timedelta(hours=2), []))
+    return ret
+
+def test_reconstructs_same_log(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path / "json", PlayerRegistry())
+    (tmp_path / "json").mkdir()
+    (tmp_path / "delta").mkdir()
+    repo = DeltaLogRepository(tmp_path / "delta", PlayerRegistry())
+    for logged_at, player_list in rows():
+        json_repo.save_row(logged_at, player_list)
+        repo.save_row(logged_at, player_list)
+    expected = json_repo.get_log_by_date(T.date())
+    log = repo.get_log_by_date(T.date())
+    assert log.get_times() == expected.get_times()
+    assert list(log.iter_logs()) == list(expected.iter_logs())
+    assert repo.get_dates() == [T.date()]
+    lines = repo.get_path(T.date()).read_text().splitlines()
+    # 名前は一度だけ書き、入れ替わりが一人なら一人分だけ書く
+    assert sum(line.count('"DJ3"') for line in lines) == 1
+    assert '"m":[3]' in lines[1]
+    assert len(repo.get_path(T.date()).read_bytes()) < len(json_repo.get_path(T.date()).read_bytes()) / 2
+
+def test_resumes_existing_file(tmp_path):
+    data = rows()
+    DeltaLogRepository(tmp_path).save_row(*data[0])
+    DeltaLogRepository(tmp_path).save_row(*data[1])
+    repo = DeltaLogRepository(tmp_path)
+    repo.save_row(*data[2])
+    with pytest.raises(ValueError):
+        repo.save_row(*data[1])
+    log = repo.get_log_by_date(T.date())
+    assert list(log.iter_logs()) == [player_list for _, player_list in data[:3]]
+    assert "p" not in repo.get_path(T.date()).read_text().splitlines()[1]
+
+def test_convert_json_logs(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path)
+    for logged_at, player_list in rows():
+        json_repo.save_row(logged_at, player_list)
+    json_repo.save_row(T + datetime.timedelta(days=1), PS[:3])
+    target = DeltaLogRepository(tmp_path / "delta")
+    (tmp_path / "delta").mkdir()
+    convert_json_logs(json_repo, target)
+    convert_json_logs(json_repo, target)
+    for date in json_repo.get_dates():
+        assert list(target.get_log_by_date(date).iter_logs()) == list(json_repo.get_log_by_date(date).iter_logs())
+
+def test_round_trip_with_rename(tmp_path):
+    renamed = Player("DJNEW", PS[0].id)
+    data = [
+        (T, PS[:3]),
+        # 一日の途中で名前を変えて、また元の名前に戻す
+        (T + datetime.timedelta(minutes=5), [renamed] + PS[1:3]),
+        (T + datetime.timedelta(minutes=10), [PS[3], renamed] + PS[1:3]),
+        (T + datetime.timedelta(minutes=15), PS[:4]),
+    ]
+    json_repo = JsonRowLogRepository(tmp_path / "json", PlayerRegistry())
+    (tmp_path / "json").mkdir()
+    (tmp_path / "delta").mkdir()
+    for i, (logged_at, player_list) in enumerate(data):
+        json_repo.save_row(logged_at, player_list)
+        # 途中から書き足しても名前の変更を書く
+        DeltaLogRepository(tmp_path / "delta").save_row(logged_at, player_list)
+    expected = json_repo.get_log_by_date(T.date())
+    log = DeltaLogRepository(tmp_path / "delta", PlayerRegistry()).get_log_by_date(T.date())
+    assert list(log.iter_logs()) == list(expected.iter_logs())
+    code = log.registry.get_code(PS[0].id)
+    assert log.registry.get_name_history(code) == ["DJ0", "DJNEW", "DJ0"]
+    assert log.registry.get_name_history(code) == expected.registry.get_name_history(expected.registry.get_code(PS[0].id))
+
+def test_convert_json_logs_keeps_renames(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path)
+    json_repo.save_row(T, [Player("OLD", "1")])
+    json_repo.save_row(T + datetime.timedelta(minutes=5), [Player("NEW", "1")])
+    target = DeltaLogRepository(tmp_path / "delta")
+    (tmp_path / "delta").mkdir()
+    convert_json_logs(json_repo, target)
+    lines = target.get_path(T.date()).read_text().splitlines()
+    assert '"OLD"' in lines[0] and '"NEW"' in lines[1]
+    log = DeltaLogRepository(tmp_path / "delta", PlayerRegistry()).get_log_by_date(T.date())
+    assert log.registry.get_name_history(log.registry.get_code("1")) == ["OLD", "NEW"]
+
+def test_read_rows_after_offset(tmp_path):
+    repo = DeltaLogRepository(tmp_path)
+    data = rows()
+    renamed = (data[2][0] + datetime.timedelta(minutes=1), [Player("DJNEW", PS[0].id)] + PS[1:3])
+    for logged_at, player_list in data[:2]:
+        repo.save_row(logged_at, player_list)
+    first = repo.read_rows(T.date(), 0)
+    assert first.offset == 0 and first.rows == data[:2]
+    repo.save_row(*renamed)
+    # 書き込み途中の行は読まない
+    with open(repo.get_path(T.date()), "a") as f:
+        f.write('{"t":')
+    second = repo.read_rows(T.date(), first.end)
+    assert second.offset == first.end
+    assert second.rows == [renamed]
+    assert [p.name for p in second.rows[0][1]] == ["DJNEW", "DJ1", "DJ2"]
+    assert repo.read_rows(T.date(), second.end).rows == []
+    assert list(repo.get_log_by_date(T.date(), first.end).iter_logs()) == [player_list for _, player_list in data[:2]]
+    # ファイルが短くなっていれば先頭から読み直す
+    assert repo.read_rows(T.date(), second.end + 100).offset == 0
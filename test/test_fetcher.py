@@ -1,7 +1,62 @@
-from fetcher import Fetcher
+from pathlib import Path
+import pytest
+
+from fetcher import Fetcher, ResultTableNotFoundError, parse_log, parse_result_table, parse_result_table_soup
+from player import Player
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES / f"rival_search_{name}.html").read_text()
+
+class Response:
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+
+class Session:
+    def __init__(self, response: Response):
+        self.response = response
+        self.timeouts = []
+    def get(self, url, timeout=None):
+        self.timeouts.append(timeout)
+        return self.response
 
 def test_can_set_cookies_by_string():
     c = Fetcher()
     c.load_cookies_string("key=value; test=test")
     assert c.session.cookies.get("key") == "value"
     assert c.session.cookies.get("test") == "test"
+
+def test_parse_normal_page():
+    html = read_fixture("normal")
+    players = parse_result_table(html)
+    assert players == parse_result_table_soup(html)
+    assert len(players) == 10
+    assert players[0] == Player("KAMI", "1000-5000")
+    # 文字参照はデコードする
+    assert players[2] == Player("L&R", "1002-5014")
+
+@pytest.mark.parametrize("name", ["maintenance", "logged_out"])
+def test_no_table(name):
+    assert parse_log(read_fixture(name)) is None
+
+def test_fallback_to_full_parse():
+    html = read_fixture("normal").replace(
+        '<table id="result" class="table-style">',
+        '<div id="result"><table class="table-style">'
+    ).replace("</table>\n  </div>", "</table></div>\n  </div>")
+    # 表にidがないので切り出せないが、ページ全体を読めば取り出せる
+    assert parse_result_table(html) is None
+    assert parse_log(html) == parse_result_table_soup(read_fixture("normal"))
+
+def test_get_log_raises_without_table():
+    c = Fetcher()
+    c.session = Session(Response(503, read_fixture("maintenance")))
+    with pytest.raises(ResultTableNotFoundError) as e:
+        c.get_log()
+    assert e.value.status_code == 503
+    c.session = Session(Response(200, read_fixture("normal")))
+    assert len(c.get_log()) == 10
+    # 応答がなくても待ち続けない
+    assert c.session.timeouts == [c.settings.request_timeout]
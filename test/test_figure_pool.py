@@ -0,0 +1,32 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+from figure_pool import FigurePool
+
+T = datetime.datetime(2022,1,1,10)
+
+def series(n: int, scale: float) -> tuple[list[datetime.datetime], list[float]]:
+    return [T + datetime.timedelta(minutes=5*i) for i in range(n)], [scale * (i % 7) for i in range(n)]
+
+def test_render_formats():
+    pool = FigurePool(1)
+    assert pool.render(*series(10, 1)).startswith(b"\x89PNG")
+    assert b"<svg" in pool.render(*series(10, 1), format="svg")
+    with pytest.raises(ValueError):
+        pool.render(*series(10, 1), format="gif")
+
+def test_reused_figure_matches_fresh_one():
+    xs, ys = series(50, 2)
+    fresh = FigurePool(1).render(xs, ys)
+    pool = FigurePool(1)
+    pool.render(*series(200, 10))
+    assert pool.render(xs, ys) == fresh
+
+def test_render_from_threads():
+    inputs = [series(20 + i, i + 1) for i in range(8)]
+    expected = [FigurePool(1).render(xs, ys) for xs, ys in inputs]
+    pool = FigurePool(4)
+    with ThreadPoolExecutor(4) as executor:
+        actual = list(executor.map(lambda a: pool.render(*a), inputs * 3))
+    assert actual == expected * 3
@@ -1,6 +1,7 @@
 import pytest
 import datetime
-from interpolator import OnedayAverage, OnedayMax, OnedayMedian, OnedaySum
+import numpy as np
+from interpolator import SLOTS, OnedayAverage, OnedayMax, OnedayMedian, OnedayStatistics, OnedaySum, resample_oneday
 
 @pytest.fixture
 def times():
@@ -56,3 +57,57 @@ def test_oneday_sum_exception():
     data = [0]*len(times)
     with pytest.raises(ValueError):
         acc.append(times, data)
+
+def test_oneday_extend_matches_append(times):
+    by_append = OnedayMedian()
+    rows = []
+    for v in (1, 5, 2, 8):
+        data = [v]*len(times)
+        by_append.append(times, data)
+        rows.append(resample_oneday(times, data))
+    by_extend = OnedayMedian()
+    by_extend.extend(np.array(rows))
+    assert by_extend.result() == by_append.result()
+    # 偶数個のときは大きい方
+    assert (by_extend.result_array() == 5.0).all()
+
+def test_oneday_extend_rejects_wrong_shape():
+    with pytest.raises(ValueError):
+        OnedaySum().extend(np.zeros((2, 10)))
+
+def test_resample_oneday_is_nearest_and_zero_outside():
+    _date = datetime.datetime(2022,1,1)
+    xs = [_date + datetime.timedelta(hours=10), _date + datetime.timedelta(hours=10, minutes=10)]
+    ys = resample_oneday(xs, [1, 2])
+    assert len(ys) == len(SLOTS) == 288
+    # 10:00, 10:05（ちょうど中間は前のデータ）, 10:10
+    assert ys[120:123].tolist() == [1.0, 1.0, 2.0]
+    assert ys[119] == 0 and ys[123] == 0
+
+def test_oneday_empty_results():
+    assert OnedaySum().result() == {}
+    assert OnedayMax().result() == {}
+    with pytest.raises(AssertionError):
+        OnedayAverage().result()
+
+def test_oneday_statistics_matches_single_accumulators(times):
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 10, size=(7, len(SLOTS))).astype(float)
+    stats = OnedayStatistics(["mean", "median", "max", "min"], [10, 50, 97.5])
+    stats.extend(rows)
+    result = stats.result()
+    assert stats.get_count() == 7
+    assert list(result) == ["mean", "median", "max", "min", "p10", "p50", "p97.5"]
+    for name, acc in (("mean", OnedayAverage()), ("median", OnedayMedian()), ("max", OnedayMax())):
+        acc.extend(rows)
+        assert result[name] == acc.result()
+    assert list(result["min"].values()) == rows.min(axis=0).tolist()
+    for name, q in (("p10", 10), ("p50", 50), ("p97.5", 97.5)):
+        assert np.allclose(list(result[name].values()), np.percentile(rows, q, axis=0))
+
+def test_oneday_statistics_empty_and_invalid():
+    assert OnedayStatistics(["mean"], [90]).result() == {"mean": {}, "p90": {}}
+    with pytest.raises(ValueError):
+        OnedayStatistics(["average"])
+    with pytest.raises(ValueError):
+        OnedayStatistics(["mean"], [101])
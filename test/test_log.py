@@ -1,7 +1,7 @@
 import pytest
 import datetime
 
-from player import Player
+from player import Player, PlayerRegistry
 from log import Log
 
 def test_log_accepts_only_data_in_one_day():
@@ -21,3 +21,49 @@ def test_log_accepts_only_data_in_one_day():
         datetime.datetime(2022,1,1,10,0,0): [],
         datetime.datetime(2022,1,1,23,59,59): []
     })
+
+def test_log_shares_codes_through_registry():
+    r = PlayerRegistry()
+    p1, p2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+    log1 = Log({datetime.datetime(2022,1,1,10,0): [p1, p2]}, r)
+    log2 = Log({datetime.datetime(2022,1,2,10,0): [Player("DJ2-NEW", "2222-2222")]}, r)
+    assert log1.get_player_codes() == {0, 1}
+    assert log2.get_player_codes() == {1}
+    assert list(log2.iter_codes()) == [[1]]
+    # 名前は取り出すときに最新のものになる
+    assert [p.name for p in next(log1.iter_logs())] == ["DJ1", "DJ2-NEW"]
+    assert log1.get_player_positions(p2) == [1]
+    with pytest.raises(KeyError):
+        log2.get_player_positions(p1)
+    with pytest.raises(KeyError):
+        log2.get_player_positions(Player("DJ3", "3333-3333"))
+
+def test_log_append_extends_positions():
+    p1, p2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+    log = Log({datetime.datetime(2022,1,1,10,0): [p1]})
+    log.append(datetime.datetime(2022,1,1,10,8), [p2, p1])
+    assert log.size == 2
+    assert log.get_player_positions(p1) == [0, 1]
+    assert log.get_player_positions(p2) == [None, 0]
+    with pytest.raises(ValueError):
+        log.append(datetime.datetime(2022,1,1,10,8), [])
+    with pytest.raises(ValueError):
+        log.append(datetime.datetime(2022,1,2,10,0), [])
+
+def test_log_copy_is_independent():
+    p1, p2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+    log = Log({datetime.datetime(2022,1,1,10,0): [p1]})
+    copied = log.copy()
+    copied.append(datetime.datetime(2022,1,1,10,8), [p2, p1])
+    assert log.size == 1
+    assert log.get_player_codes() == {log.registry.get_code(p1.id)}
+    assert log.get_player_positions(p1) == [0]
+    assert copied.get_player_positions(p1) == [0, 1]
+    assert copied.registry is log.registry
+
+def test_log_loaded_out_of_order_keeps_name_order():
+    registry = PlayerRegistry()
+    day1, day2 = datetime.datetime(2022,1,1,10), datetime.datetime(2022,1,2,10)
+    Log({day2: [Player("NEW", "1")]}, registry)
+    Log({day1: [Player("OLD", "1")]}, registry)
+    assert registry.get_name_history(registry.get_code("1")) == ["NEW"]
@@ -0,0 +1,66 @@
+import random
+import pytest
+import datetime
+
+from player import Player
+from log import Log
+from log_analysis import LogAnalyzer
+
+def random_log(seed: int, n_players=30, n_samples=60, take=10) -> Log:
+    rng = random.Random(seed)
+    players = [Player(f"DJ{i}", f"{i:04}-0000") for i in range(n_players)]
+    row = rng.sample(players, take)
+    data = {}
+    t = datetime.datetime(2022,1,1,10,0)
+    for _ in range(n_samples):
+        # 誰かがプレイして先頭に来る、新しいプレイヤーが来る
+        for _ in range(rng.randint(0, 3)):
+            p = rng.choice(players)
+            if p in row:
+                row.remove(p)
+            row.insert(0, p)
+        row = row[:rng.randint(0, take)]
+        data[t] = row[:]
+        t += datetime.timedelta(minutes=rng.randint(1, 15))
+    return Log(data)
+
+@pytest.mark.parametrize("seed", range(20))
+def test_status_changed_all_matches_per_player(seed):
+    log = random_log(seed)
+    a = LogAnalyzer()
+    batch = a.get_status_changed_all(log)
+    assert batch.keys() == log.get_player_codes()
+    for c in log.get_player_codes():
+        assert batch[c] == a.get_status_changed(log, c)
+
+def test_status_changed_all_small_logs():
+    a = LogAnalyzer()
+    assert a.get_status_changed_all(Log({})) == {}
+    p = Player("DJ", "0000-0000")
+    log = Log({
+        datetime.datetime(2022,1,1,10,0): [p],
+        datetime.datetime(2022,1,1,10,5): []
+    })
+    assert a.get_status_changed_all(log) == {0: [False, False]}
+
+@pytest.mark.parametrize("seed", range(5))
+def test_players_in_venue_matches_per_player(seed):
+    log = random_log(seed)
+    a = LogAnalyzer()
+    batch = a.get_players_in_venue(log)
+    for c in log.get_player_codes():
+        assert batch[c] == a.get_player_in_venue(log, c)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_analyze_matches_per_player(seed):
+    log = random_log(seed)
+    a = LogAnalyzer()
+    analysis = a.analyze(log)
+    assert analysis.headcounts == a.get_headcounts(log)
+    assert analysis.get_players_over_time() == a.get_players_over_time(log)
+    for c in log.get_player_codes():
+        assert analysis.get_presence(c) == a.get_player_in_venue(log, c)
+        assert analysis.has_played(c) == any(a.get_status_changed(log, c))
+    with pytest.raises(KeyError):
+        analysis.get_presence(-1)
+    assert not analysis.has_played(-1)
@@ -0,0 +1,25 @@
+import datetime
+
+from log_analysis import LogAnalyzer
+from log_archive import archive_closed_days
+from log_repository import JsonRowLogRepository
+from player import Player
+from rollup import RollupRepository, build_rollup
+
+T = datetime.datetime(2022,1,1,10,0)
+P = Player("DJ", "1111-1111")
+
+def test_archive_closed_days(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    rollups = RollupRepository(tmp_path / "rollup")
+    for day in range(3):
+        repo.save_row(T + datetime.timedelta(days=day), [P])
+    rollups.save(build_rollup(repo, T.date(), LogAnalyzer()))
+    now = T + datetime.timedelta(days=2)
+    archived = archive_closed_days(repo, datetime.time(23), ".xz", rollups, now)
+    # 記録中の日は圧縮しない
+    assert archived == [T.date(), T.date() + datetime.timedelta(days=1)]
+    assert repo.get_path(now.date()).exists()
+    # 集計は圧縮後のファイルのバージョンで有効なまま
+    assert rollups.load(T.date()).is_valid(repo.get_version(T.date()), LogAnalyzer())
+    assert archive_closed_days(repo, datetime.time(23), ".gz", rollups, now) == []
@@ -0,0 +1,139 @@
+import datetime
+import pytest
+
+from player import Player
+from log_repository import JsonRowLogRepository
+from log_ingester import IngestedRows, LogIngester
+
+T = datetime.datetime(2022,1,1,10,0)
+P = Player("DJ", "1111-1111")
+
+def test_ingester_reads_only_appended_rows(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    ingester = LogIngester(repo)
+    repo.save_row(T, [P])
+    assert ingester.poll() == {T.date(): IngestedRows(0, [(T, [P])])}
+    assert ingester.poll() == {}
+    t2 = T + datetime.timedelta(minutes=8)
+    repo.save_row(t2, [])
+    assert ingester.poll() == {T.date(): IngestedRows(1, [(t2, [])])}
+
+def test_ingester_picks_up_new_day_files(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    ingester = LogIngester(repo)
+    repo.save_row(T, [P])
+    ingester.poll()
+    t2 = T + datetime.timedelta(days=1)
+    repo.save_row(t2, [P])
+    assert ingester.poll() == {t2.date(): IngestedRows(0, [(t2, [P])])}
+
+def test_ingester_waits_for_incomplete_line(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    ingester = LogIngester(repo)
+    repo.save_row(T, [P])
+    line = repo.get_path(T.date()).read_text()
+    t2 = T + datetime.timedelta(minutes=8)
+    repo.save_row(t2, [P])
+    path = repo.get_path(T.date())
+    # 二行目が書き込み途中
+    path.write_text(path.read_text()[:len(line) + 10])
+    assert ingester.poll() == {T.date(): IngestedRows(0, [(T, [P])])}
+    path.write_text(line)
+    repo.save_row(t2, [P])
+    assert ingester.poll() == {T.date(): IngestedRows(1, [(t2, [P])])}
+
+def test_ingester_rereads_shrunk_file(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    ingester = LogIngester(repo)
+    repo.save_row(T, [P])
+    repo.save_row(T + datetime.timedelta(minutes=8), [P])
+    ingester.poll()
+    repo.get_path(T.date()).write_text("")
+    repo.save_row(T, [])
+    assert ingester.poll() == {T.date(): IngestedRows(0, [(T, [])])}
+
+def test_ingester_seek_skips_read_rows(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(T, [P])
+    offset = repo.get_path(T.date()).stat().st_size
+    t2 = T + datetime.timedelta(minutes=8)
+    repo.save_row(t2, [])
+    ingester = LogIngester(repo)
+    ingester.seek(T.date(), offset, 1)
+    assert ingester.poll() == {T.date(): IngestedRows(1, [(t2, [])])}
+
+def test_ingester_iter_poll_reads_one_day_at_a_time(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    t2 = T + datetime.timedelta(days=1)
+    repo.save_row(T, [P])
+    repo.save_row(t2, [P])
+    ingester = LogIngester(repo)
+    polled = ingester.iter_poll()
+    assert next(polled) == (T.date(), IngestedRows(0, [(T, [P])]))
+    # 次の日はまだ読んでいない
+    assert list(ingester.offsets) == [T.date()]
+    assert next(polled) == (t2.date(), IngestedRows(0, [(t2, [P])]))
+    assert list(polled) == []
+
+def test_ingester_skips_archived_day_already_read(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(T, [P])
+    t2 = T + datetime.timedelta(days=1)
+    repo.save_row(t2, [P])
+    ingester = LogIngester(repo)
+    ingester.poll()
+    repo.archive(T.date())
+    assert ingester.poll() == {}
+    assert ingester.versions[T.date()] == repo.get_version(T.date())
+    # 読んでいない圧縮した日は展開して読む
+    repo.archive(t2.date())
+    assert LogIngester(repo).poll() == {
+        T.date(): IngestedRows(0, [(T, [P])]),
+        t2.date(): IngestedRows(0, [(t2, [P])]),
+    }
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz"])
+def test_ingester_reads_rows_appended_before_archiving(tmp_path, suffix):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(T, [P])
+    ingester = LogIngester(repo)
+    ingester.poll()
+    # 前回の読み込みから圧縮までの間に追記された行
+    t2 = T + datetime.timedelta(minutes=8)
+    repo.save_row(t2, [])
+    repo.archive(T.date(), suffix)
+    assert ingester.poll() == {T.date(): IngestedRows(1, [(t2, [])])}
+    assert ingester.versions[T.date()] == repo.get_version(T.date())
+    assert ingester.poll() == {}
+
+def test_ingester_rereads_shorter_archive(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(T, [P])
+    repo.save_row(T + datetime.timedelta(minutes=8), [P])
+    ingester = LogIngester(repo)
+    ingester.poll()
+    # 書き換えられて短くなったログが圧縮された
+    repo.get_path(T.date()).unlink()
+    repo.save_row(T, [])
+    repo.archive(T.date())
+    assert ingester.poll() == {T.date(): IngestedRows(0, [(T, [])])}
+
+def test_ingester_seek_with_version_skips_unchanged_day(tmp_path, monkeypatch):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(T, [P])
+    offset = repo.get_path(T.date()).stat().st_size
+    repo.archive(T.date())
+    version = repo.get_version(T.date())
+    reads = []
+    read_rows = repo.read_rows
+    monkeypatch.setattr(repo, "read_rows", lambda date, offset: reads.append(date) or read_rows(date, offset))
+    ingester = LogIngester(repo)
+    ingester.seek(T.date(), offset, 1, version)
+    # 圧縮した日はバージョンが同じなら展開しない
+    assert ingester.poll() == {}
+    assert reads == []
+    assert ingester.versions == {T.date(): version}
+    # ログがなくなった日は忘れる
+    repo.find_path(T.date()).unlink()
+    assert ingester.poll() == {}
+    assert ingester.versions == {}
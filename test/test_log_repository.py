@@ -0,0 +1,64 @@
+import datetime
+import pytest
+
+from player import Player, PlayerRegistry
+from log_repository import JsonRowLogRepository
+
+def test_json_rows_round_trip(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    t = datetime.datetime(2022,1,1,10,0)
+    p1, p2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+    repo.save_row(t, [p1, p2])
+    repo.save_row(t + datetime.timedelta(minutes=8), [p2, p1])
+    log = repo.get_log_by_date(t.date())
+    assert log.get_times() == [t, t + datetime.timedelta(minutes=8)]
+    assert list(log.iter_logs()) == [[p1, p2], [p2, p1]]
+
+def test_json_rows_read_until_end(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    t = datetime.datetime(2022,1,1,10,0)
+    p = Player("DJ", "1111-1111")
+    repo.save_row(t, [p])
+    end = repo.get_path(t.date()).stat().st_size
+    repo.save_row(t + datetime.timedelta(minutes=8), [])
+    # 書き込み途中の行
+    with open(repo.get_path(t.date()), "a") as f:
+        f.write('{"logged_time"')
+    assert repo.get_log_by_date(t.date(), end).get_times() == [t]
+    repo.archive(t.date())
+    assert repo.get_log_by_date(t.date(), end).get_times() == [t]
+
+def test_json_rows_share_registry(tmp_path):
+    registry = PlayerRegistry()
+    repo = JsonRowLogRepository(tmp_path, registry)
+    p = Player("DJ", "1111-1111")
+    repo.save_row(datetime.datetime(2022,1,1,10,0), [p])
+    repo.save_row(datetime.datetime(2022,1,2,10,0), [p])
+    log1 = repo.get_log_by_date(datetime.date(2022,1,1))
+    log2 = repo.get_log_by_date(datetime.date(2022,1,2))
+    assert log1.get_player_codes() == log2.get_player_codes() == {0}
+
+def test_json_rows_lists_dates(tmp_path):
+    repo = JsonRowLogRepository(tmp_path)
+    repo.save_row(datetime.datetime(2022,1,2,10,0), [])
+    repo.save_row(datetime.datetime(2022,1,1,10,0), [])
+    (tmp_path / "other.txt").write_text("")
+    assert repo.get_dates() == [datetime.date(2022,1,1), datetime.date(2022,1,2)]
+
+@pytest.mark.parametrize("suffix", [".gz", ".xz"])
+def test_archived_day_reads_same_log(tmp_path, suffix):
+    repo = JsonRowLogRepository(tmp_path)
+    t = datetime.datetime(2022,1,1,10,0)
+    p1, p2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+    repo.save_row(t, [p1, p2])
+    repo.save_row(t + datetime.timedelta(minutes=8), [p2, p1])
+    repo.save_row(t + datetime.timedelta(days=1), [p1])
+    version = repo.get_version(t.date())
+    repo.archive(t.date(), suffix)
+    assert repo.get_version(t.date()) != version
+    assert not repo.get_path(t.date()).exists()
+    assert repo.find_path(t.date()).name == f"log_2022-01-01.txt{suffix}"
+    assert repo.get_dates() == [t.date(), t.date() + datetime.timedelta(days=1)]
+    log = repo.get_log_by_date(t.date())
+    assert list(log.iter_logs()) == [[p1, p2], [p2, p1]]
+    assert not list(tmp_path.glob("*.tmp"))
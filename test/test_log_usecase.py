@@ -0,0 +1,367 @@
+import asyncio
+import datetime
+import io
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+import httpx
+import numpy as np
+import pytest
+
+from interpolator import OnedayAverage, OnedaySum
+from log_analysis import DayAnalysis, LogAnalyzer
+from log import ILogRepository
+from log_repository import JsonRowLogRepository, create_repository
+from log_usecase import LogUsecase, LogUsecaseSettings, analyze_log_file
+from player import Player
+
+ROOT = Path(__file__).resolve().parent.parent
+D1 = datetime.date(2022,1,1)
+D2 = datetime.date(2022,1,2)
+D3 = datetime.date(2022,1,8)
+D4 = datetime.date(2022,1,9)
+A, B, C, D = Player("DJA", "A"), Player("DJB", "B"), Player("DJC", "C"), Player("DJD", "D")
+ROWS = [[A, B], [B, A], [C, B, A], [A, C, B], [A, C, B], [B, A, C], [B, A, C]]
+
+def write_log(repository: ILogRepository, date: datetime.date, rows: list[list[Player]] = ROWS):
+    t = datetime.datetime.combine(date, datetime.time(10))
+    for i, row in enumerate(rows):
+        repository.save_row(t + datetime.timedelta(minutes=8*i), row)
+
+def write_logs(log_directory: Path, repository: ILogRepository | None = None) -> ILogRepository:
+    log_directory.mkdir(exist_ok=True)
+    repository = repository if repository is not None else JsonRowLogRepository(log_directory)
+    write_log(repository, D1)
+    write_log(repository, D2, [list(reversed(row)) for row in ROWS])
+    write_log(repository, D3, ROWS[:4])
+    return repository
+
+def make_usecase(log_directory: Path, **kwargs) -> LogUsecase:
+    settings = LogUsecaseSettings(log_directory=log_directory, refresh_interval=0, **kwargs)
+    return LogUsecase(settings=settings)
+
+def get_results(usecase: LogUsecase) -> dict:
+    return {
+        "dates": usecase.get_dates(),
+        "headcounts": {date: usecase.get_headcounts_of_date(date) for date in usecase.get_dates()},
+        "average": usecase.get_headcounts_average(),
+        "median": usecase.get_headcounts_median(),
+        "weekday": usecase.get_headcounts_average_weekday(D1.weekday()),
+        "players": usecase.get_all_playerlist(),
+        "playdate": {p.id: usecase.get_all_playdate(p.id) for p in (A, B, C)},
+        "playtime": {p.id: usecase.get_playtime(p.id) for p in (A, B, C)},
+    }
+
+def test_analysis_cache_invalidated_on_refresh(tmp_path):
+    repository = write_logs(tmp_path)
+    usecase = make_usecase(tmp_path)
+    first = usecase.get_headcounts_of_date(D3)
+    assert usecase.get_headcounts_of_date(D3) == first
+    assert usecase.get_cache_stats()["hits"] == 1
+    assert usecase.get_cache_stats()["misses"] == 1
+    # 追記されたらバージョンが変わって解析し直す
+    repository.save_row(max(first) + datetime.timedelta(minutes=8), ROWS[4])
+    assert usecase.get_data_version([D3]) == usecase.get_data_version([D3])
+    version = usecase.get_data_version([D3])
+    assert usecase.refresh() == [D3]
+    assert usecase.get_data_version([D3]) != version
+    second = usecase.get_headcounts_of_date(D3)
+    assert len(second) == len(first) + 1
+    assert usecase.get_cache_stats()["misses"] == 2
+    assert second == make_usecase(tmp_path).get_headcounts_of_date(D3)
+
+def test_lazy_and_eager_give_same_results(tmp_path):
+    write_logs(tmp_path / "eager")
+    shutil.copytree(tmp_path / "eager", tmp_path / "lazy")
+    expected = get_results(make_usecase(tmp_path / "eager"))
+    # 索引がない最初の起動と、索引を使う次の起動
+    lazy = make_usecase(tmp_path / "lazy", lazy_load=True, max_loaded_logs=1)
+    assert get_results(lazy) == expected
+    assert (tmp_path / "lazy" / "player_index.json").exists()
+    assert get_results(make_usecase(tmp_path / "lazy", lazy_load=True, max_loaded_logs=1)) == expected
+
+def test_lazy_start_skips_days_unchanged_since_indexed(tmp_path, monkeypatch):
+    repository = write_logs(tmp_path)
+    expected = get_results(make_usecase(tmp_path, lazy_load=True))
+    reads = []
+    read_rows = JsonRowLogRepository.read_rows
+    monkeypatch.setattr(
+        JsonRowLogRepository, "read_rows",
+        lambda self, date, offset: reads.append(date) or read_rows(self, date, offset)
+    )
+    assert get_results(make_usecase(tmp_path, lazy_load=True)) == expected
+    assert reads == []
+    # 圧縮してバージョンが変わった日は一度だけ読み直し、次の起動からは開かない
+    for date in repository.get_dates():
+        repository.archive(date)
+    assert get_results(make_usecase(tmp_path, lazy_load=True)) == expected
+    assert reads == [D1, D2, D3]
+    assert get_results(make_usecase(tmp_path, lazy_load=True)) == expected
+    assert reads == [D1, D2, D3]
+
+def test_parallel_and_serial_analysis_give_same_results(tmp_path):
+    write_logs(tmp_path / "serial")
+    shutil.copytree(tmp_path / "serial", tmp_path / "parallel")
+    expected = get_results(make_usecase(tmp_path / "serial"))
+    parallel = make_usecase(tmp_path / "parallel", analysis_workers=2)
+    try:
+        assert get_results(parallel) == expected
+    finally:
+        parallel.close()
+
+def test_analyze_log_file_in_process_pool(tmp_path):
+    repository = write_logs(tmp_path)
+    dates = repository.get_dates()
+    a = LogAnalyzer()
+    args = (repeat(JsonRowLogRepository(tmp_path)), dates, repeat(None), repeat(a.MAX_STABLE_TIME), repeat(a.MAX_TIME_BETWEEN_REENTRY))
+    with ProcessPoolExecutor(2) as executor:
+        results = list(executor.map(analyze_log_file, *args))
+    for date, (times, players, presence, played) in zip(dates, results):
+        log = repository.get_log_by_date(date)
+        expected = a.analyze(log)
+        codes = [log.registry.get_code(p.id) for p in players]
+        actual = DayAnalysis.create(times, codes, presence, played)
+        assert actual.headcounts == expected.headcounts
+        assert actual.codes.tolist() == expected.codes.tolist()
+        assert (actual.presence == expected.presence).all()
+        assert (actual.played == expected.played).all()
+
+def test_parallel_analysis_ignores_rows_after_refresh(tmp_path):
+    write_logs(tmp_path / "serial")
+    shutil.copytree(tmp_path / "serial", tmp_path / "parallel")
+    serial = make_usecase(tmp_path / "serial")
+    parallel = make_usecase(tmp_path / "parallel", analysis_workers=2)
+    lazy = make_usecase(tmp_path / "parallel", lazy_load=True)
+    # refresh後に追記された行と書き込み途中の行は、次のrefreshまで解析に含めない
+    for directory in ("serial", "parallel"):
+        repository = JsonRowLogRepository(tmp_path / directory)
+        for date in repository.get_dates():
+            repository.save_row(datetime.datetime.combine(date, datetime.time(20)), [C, B, A])
+            with open(repository.get_path(date), "a") as f:
+                f.write('{"logged_time"')
+    try:
+        # 締めた日の集計はまとめてプロセスプールで解析する
+        assert parallel.get_headcounts_average() == serial.get_headcounts_average()
+        expected = [serial.get_headcounts_of_date(date) for date in serial.get_dates()]
+        assert [parallel.get_headcounts_of_date(date) for date in parallel.get_dates()] == expected
+        assert parallel.get_cache_stats()["hits"] == 3
+        assert [lazy.get_headcounts_of_date(date) for date in lazy.get_dates()] == expected
+    finally:
+        parallel.close()
+
+def test_rollups_match_full_analysis(tmp_path):
+    repository = write_logs(tmp_path)
+    analyzer = LogAnalyzer()
+    average = OnedayAverage()
+    playtime = OnedaySum()
+    for date in repository.get_dates():
+        log = repository.get_log_by_date(date)
+        analysis = analyzer.analyze(log)
+        average.append(analysis.times, analysis.headcounts)
+        playtime.append(analysis.times, list(map(float, analysis.get_presence(log.registry.get_code("C")))))
+    usecase = make_usecase(tmp_path)
+    assert usecase.get_headcounts_average() == pytest.approx(average.result())
+    assert usecase.get_playtime("C") == pytest.approx(playtime.result())
+    # 締めた日は集計を保存して、次の起動では解析せずに使う
+    assert usecase.rollup_repository.get_dates() == repository.get_dates()
+    restarted = make_usecase(tmp_path)
+    assert restarted.get_headcounts_average() == pytest.approx(average.result())
+    assert restarted.get_cache_stats()["misses"] == 0
+
+def test_get_players_at(tmp_path):
+    write_logs(tmp_path)
+    usecase = make_usecase(tmp_path)
+    over_time = list(usecase.get_players_over_time(D1).values())
+    assert any(over_time)
+    for i, players in enumerate(over_time):
+        assert set(usecase.get_players_at(D1, i)) == players
+    with pytest.raises(ValueError):
+        usecase.get_players_at(D1, -1)
+    with pytest.raises(ValueError):
+        usecase.get_players_at(D1, len(over_time))
+    with pytest.raises(KeyError):
+        usecase.get_players_at(datetime.date(2000,1,1), 0)
+
+@pytest.mark.parametrize("log_format", ["delta", "sqlite"])
+def test_delta_and_sqlite_logs_give_same_results(tmp_path, log_format):
+    json_repository = write_logs(tmp_path / "json")
+    expected = get_results(make_usecase(tmp_path / "json"))
+    directory = tmp_path / log_format
+    if log_format == "delta":
+        kwargs = {"log_format": "delta"}
+    else:
+        kwargs = {"log_database": directory / "log.sqlite3"}
+    directory.mkdir()
+    repository = write_logs(directory, create_repository(directory, kwargs.get("log_database"), kwargs.get("log_format", "json")))
+    usecases = [
+        make_usecase(directory, **kwargs),
+        make_usecase(directory, lazy_load=True, max_loaded_logs=1, **kwargs),
+        make_usecase(directory, analysis_workers=2, **kwargs),
+    ]
+    try:
+        for usecase in usecases:
+            assert get_results(usecase) == expected
+        # 追記された行だけを読み込む
+        logged_at = datetime.datetime.combine(D3, datetime.time(20))
+        json_repository.save_row(logged_at, ROWS[4])
+        repository.save_row(logged_at, ROWS[4])
+        expected = make_usecase(tmp_path / "json").get_headcounts_of_date(D3)
+        for usecase in usecases:
+            assert usecase.refresh() == [D3]
+            assert usecase.get_headcounts_of_date(D3) == expected
+            assert usecase.refresh() == []
+    finally:
+        usecases[2].close()
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    # 設定は読み込み時にカレントディレクトリのconfig.jsonから読む
+    workdir = tmp_path_factory.mktemp("api")
+    (workdir / "log").mkdir()
+    config = json.loads((ROOT / "config.json").read_text())
+    config["log_directory"] = str(workdir / "log")
+    (workdir / "config.json").write_text(json.dumps(config))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import fastapi_main
+    finally:
+        os.chdir(cwd)
+    return fastapi_main
+
+@pytest.fixture
+def api_usecase(api, tmp_path):
+    write_logs(tmp_path)
+    usecase = make_usecase(tmp_path)
+    api.app.dependency_overrides[api.get_log_usecase] = lambda: usecase
+    api.render_cache.memory.clear()
+    yield usecase
+    api.app.dependency_overrides.clear()
+    usecase.close()
+
+def request(app, *paths: str, headers: dict[str, str] = {}) -> list[httpx.Response]:
+    """
+    pathsに同時にリクエストする
+    """
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.get(path, headers=headers) for path in paths))
+    return asyncio.run(main())
+
+def test_api_returns_304_for_matching_etag(api, api_usecase):
+    [r] = request(api.app, "/headcounts/average")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/png"
+    etag = r.headers["etag"]
+    [r] = request(api.app, "/headcounts/average", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    # ログが変わればETagも変わる
+    repository = JsonRowLogRepository(api_usecase.settings.log_directory)
+    write_log(repository, D3 + datetime.timedelta(days=1))
+    api_usecase.refresh()
+    [r] = request(api.app, "/headcounts/average", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+def test_api_data_in_json_and_npy(api, api_usecase):
+    headcounts = api_usecase.get_headcounts_of_date(D1)
+    [r] = request(api.app, f"/data/headcounts/{D1}", headers={"Accept": "application/json"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["start"] == min(headcounts).isoformat()
+    assert data["values"] == list(headcounts.values())
+    assert len(data["offsets"]) == len(headcounts)
+    [r] = request(api.app, f"/data/headcounts/{D1}", headers={"Accept": "application/x-npy"})
+    assert r.status_code == 200
+    array = np.load(io.BytesIO(r.content))
+    assert array["value"].tolist() == list(headcounts.values())
+    assert r.headers["x-series-start"] == data["start"]
+    [r] = request(api.app, "/data/headcounts/average", headers={"Accept": "application/x-npy"})
+    average = api_usecase.get_headcounts_average()
+    assert np.load(io.BytesIO(r.content)).tolist() == pytest.approx(list(average.values()))
+
+def test_api_stats_rejects_bad_parameters(api, api_usecase):
+    [r] = request(api.app, "/headcounts/stats?stat=mean&stat=max&percentile=90")
+    assert r.status_code == 200
+    assert set(r.json()["stats"]) == {"mean", "max", "p90"}
+    assert r.json()["count"] == 3
+    unknown, percentile = request(
+        api.app, "/headcounts/stats?stat=mode", "/headcounts/stats?percentile=150"
+    )
+    assert unknown.status_code == 400
+    assert percentile.status_code == 400
+
+def test_api_etag_check_does_not_wait_for_analysis(api, api_usecase):
+    [r] = request(api.app, f"/headcounts/{D1}")
+    etag = r.headers["etag"]
+    repository = JsonRowLogRepository(api_usecase.settings.log_directory)
+    write_log(repository, D4)
+    api_usecase.refresh()
+    started = threading.Event()
+    release = threading.Event()
+    finished = []
+    analyze = api_usecase.analyzer.analyze
+    def slow_analyze(log):
+        started.set()
+        release.wait(5)
+        finished.append(log)
+        return analyze(log)
+    api_usecase.analyzer.analyze = slow_analyze
+    async def main():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            blocked = asyncio.create_task(client.get(f"/headcounts/{D4}"))
+            await asyncio.to_thread(started.wait, 5)
+            # 別の日の解析中でもETagの確認は待たずに返る
+            r = await client.get(f"/headcounts/{D1}", headers={"If-None-Match": etag})
+            done_before_analysis = not finished
+            release.set()
+            return r, done_before_analysis, await blocked
+    r, done_before_analysis, blocked = asyncio.run(main())
+    assert r.status_code == 304
+    assert done_before_analysis
+    assert blocked.status_code == 200
+
+def test_api_concurrent_requests_during_refresh(api, api_usecase, tmp_path):
+    paths = [
+        "/player/A/date",
+        "/player/C/date",
+        "/player/B/names",
+        f"/headcounts/stats?stat=mean&stat=median&end={D3}",
+        f"/headcounts/stats?stat=max&weekday={D1.weekday()}&end={D3}",
+    ] + [f"/data/headcounts/{date}" for date in (D1, D2, D3)] + [f"/headcounts/{date}" for date in (D1, D2, D3)]
+    write_logs(tmp_path / "serial")
+    serial = make_usecase(tmp_path / "serial")
+    api.app.dependency_overrides[api.get_log_usecase] = lambda: serial
+    expected = [r.content for path in paths for r in request(api.app, path)]
+    api.app.dependency_overrides[api.get_log_usecase] = lambda: api_usecase
+    api.render_cache.memory.clear()
+    # 他の日のログを追記してrefreshし続けながら、全てのルートに同時にリクエストする
+    repository = JsonRowLogRepository(api_usecase.settings.log_directory)
+    stop = threading.Event()
+    def append_and_refresh():
+        t = datetime.datetime.combine(D4, datetime.time(10))
+        while not stop.is_set():
+            repository.save_row(t, [D])
+            api_usecase.refresh()
+            t += datetime.timedelta(seconds=1)
+    thread = threading.Thread(target=append_and_refresh)
+    thread.start()
+    try:
+        responses = request(api.app, *paths, *paths, *paths)
+    finally:
+        stop.set()
+        thread.join()
+    assert [r.status_code for r in responses] == [200] * len(responses)
+    assert [r.content for r in responses] == expected * 3
+
+def test_api_unknown_date_is_404(api, api_usecase):
+    data, chart = request(api.app, "/data/headcounts/2000-01-01", "/headcounts/2000-01-01")
+    assert data.status_code == 404
+    assert chart.status_code == 404
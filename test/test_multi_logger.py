@@ -0,0 +1,135 @@
+import asyncio
+import datetime
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import pytest
+
+from config import Settings
+from logger import ScheduleLogger
+from multi_logger import MultiSessionLogger, SessionSettings, create_adapter, create_fetcher
+from polling import AdaptiveScheduler
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+class RivalSearchServer(ThreadingHTTPServer):
+    """
+    cookieのsessionに応じて保存したライバル検索画面を返す
+    """
+    daemon_threads = True
+    def __init__(self, pages: dict[str, tuple[int, str]], delay: float = 0.02):
+        super().__init__(("127.0.0.1", 0), RivalSearchHandler)
+        self.pages = pages
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.connections: set[int] = set()
+        self.requests = 0
+    def get_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/rival_search.html"
+
+class RivalSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def do_GET(self):
+        server: RivalSearchServer = self.server
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            server.connections.add(self.client_address[1])
+            server.requests += 1
+        # 同時に処理しているリクエストが重なるように少し待つ
+        time.sleep(server.delay)
+        cookie = self.headers.get("Cookie", "")
+        status, name = server.pages.get(cookie.removeprefix("session="), (200, "logged_out"))
+        body = (FIXTURES / f"rival_search_{name}.html").read_bytes()
+        with server.lock:
+            server.active -= 1
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = RivalSearchServer({
+        "a": (200, "normal"),
+        "b": (200, "normal"),
+        "c": (503, "maintenance"),
+    })
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class Repository:
+    def __init__(self, fail: bool = False):
+        self.saved: list[datetime.datetime] = []
+        self.fail = fail
+    def save_row(self, logged_at, player_list):
+        if self.fail:
+            raise OSError("disk full")
+        self.saved.append(logged_at)
+
+def closed_port_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+def make_logger(settings: Settings, session: SessionSettings, adapter, repository: Repository) -> ScheduleLogger:
+    scheduler = AdaptiveScheduler(0.02, 0.05, backoff_base=0.02, max_backoff=0.05)
+    return ScheduleLogger(create_fetcher(settings, session, adapter), repository, scheduler)
+
+def test_sessions_run_concurrently_and_isolated(server):
+    settings = Settings(rival_search_url=server.get_url())
+    adapter = create_adapter(2)
+    repositories = {
+        "a": Repository(),
+        "b": Repository(),
+        # メンテナンス中のページ、保存に失敗する、つながらない
+        "c": Repository(),
+        "d": Repository(fail=True),
+        "e": Repository(),
+    }
+    sessions = {
+        "a": SessionSettings(name="a", cookies="session=a"),
+        "b": SessionSettings(name="b", cookies="session=b"),
+        "c": SessionSettings(name="c", cookies="session=c"),
+        "d": SessionSettings(name="d", cookies="session=a"),
+        "e": SessionSettings(name="e", cookies="session=a", rival_search_url=closed_port_url()),
+    }
+    loggers = {
+        name: make_logger(settings, session, adapter, repositories[name])
+        for name, session in sessions.items()
+    }
+    start = datetime.datetime.now()
+    end = start + datetime.timedelta(seconds=0.5)
+    asyncio.run(MultiSessionLogger(loggers, 2).run(start, end))
+    assert len(repositories["a"].saved) >= 3
+    assert len(repositories["b"].saved) >= 3
+    assert repositories["c"].saved == []
+    assert repositories["d"].saved == []
+    assert repositories["e"].saved == []
+    assert loggers["c"].scheduler.errors > 0
+    assert loggers["d"].scheduler.errors > 0
+    assert loggers["e"].scheduler.errors > 0
+    # 同時に取得するのは2セッションまでで、接続は全てのセッションで共有する
+    assert server.max_active <= 2
+    assert len(server.connections) <= 2
+    assert server.requests > len(server.connections)
+
+def test_waits_until_start(server):
+    settings = Settings(rival_search_url=server.get_url())
+    repository = Repository()
+    logger = make_logger(settings, SessionSettings(name="a", cookies="session=a"), create_adapter(1), repository)
+    start = datetime.datetime.now() + datetime.timedelta(seconds=0.2)
+    end = start + datetime.timedelta(seconds=0.1)
+    asyncio.run(MultiSessionLogger({"a": logger}, 1).run(start, end))
+    assert all(start <= t <= end + datetime.timedelta(seconds=0.1) for t in repository.saved)
+    assert len(repository.saved) >= 2
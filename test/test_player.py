@@ -1,6 +1,85 @@
-from player import Player
+import datetime
+import pytest
+import threading
+from player import Player, PlayerRegistry
 
 def test_player_equals():
     assert Player("DJ", "0000-0000") == Player("DJ", "0000-0000")
     assert Player("DJ2", "1111-1111") == Player("DJ1", "1111-1111")
     assert Player("DJ1", "1111-1111") in set([Player("DJ2", "1111-1111")])
+
+def test_player_hash_depends_on_id():
+    assert hash(Player("DJ1", "1111-1111")) == hash(Player("DJ2", "1111-1111"))
+    assert len(set(Player("DJ", f"{i:04}-0000") for i in range(100))) == 100
+
+def test_registry_interns_ids_to_dense_codes():
+    r = PlayerRegistry()
+    assert r.intern(Player("DJ1", "1111-1111")) == 0
+    assert r.intern(Player("DJ2", "2222-2222")) == 1
+    assert r.intern(Player("DJ1", "1111-1111")) == 0
+    assert len(r) == 2
+    assert r.get_code("2222-2222") == 1
+    assert r.get_id(1) == "2222-2222"
+    with pytest.raises(KeyError):
+        r.get_code("3333-3333")
+
+def test_registry_tracks_name_history():
+    r = PlayerRegistry()
+    r.intern(Player("OLD", "1111-1111"))
+    r.intern(Player("OLD", "1111-1111"))
+    c = r.intern(Player("NEW", "1111-1111"))
+    assert r.get_name_history(c) == ["OLD", "NEW"]
+    assert r.get_player(c) == Player("NEW", "1111-1111")
+    assert r.get_player(c).name == "NEW"
+
+def test_registry_dump_and_load_keep_codes():
+    r = PlayerRegistry()
+    r.intern(Player("DJ1", "1111-1111"))
+    r.intern(Player("DJ2", "2222-2222"))
+    r.intern(Player("DJ2-NEW", "2222-2222"))
+    loaded = PlayerRegistry.load(r.dump())
+    assert loaded.dump() == r.dump() == [("1111-1111", ["DJ1"]), ("2222-2222", ["DJ2", "DJ2-NEW"])]
+    assert loaded.get_code("2222-2222") == 1
+
+def test_registry_intern_history_skips_known_names():
+    r = PlayerRegistry()
+    r.intern(Player("A", "1111-1111"))
+    r.intern(Player("B", "1111-1111"))
+    revision = r.revision
+    assert r.intern_history("1111-1111", ["A", "B"]) == 0
+    assert r.revision == revision
+    r.intern_history("1111-1111", ["A", "B", "C"])
+    assert r.get_name_history(0) == ["A", "B", "C"]
+    assert r.intern_history("2222-2222", ["X", "Y"]) == 1
+    assert r.get_player(1) == Player("Y", "2222-2222")
+
+def test_registry_interns_from_threads_without_duplicate_codes():
+    registry = PlayerRegistry()
+    players = [Player(f"DJ{i}", str(i)) for i in range(2000)]
+    barrier = threading.Barrier(4)
+    def intern_all():
+        barrier.wait()
+        for p in players:
+            registry.intern(p)
+    threads = [threading.Thread(target=intern_all) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(registry) == len(players)
+    assert sorted(registry.get_code(p.id) for p in players) == list(range(len(players)))
+
+def test_registry_keeps_latest_name_when_older_day_is_loaded_later():
+    r = PlayerRegistry()
+    day1, day2 = datetime.datetime(2022,1,1,10), datetime.datetime(2022,1,2,10)
+    c = r.intern(Player("NEW", "1111-1111"), day2)
+    # 後から読み込んだ前の日の名前は履歴に足さない
+    assert r.intern(Player("OLD", "1111-1111"), day1) == c
+    assert r.get_name_history(c) == ["NEW"]
+    assert r.get_player(c).name == "NEW"
+    r.intern(Player("NEWER", "1111-1111"), day2 + datetime.timedelta(days=1))
+    assert r.get_name_history(c) == ["NEW", "NEWER"]
+    # 時刻なしで登録した名前は今までどおり足す
+    r.intern(Player("A", "2222-2222"))
+    r.intern(Player("B", "2222-2222"), day1)
+    assert r.get_name_history(1) == ["A", "B"]
@@ -0,0 +1,70 @@
+import datetime
+
+from player import Player
+from player_index import PlayerDateIndex
+
+D1 = datetime.date(2022,1,1)
+D2 = datetime.date(2022,1,2)
+A, B = Player("DJA", "A"), Player("DJB", "B")
+
+def test_index_tracks_dates_and_sample_ranges():
+    index = PlayerDateIndex()
+    index.add_rows(D2, 0, [[A, B], [B]])
+    index.add_rows(D1, 0, [[A]])
+    index.add_rows(D2, 2, [[], [A]])
+    assert index.get_dates("A") == [D1, D2]
+    assert index.get_dates("B") == [D2]
+    assert index.get_dates("C") == []
+    assert index.get_ranges("A") == {D1: (0, 0), D2: (0, 3)}
+    assert index.get_ranges("B") == {D2: (0, 1)}
+    assert index.sizes == {D1: 1, D2: 4}
+
+def test_index_tracks_name_history():
+    index = PlayerDateIndex()
+    index.add_rows(D1, 0, [[A], [Player("DJA-NEW", "A")]])
+    index.add_rows(D2, 0, [[Player("DJA-NEW", "A"), B]])
+    assert index.get_name_history("A") == ["DJA", "DJA-NEW"]
+    assert index.get_name_history("C") == []
+    assert index.get_players() == [Player("DJA-NEW", "A"), B]
+
+def test_index_persists(tmp_path):
+    path = tmp_path / "player_index.json"
+    index = PlayerDateIndex(path)
+    index.add_rows(D1, 0, [[A], [B, A]])
+    index.set_offset(D1, 123)
+    index.set_version(D1, (123, 456))
+    index.save()
+    loaded = PlayerDateIndex(path)
+    assert loaded.get_ranges("A") == {D1: (0, 1)}
+    assert loaded.get_ranges("B") == {D1: (1, 1)}
+    assert loaded.sizes == {D1: 2}
+    assert loaded.offsets == {D1: 123}
+    assert loaded.versions == {D1: (123, 456)}
+    assert loaded.get_name_history("B") == ["DJB"]
+
+def test_index_loads_without_versions(tmp_path):
+    path = tmp_path / "player_index.json"
+    path.write_text('{"dates": {"2022-01-01": [2, 123]}, "players": {}}')
+    loaded = PlayerDateIndex(path)
+    assert loaded.offsets == {D1: 123}
+    assert loaded.versions == {}
+
+def test_index_save_does_not_touch_other_process_tmp(tmp_path):
+    path = tmp_path / "player_index.json"
+    # 別のプロセスが書き込み中の一時ファイル
+    other = tmp_path / "player_index.json.1.tmp"
+    other.write_text("partial")
+    index = PlayerDateIndex(path)
+    index.add_rows(D1, 0, [[A]])
+    index.save()
+    assert other.read_text() == "partial"
+    assert list(tmp_path.glob("*.tmp")) == [other]
+    assert PlayerDateIndex(path).get_dates("A") == [D1]
+
+def test_index_remove_date():
+    index = PlayerDateIndex()
+    index.add_rows(D1, 0, [[A]])
+    index.add_rows(D2, 0, [[A]])
+    index.remove_date(D1)
+    assert index.get_dates("A") == [D2]
+    assert D1 not in index.sizes
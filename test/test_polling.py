@@ -0,0 +1,136 @@
+import datetime
+import random
+import pytest
+import requests
+
+from fetcher import ResultTableNotFoundError
+from logger import ScheduleLogger
+from player import Player
+from polling import AdaptiveScheduler, Clock, count_new_at_top
+
+class FakeClock(Clock):
+    """
+    sleepで時刻を進めるだけの時計
+    """
+    def __init__(self, now: datetime.datetime):
+        self.time = now
+        self.sleeps: list[float] = []
+    def now(self) -> datetime.datetime:
+        return self.time
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.time += datetime.timedelta(seconds=seconds)
+
+def players(*names: str) -> list[Player]:
+    return [Player(name, name) for name in names]
+
+def test_count_new_at_top():
+    assert count_new_at_top([], players("a", "b")) == 0
+    assert count_new_at_top(players("a", "b"), players("a", "b")) == 0
+    assert count_new_at_top(players("a", "b"), players("c", "a")) == 1
+    assert count_new_at_top(players("a", "b"), players("c", "b", "a")) == 2
+    assert count_new_at_top(players("a", "b"), players("c", "d")) == 2
+
+def test_interval_follows_churn():
+    s = AdaptiveScheduler(min_interval=60, max_interval=900, initial_interval=480, growth=1.5)
+    assert s.on_sample(players("a", "b", "c")) == 480
+    # 一人ならそのまま
+    assert s.on_sample(players("d", "a", "b")) == 480
+    # 二人なら半分
+    assert s.on_sample(players("e", "f", "d")) == 240
+    assert s.on_sample(players("g", "h", "i", "e")) == 80
+    assert s.on_sample(players("j", "k", "g")) == 60
+    # 入れ替わりがなければ延ばす
+    row = players("j", "k", "g")
+    assert s.on_sample(row) == 90
+    for _ in range(10):
+        interval = s.on_sample(row)
+    assert interval == 900
+
+def test_backoff_is_jittered_and_bounded():
+    s = AdaptiveScheduler(backoff_base=30, max_backoff=200, rng=random.Random(0))
+    delays = [s.on_error() for _ in range(5)]
+    for delay, limit in zip(delays, [30, 60, 120, 200, 200]):
+        assert limit / 2 <= delay <= limit
+    s.on_sample(players("a"))
+    assert s.errors == 0
+    assert 15 <= s.on_error() <= 30
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptiveScheduler(min_interval=100, max_interval=50)
+
+class Fetcher:
+    def __init__(self, rows: list):
+        self.rows = rows
+    def get_log(self) -> list[Player]:
+        row = self.rows.pop(0) if len(self.rows) > 1 else self.rows[0]
+        if isinstance(row, Exception):
+            raise row
+        return row
+
+class Repository:
+    def __init__(self):
+        self.saved: list[datetime.datetime] = []
+    def save_row(self, logged_at, player_list):
+        self.saved.append(logged_at)
+
+def test_main_loop_without_sleeping():
+    start = datetime.datetime(2023,1,1,10)
+    end = start + datetime.timedelta(hours=1)
+    clock = FakeClock(start - datetime.timedelta(minutes=5))
+    fetcher = Fetcher([
+        players("a"),
+        ResultTableNotFoundError(503, ""),
+        players("b", "c", "a"),
+        players("b", "c", "a"),
+    ])
+    repository = Repository()
+    scheduler = AdaptiveScheduler(60, 900, 480, rng=random.Random(0))
+    ScheduleLogger(fetcher, repository, scheduler, clock).main_loop(start, end)
+    # 開始時刻まで待ってから取り始め、終了時刻に最後の一回を取る
+    assert clock.sleeps[0] == 300
+    assert repository.saved[0] == start
+    assert repository.saved[-1] == end
+    assert 15 <= clock.sleeps[2] <= 30
+    assert clock.sleeps[3] == 240
+    assert all(start <= t <= end for t in repository.saved)
+
+@pytest.mark.parametrize("error", [
+    requests.Timeout(),
+    requests.exceptions.ChunkedEncodingError(),
+    requests.ConnectionError(),
+])
+def test_step_backs_off_on_request_errors(error):
+    start = datetime.datetime(2023,1,1,10)
+    clock = FakeClock(start)
+    fetcher = Fetcher([error, players("a")])
+    repository = Repository()
+    scheduler = AdaptiveScheduler(60, 900, 480, rng=random.Random(0))
+    logger = ScheduleLogger(fetcher, repository, scheduler, clock)
+    end = start + datetime.timedelta(hours=1)
+    # 取得に失敗しても止まらずにバックオフして取り直す
+    assert 15 <= logger.step(end) <= 30
+    assert repository.saved == []
+    assert logger.step(end) == 480
+    assert repository.saved == [start]
+
+class LateClock(FakeClock):
+    """
+    実際の時計のようにsleepが少し長くかかる時計
+    """
+    def sleep(self, seconds: float):
+        super().sleep(seconds)
+        self.time += datetime.timedelta(milliseconds=20)
+
+def test_main_loop_takes_end_sample_with_late_sleep():
+    start = datetime.datetime(2023,1,1,10)
+    end = start + datetime.timedelta(minutes=30)
+    clock = LateClock(start)
+    repository = Repository()
+    scheduler = AdaptiveScheduler(60, 900, 480, rng=random.Random(0))
+    ScheduleLogger(Fetcher([players("a")]), repository, scheduler, clock).main_loop(start, end)
+    # 終了時刻を少し過ぎても最後の一回を取り、それ以降は取らない
+    assert end < repository.saved[-1] < end + datetime.timedelta(seconds=1)
+    assert repository.saved[-2] < end
+    assert ScheduleLogger(Fetcher([players("a")]), Repository(), scheduler, clock).step(end) is None
@@ -0,0 +1,35 @@
+from render_cache import RenderCache, get_etag, match_etag
+
+def test_etag_depends_on_key_and_version():
+    etag = get_etag(("headcounts_average", 2), "v1")
+    assert etag == get_etag(("headcounts_average", 2), "v1")
+    assert etag != get_etag(("headcounts_average", 3), "v1")
+    assert etag != get_etag(("headcounts_average", 2), "v2")
+
+def test_match_etag():
+    assert not match_etag(None, "abc")
+    assert match_etag('"abc"', "abc")
+    assert match_etag('"xyz", W/"abc"', "abc")
+    assert match_etag("*", "abc")
+    assert not match_etag('"abcd"', "abc")
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = RenderCache(10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.put("c", b"12345")
+    assert cache.get("a") is None
+    assert cache.get("c") == b"12345"
+    assert cache.stats()["bytes"] == 10
+
+def test_disk_tier(tmp_path):
+    cache = RenderCache(5, tmp_path, max_disk_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    # メモリから溢れてもディスクから読める
+    assert cache.get("a") == b"12345"
+    # 別のプロセスのキャッシュからも読める
+    assert RenderCache(5, tmp_path).get("b") == b"12345"
+    cache.put("c", b"12345")
+    assert len(list(tmp_path.glob("*.bin"))) == 2
+    assert not list(tmp_path.glob("*.tmp"))
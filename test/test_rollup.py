@@ -0,0 +1,92 @@
+import datetime
+
+from interpolator import SLOTS, resample_oneday
+from log import Log
+from log_analysis import LogAnalyzer
+from log_repository import JsonRowLogRepository
+from player import Player
+from rollup import DayRollup, RollupRepository, build_rollup, is_closed, rebuild_rollups
+
+D1 = datetime.date(2022,1,1)
+D2 = datetime.date(2022,1,2)
+A, B, C = Player("DJA", "A"), Player("DJB", "B"), Player("DJC", "C")
+
+def write_log(repository: JsonRowLogRepository, date: datetime.date):
+    t = datetime.datetime.combine(date, datetime.time(10))
+    rows = [[A, B], [B, A], [C, B, A], [A, C, B], [A, C, B]]
+    for i, row in enumerate(rows):
+        repository.save_row(t + datetime.timedelta(minutes=8*i), row)
+
+def test_rollup_resamples_analysis(tmp_path):
+    repository = JsonRowLogRepository(tmp_path)
+    write_log(repository, D1)
+    analyzer = LogAnalyzer()
+    rollup = build_rollup(repository, D1, analyzer)
+    log = repository.get_log_by_date(D1)
+    analysis = analyzer.analyze(log)
+    assert rollup.headcounts.tolist() == resample_oneday(analysis.times, analysis.headcounts).tolist()
+    assert rollup.ids.tolist() == ["A", "B", "C"]
+    for p in (A, B, C):
+        presence = analysis.get_presence(log.registry.get_code(p.id))
+        expected = resample_oneday(analysis.times, list(map(float, presence))) > 0
+        assert rollup.get_presence(p.id).tolist() == expected.tolist()
+        assert rollup.has_played(p.id) == analysis.has_played(log.registry.get_code(p.id))
+    assert not rollup.has_played("D")
+    assert rollup.is_valid(repository.get_version(D1), analyzer)
+    assert not rollup.is_valid(repository.get_version(D1), LogAnalyzer(datetime.timedelta(minutes=10)))
+
+def test_rollup_repository_roundtrip(tmp_path):
+    repository = JsonRowLogRepository(tmp_path)
+    write_log(repository, D1)
+    rollups = RollupRepository(tmp_path / "rollup")
+    assert rollups.get_dates() == []
+    assert rollups.load(D1) is None
+    rollup = build_rollup(repository, D1, LogAnalyzer())
+    rollups.save(rollup)
+    loaded = rollups.load(D1)
+    assert rollups.get_dates() == [D1]
+    assert loaded.headcounts.tolist() == rollup.headcounts.tolist()
+    assert loaded.ids.tolist() == rollup.ids.tolist()
+    assert loaded.packed_presence.tolist() == rollup.packed_presence.tolist()
+    assert loaded.played.tolist() == rollup.played.tolist()
+    assert loaded.version == rollup.version and loaded.params == rollup.params
+
+def test_rollup_save_does_not_touch_other_process_tmp(tmp_path):
+    repository = JsonRowLogRepository(tmp_path)
+    write_log(repository, D1)
+    rollups = RollupRepository(tmp_path / "rollup")
+    rollup = build_rollup(repository, D1, LogAnalyzer())
+    rollups.save(rollup)
+    # 別のプロセスが書き込み中の一時ファイル
+    other = rollups.get_path(D1).with_name(f"{rollups.get_path(D1).name}.1.tmp")
+    other.write_bytes(b"partial")
+    rollups.save(rollup)
+    assert other.read_bytes() == b"partial"
+    assert list((tmp_path / "rollup").glob("*.tmp")) == [other]
+    assert rollups.load(D1).headcounts.tolist() == rollup.headcounts.tolist()
+
+def test_rollup_without_players():
+    analysis = LogAnalyzer().analyze(Log({
+        datetime.datetime(2022,1,1,10): [],
+        datetime.datetime(2022,1,1,11): [],
+    }))
+    rollup = DayRollup.create(D1, analysis, [], (0, 0), LogAnalyzer())
+    assert rollup.headcounts.shape == (len(SLOTS),)
+    assert rollup.packed_presence.shape[0] == 0
+
+def test_rebuild_skips_open_day(tmp_path):
+    repository = JsonRowLogRepository(tmp_path)
+    write_log(repository, D1)
+    today = datetime.date.today()
+    write_log(repository, today)
+    rollups = RollupRepository(tmp_path / "rollup")
+    # 記録中の日は作らない
+    assert rebuild_rollups(repository, rollups, LogAnalyzer(), datetime.time.max) == [D1]
+    assert rollups.get_dates() == [D1]
+
+def test_is_closed():
+    end = datetime.time(23, 30)
+    assert is_closed(D1, end, datetime.datetime(2022,1,2,0,0))
+    assert not is_closed(D1, end, datetime.datetime(2022,1,1,23,0))
+    assert is_closed(D1, end, datetime.datetime(2022,1,1,23,30))
+    assert not is_closed(D2, end, datetime.datetime(2022,1,1,23,45))
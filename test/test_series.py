@@ -0,0 +1,42 @@
+import datetime
+import json
+from io import BytesIO
+import numpy as np
+
+from interpolator import SLOTS
+from series import JSON_MEDIA_TYPE, NPY_MEDIA_TYPE, Series, choose_media_type, encode
+
+def test_choose_media_type():
+    assert choose_media_type(None) == JSON_MEDIA_TYPE
+    assert choose_media_type("*/*") == JSON_MEDIA_TYPE
+    assert choose_media_type("application/x-npy") == NPY_MEDIA_TYPE
+    assert choose_media_type("application/octet-stream;q=0.9, */*;q=0.1") == NPY_MEDIA_TYPE
+    assert choose_media_type("text/html") == JSON_MEDIA_TYPE
+
+def test_oneday_series():
+    values = np.arange(len(SLOTS), dtype=float)
+    content, headers = encode(Series.oneday(values), JSON_MEDIA_TYPE)
+    data = json.loads(content)
+    assert headers == {}
+    assert data == {"start": "00:00:00", "step": 300, "values": values.tolist()}
+    content, headers = encode(Series.oneday(values), NPY_MEDIA_TYPE)
+    assert headers == {"X-Series-Start": "00:00:00", "X-Series-Step": "300"}
+    assert np.load(BytesIO(content)).tolist() == values.tolist()
+
+def test_sampled_series():
+    t = datetime.datetime(2022,1,1,9,30)
+    times = [t, t + datetime.timedelta(minutes=8), t + datetime.timedelta(minutes=17, seconds=5)]
+    series = Series.sampled(times, [1, 3, 2])
+    data = json.loads(encode(series, JSON_MEDIA_TYPE)[0])
+    assert data == {"start": "2022-01-01T09:30:00", "offsets": [0, 480, 1025], "values": [1.0, 3.0, 2.0]}
+    content, headers = encode(series, NPY_MEDIA_TYPE)
+    array = np.load(BytesIO(content))
+    assert headers == {"X-Series-Start": "2022-01-01T09:30:00"}
+    assert array["offset"].tolist() == [0, 480, 1025]
+    assert array["value"].tolist() == [1.0, 3.0, 2.0]
+
+def test_empty_series():
+    data = json.loads(encode(Series.oneday(np.empty(0)), JSON_MEDIA_TYPE)[0])
+    assert data["values"] == []
+    data = json.loads(encode(Series.sampled([], []), JSON_MEDIA_TYPE)[0])
+    assert data["offsets"] == [] and data["values"] == []
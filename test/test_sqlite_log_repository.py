@@ -0,0 +1,105 @@
+import datetime
+import sqlite3
+
+from player import Player
+from log_repository import JsonRowLogRepository
+from sqlite_log_repository import SqliteLogRepository
+
+T = datetime.datetime(2022,1,1,10,0)
+P1, P2 = Player("DJ1", "1111-1111"), Player("DJ2", "2222-2222")
+
+def test_sqlite_round_trip(tmp_path):
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    repo.save_row(T, [P1, P2])
+    repo.save_row(T + datetime.timedelta(minutes=8), [])
+    repo.save_row(T + datetime.timedelta(minutes=16), [P2])
+    log = repo.get_log_by_date(T.date())
+    assert log.get_times() == [T + i*datetime.timedelta(minutes=8) for i in range(3)]
+    assert list(log.iter_logs()) == [[P1, P2], [], [P2]]
+
+def test_sqlite_queries(tmp_path):
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    for day in range(3):
+        repo.save_row(T + datetime.timedelta(days=day), [P1] if day != 1 else [P2])
+    repo.save_row(T + datetime.timedelta(days=2, minutes=8), [Player("DJ1-NEW", "1111-1111")])
+    assert repo.get_dates() == [T.date() + datetime.timedelta(days=d) for d in range(3)]
+    assert repo.get_dates_of_player("1111-1111") == [T.date(), T.date() + datetime.timedelta(days=2)]
+    assert repo.get_dates_of_player("9999-9999") == []
+    assert repo.get_name_history("1111-1111") == ["DJ1", "DJ1-NEW"]
+    snapshots = repo.get_snapshots_between(T, T + datetime.timedelta(days=2))
+    assert [t for t, _ in snapshots] == [T, T + datetime.timedelta(days=1)]
+    assert snapshots[1][1] == [P2]
+
+def test_sqlite_uses_wal(tmp_path):
+    path = tmp_path / "log.sqlite3"
+    SqliteLogRepository(path).save_row(T, [P1])
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_sqlite_import_json(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path)
+    for i in range(3):
+        json_repo.save_row(T + i*datetime.timedelta(hours=7), [P1, P2][i % 2:])
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    repo.import_json(json_repo)
+    repo.import_json(json_repo)
+    for date in json_repo.get_dates():
+        expected = json_repo.get_log_by_date(date)
+        actual = repo.get_log_by_date(date)
+        assert actual.get_times() == expected.get_times()
+        assert list(actual.iter_logs()) == list(expected.iter_logs())
+    version = repo.get_version(T.date())
+    repo.save_row(T + datetime.timedelta(hours=1), [])
+    assert repo.get_version(T.date()) != version
+
+def test_sqlite_queries_players_only_when_new_or_renamed(tmp_path):
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    repo.save_row(T, [P1, P2])
+    statements = []
+    repo._connect().set_trace_callback(statements.append)
+    for i in range(1, 10):
+        repo.save_row(T + i*datetime.timedelta(minutes=8), [P2, P1])
+    assert not any("player" in s for s in statements if s.startswith("SELECT"))
+    repo.save_row(T + datetime.timedelta(hours=2), [Player("DJ1-NEW", P1.id)])
+    assert repo.get_name_history(P1.id) == ["DJ1", "DJ1-NEW"]
+
+def test_sqlite_renames_from_another_connection(tmp_path):
+    path = tmp_path / "log.sqlite3"
+    repo, other = SqliteLogRepository(path), SqliteLogRepository(path)
+    repo.save_row(T, [P1])
+    other.save_row(T + datetime.timedelta(minutes=8), [Player("DJ1-NEW", P1.id)])
+    # 覚えている名前と違えばデータベースの履歴の続きに追加する
+    repo.save_row(T + datetime.timedelta(minutes=16), [Player("DJ1-NEW2", P1.id)])
+    assert repo.get_name_history(P1.id) == ["DJ1", "DJ1-NEW", "DJ1-NEW2"]
+    assert [p.name for p in repo.get_log_by_date(T.date()).get_players()] == ["DJ1-NEW2"]
+
+def test_sqlite_rename_back_after_another_connection(tmp_path):
+    path = tmp_path / "log.sqlite3"
+    repo, other = SqliteLogRepository(path), SqliteLogRepository(path)
+    repo.save_row(T, [P1])
+    other.save_row(T + datetime.timedelta(minutes=8), [Player("DJ1-NEW", P1.id)])
+    # 覚えている名前に戻っても、別の接続が変えた後なら履歴に追加する
+    repo.save_row(T + datetime.timedelta(minutes=16), [P1])
+    other.save_row(T + datetime.timedelta(minutes=24), [P1, P2])
+    assert repo.get_name_history(P1.id) == ["DJ1", "DJ1-NEW", "DJ1"]
+    assert repo.get_name_history(P2.id) == ["DJ2"]
+
+def test_sqlite_import_json_keeps_renames(tmp_path):
+    json_repo = JsonRowLogRepository(tmp_path)
+    json_repo.save_row(T, [Player("OLD", "1")])
+    json_repo.save_row(T + datetime.timedelta(minutes=5), [Player("NEW", "1")])
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    repo.import_json(json_repo)
+    assert repo.get_name_history("1") == ["OLD", "NEW"]
+
+def test_sqlite_read_rows_after_offset(tmp_path):
+    repo = SqliteLogRepository(tmp_path / "log.sqlite3")
+    repo.save_row(T, [P1, P2])
+    repo.save_row(T + datetime.timedelta(days=1), [P1])
+    first = repo.read_rows(T.date(), 0)
+    assert first.offset == 0 and first.rows == [(T, [P1, P2])]
+    repo.save_row(T + datetime.timedelta(minutes=8), [P2])
+    second = repo.read_rows(T.date(), first.end)
+    assert second.rows == [(T + datetime.timedelta(minutes=8), [P2])]
+    assert repo.read_rows(T.date(), second.end).rows == []
+    assert repo.get_log_by_date(T.date(), first.end).get_times() == [T]
+    assert repo.read_rows(T.date(), second.end + 100).offset == 0
@@ -0,0 +1,11 @@
+import pytest
+
+from bench.startup import get_loaded_heavy, measure
+
+# 設定やログなしで読み込めるモジュール
+# 読み込み時間は実行する環境の負荷で変わるので、予算はpython -m bench.startupで確認する
+@pytest.mark.parametrize("module", ["logger", "multi_logger", "log_usecase", "fetcher", "figure_pool"])
+def test_import_skips_heavy_dependencies(module, tmp_path):
+    # config.jsonのないディレクトリでも読み込み時に設定を読まないので失敗しない
+    startup = measure(module, tmp_path)
+    assert get_loaded_heavy(module, startup) == []
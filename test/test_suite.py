@@ -0,0 +1,26 @@
+from bench.suite import Benchmark, Result, compare, load_results, main, measure, save_results
+
+def test_measure():
+    calls = []
+    result = measure(Benchmark("x", lambda: calls.append("run"), lambda: calls.append("setup")), 3)
+    assert result.repeat == 3
+    assert 0 <= result.min <= result.median
+    # 最初の一回は測らない
+    assert calls == ["setup", "run"] * 4
+
+def test_compare():
+    baseline = {"a": Result(1.0, 0.9, 5), "b": Result(1.0, 0.9, 5), "c": Result(1.0, 0.9, 5)}
+    current = {"a": Result(1.1, 1.0, 5), "b": Result(1.3, 1.2, 5), "d": Result(9.0, 9.0, 5)}
+    regressions = compare(baseline, current, 0.2)
+    # 基準にないものと基準からなくなったものは比べない
+    assert [r.name for r in regressions] == ["b"]
+    assert regressions[0].ratio == 1.3
+
+def test_compare_command(tmp_path):
+    baseline = {"a": Result(1.0, 0.9, 5)}
+    save_results(tmp_path / "base.json", baseline, {"days": 1})
+    save_results(tmp_path / "fast.json", {"a": Result(0.5, 0.4, 5)}, {"days": 1})
+    save_results(tmp_path / "slow.json", {"a": Result(2.0, 1.9, 5)}, {"days": 1})
+    assert load_results(tmp_path / "base.json") == baseline
+    assert main(["compare", str(tmp_path / "base.json"), str(tmp_path / "fast.json")]) == 0
+    assert main(["compare", str(tmp_path / "base.json"), str(tmp_path / "slow.json")]) == 1
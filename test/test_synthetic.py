@@ -0,0 +1,38 @@
+import datetime
+import random
+
+from bench.synthetic import Venue, VenueState, simulate_venue_day, write_venue_logs
+from log_repository import JsonRowLogRepository
+
+def test_simulate_venue_day():
+    venue = Venue(n_players=50, rename_rate=0.1)
+    rng = random.Random(1)
+    state = VenueState(venue, rng)
+    date = datetime.date(2022,1,1)
+    rows = simulate_venue_day(venue, state, date, rng)
+    open_at = datetime.datetime.combine(date, venue.open_time)
+    close_at = datetime.datetime.combine(date, venue.close_time)
+    times = [t for t, _ in rows]
+    assert times == sorted(times)
+    assert open_at <= times[0] and times[-1] < close_at
+    for _, row in rows:
+        assert len(row) == venue.list_size
+        assert len({p.id for p in row}) == len(row)
+    # プレイがあれば並びが変わる
+    assert rows[0][1] != rows[-1][1]
+    # 名前を変えたプレイヤーはIDはそのままで名前が変わる
+    assert any(p.name.endswith("'") for p in state.players)
+    assert len({p.id for p in state.players}) == venue.n_players
+
+def test_write_venue_logs(tmp_path):
+    venue = Venue(n_players=50)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    dates = write_venue_logs(tmp_path / "a", 3, venue, seed=2)
+    write_venue_logs(tmp_path / "b", 3, venue, seed=2)
+    a = JsonRowLogRepository(tmp_path / "a")
+    b = JsonRowLogRepository(tmp_path / "b")
+    assert a.get_dates() == dates
+    # 同じseedなら同じログになる
+    for date in dates:
+        assert list(a.get_log_by_date(date).iter_logs()) == list(b.get_log_by_date(date).iter_logs())